@@ -0,0 +1,97 @@
+# ai_batch.py
+"""
+批次錯題診斷：同科目的多筆錯題打包成一次 AI 請求 (要求回傳 JSON)，
+多包時交給全行程共用的小型執行緒池 (AI_BATCH_CONCURRENCY) 並行送出，每個請求仍經過 ai_limits 的 token bucket，
+最後由呼叫端一次寫回 ai_insight。
+"""
+import json
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from ai_service import ask_ai
+
+BATCH_PACK_SIZE = int(os.environ.get('AI_BATCH_PACK_SIZE', 5))
+BATCH_CONCURRENCY = int(os.environ.get('AI_BATCH_CONCURRENCY', 3))
+
+# 全行程共用：同時進行的批次再多，額外的 AI 併發也不超過 BATCH_CONCURRENCY
+_pack_pool = ThreadPoolExecutor(max_workers=BATCH_CONCURRENCY, thread_name_prefix='ai-batch')
+
+_FENCE_RE = re.compile(r'^```(?:json)?\s*|\s*```$')
+
+def grade_text(grade):
+    return f"{grade}年級" if grade <= 6 else f"國中{grade-6}年級"
+
+def build_batch_prompt(subject, config, items):
+    lines = [f"{i+1}. (id={item['id']}) 單元『{item['unit']}』：『{item['note']}』" for i, item in enumerate(items)]
+    return (
+        f"教材背景：{grade_text(config['grade'])}、版本：{config['publisher']}。"
+        f"以下是學生在『{subject}』科的多筆錯誤，請逐筆進行精簡診斷，每筆 200 字內：\n"
+        + "\n".join(lines)
+        + "\n請只回傳 JSON 陣列，格式為 [{\"id\": 數字, \"insight\": \"診斷內容\"}]，不要加其他文字。"
+    )
+
+def parse_batch_reply(content, expected_ids):
+    """ 解析 AI 回傳的 JSON 陣列，只保留本包內的 id；格式不符時回傳空 dict """
+    try:
+        data = json.loads(_FENCE_RE.sub('', (content or '').strip()))
+    except ValueError:
+        return {}
+    if not isinstance(data, list):
+        return {}
+    insights = {}
+    for entry in data:
+        if isinstance(entry, dict) and entry.get('id') in expected_ids and entry.get('insight'):
+            insights[entry['id']] = str(entry['insight']).strip()
+    return insights
+
+def _single_prompt(subject, config, item):
+    return (f"教材背景：{grade_text(config['grade'])}、版本：{config['publisher']}。"
+            f"請針對學生在『{subject}』單元『{item['unit']}』遇到的錯誤：『{item['note']}』進行精簡診斷，200字內。")
+
+def _diagnose_pack(user_id, subject, config, items, refresh=False):
+    """ 送出一包請求；JSON 解析失敗的項目改以單筆請求補救 """
+    requests_made = 1
+    reply = ask_ai(user_id, build_batch_prompt(subject, config, items), refresh=refresh)
+    if "error" in reply:
+        return {}, {item['id']: reply['error'] for item in items}, requests_made
+
+    insights = parse_batch_reply(reply.get('content'), {item['id'] for item in items})
+    errors = {}
+    for item in items:
+        if item['id'] in insights:
+            continue
+        requests_made += 1
+        single = ask_ai(user_id, _single_prompt(subject, config, item), refresh=refresh)
+        if "error" in single:
+            errors[item['id']] = single['error']
+        elif single.get('content', '').strip():
+            insights[item['id']] = single['content'].strip()
+    return insights, errors, requests_made
+
+def _diagnose_pack_in_app(app, *args):
+    with app.app_context():
+        return _diagnose_pack(*args)
+
+def diagnose_batch(user_id, items_by_subject, configs, refresh=False):
+    """
+    items_by_subject: {科目: [{'id', 'unit', 'note'}, ...]}；configs: {科目: {'publisher', 'grade'}}
+    回傳 (insights {id: 診斷}, errors {id: 錯誤訊息}, 實際 AI 請求數)
+    只有一包時直接在呼叫端執行；多包時送進 _pack_pool 並行，避免同步請求逐包排隊超過 gunicorn 逾時
+    """
+    packs = [(user_id, subject, configs[subject], items[i:i + BATCH_PACK_SIZE], refresh)
+             for subject, items in items_by_subject.items()
+             for i in range(0, len(items), BATCH_PACK_SIZE)]
+    if len(packs) <= 1:
+        results = [_diagnose_pack(*pack) for pack in packs]
+    else:
+        app = current_app._get_current_object()
+        futures = [_pack_pool.submit(_diagnose_pack_in_app, app, *pack) for pack in packs]
+        results = [f.result() for f in futures]
+
+    insights, errors, requests_made = {}, {}, 0
+    for pack_insights, pack_errors, pack_requests in results:
+        insights.update(pack_insights)
+        errors.update(pack_errors)
+        requests_made += pack_requests
+    return insights, errors, requests_made
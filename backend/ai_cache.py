@@ -0,0 +1,110 @@
+# ai_cache.py
+"""
+AI 回覆快取：鍵為 (model_name, system_prompt 雜湊, prompt 雜湊)，存於 ai_response_cache 表。
+逾期 (AI_CACHE_TTL) 的項目視為未命中；超過 AI_CACHE_MAX_ENTRIES 時依最後命中時間淘汰 (LRU)。
+快取讀寫使用獨立連線，不會影響路由本身尚未 commit 的交易；快取讀寫失敗只記錄，不會讓請求失敗。
+"""
+import hashlib
+import os
+import threading
+from datetime import datetime, timedelta
+from sqlalchemy import text
+from database import db, AIResponseCache, upsert_statement
+
+AI_CACHE_TTL = int(os.environ.get('AI_CACHE_TTL', 7 * 24 * 3600))
+AI_CACHE_MAX_ENTRIES = int(os.environ.get('AI_CACHE_MAX_ENTRIES', 5000))
+
+_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0,
+          'miss_seconds': 0.0, 'saved_seconds': 0.0}
+
+def _sha256(value):
+    return hashlib.sha256((value or '').encode('utf-8')).hexdigest()
+
+def cache_key(model_name, system_prompt, prompt):
+    return _sha256('|'.join([model_name or '', _sha256(system_prompt), _sha256(prompt)]))
+
+def _bump(**deltas):
+    with _lock:
+        for k, v in deltas.items():
+            _stats[k] += v
+
+def _avg_miss_seconds():
+    return _stats['miss_seconds'] / _stats['misses'] if _stats['misses'] else 0.0
+
+def get_cached(model_name, system_prompt, prompt):
+    """ 命中時回傳快取內容並更新最後命中時間；未命中、已逾期或讀取失敗回傳 None """
+    key = cache_key(model_name, system_prompt, prompt)
+    now = datetime.now()
+    try:
+        with db.engine.begin() as conn:
+            row = conn.execute(
+                text("SELECT content, created_at FROM ai_response_cache WHERE cache_key = :k"), {'k': key}
+            ).fetchone()
+            if not row or _as_datetime(row.created_at) < now - timedelta(seconds=AI_CACHE_TTL):
+                return None
+            conn.execute(
+                text("UPDATE ai_response_cache SET last_hit_at = :now, hit_count = hit_count + 1 WHERE cache_key = :k"),
+                {'now': now, 'k': key}
+            )
+    except Exception as e:
+        print(f"⚠️ AI 快取讀取失敗: {e}")
+        return None
+    with _lock:
+        _stats['hits'] += 1
+        _stats['saved_seconds'] += _avg_miss_seconds()
+    return row.content
+
+def record_miss(elapsed_seconds):
+    """ 記錄一次實際送出的模型請求與耗時 (用來估算快取省下的時間) """
+    _bump(misses=1, miss_seconds=elapsed_seconds)
+
+def store(model_name, system_prompt, prompt, content):
+    """
+    寫入 (或覆蓋逾期的) 快取項目，必要時淘汰最久未使用的項目。
+    同一個鍵同時有兩個請求寫入時以 upsert 處理；寫入失敗只記錄，模型回覆照常回傳給使用者。
+    """
+    key = cache_key(model_name, system_prompt, prompt)
+    now = datetime.now()
+    values = {'cache_key': key, 'model_name': model_name, 'content': content,
+              'created_at': now, 'last_hit_at': now, 'hit_count': 0}
+    try:
+        with db.engine.begin() as conn:
+            stmt = upsert_statement(conn.dialect.name, AIResponseCache.__table__, values, ['cache_key'],
+                                    lambda new: {c: new[c] for c in ('model_name', 'content', 'created_at',
+                                                                     'last_hit_at', 'hit_count')})
+            if stmt is None:
+                conn.execute(text("DELETE FROM ai_response_cache WHERE cache_key = :k"), {'k': key})
+                stmt = AIResponseCache.__table__.insert().values(**values)
+            conn.execute(stmt)
+            evicted = _evict_overflow(conn)
+    except Exception as e:
+        print(f"⚠️ AI 快取寫入失敗: {e}")
+        return
+    _bump(stores=1, evictions=evicted)
+
+def _evict_overflow(conn):
+    total = conn.execute(text("SELECT COUNT(*) FROM ai_response_cache")).scalar()
+    excess = total - AI_CACHE_MAX_ENTRIES
+    if excess <= 0:
+        return 0
+    keys = [r[0] for r in conn.execute(
+        text("SELECT cache_key FROM ai_response_cache ORDER BY last_hit_at LIMIT :n"), {'n': excess}
+    )]
+    if keys:
+        conn.execute(text("DELETE FROM ai_response_cache WHERE cache_key = :k"), [{'k': k} for k in keys])
+    return len(keys)
+
+def _as_datetime(value):
+    # SQLite 以字串回傳時間欄位
+    return value if isinstance(value, datetime) else datetime.fromisoformat(str(value))
+
+def cache_stats():
+    with _lock:
+        lookups = _stats['hits'] + _stats['misses']
+        return {
+            **{k: (round(v, 3) if isinstance(v, float) else v) for k, v in _stats.items()},
+            'hit_rate': round(_stats['hits'] / lookups, 3) if lookups else 0.0,
+            'ttl_seconds': AI_CACHE_TTL,
+            'max_entries': AI_CACHE_MAX_ENTRIES,
+        }
@@ -0,0 +1,108 @@
+# ai_jobs.py
+"""
+AI 背景工作佇列：Gemini 請求改由固定大小的執行緒池處理，路由只負責送出並回傳 job_id。
+工作狀態保存在行程記憶體中 (queued -> running -> done / failed)，完成後保留 JOB_TTL 秒供查詢。
+工作函式拋出例外，或回傳帶有 error 的 dict 時，狀態為 failed。
+"""
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+
+AI_WORKERS = int(os.environ.get('AI_WORKERS', 4))
+AI_MAX_PENDING = int(os.environ.get('AI_MAX_PENDING', 64))
+AI_PER_USER_LIMIT = int(os.environ.get('AI_PER_USER_LIMIT', 2))
+JOB_TTL = int(os.environ.get('AI_JOB_TTL', 600))
+
+_executor = ThreadPoolExecutor(max_workers=AI_WORKERS, thread_name_prefix='ai-worker')
+_lock = threading.Lock()
+_jobs = {}
+_active_per_user = defaultdict(int)
+_counters = {'submitted': 0, 'completed': 0, 'failed': 0, 'rejected': 0}
+
+class JobRejected(Exception):
+    """ 佇列已滿或該使用者同時進行的工作已達上限 """
+
+def _prune_finished(now):
+    expired = [jid for jid, job in _jobs.items()
+               if job['status'] in ('done', 'failed') and now - job['finished_at'] > JOB_TTL]
+    for jid in expired:
+        del _jobs[jid]
+
+def submit_job(user_id, kind, fn, *args):
+    """ 將 fn(*args) 排入背景執行 (在 app context 內)，回傳 job_id；超過上限時拋出 JobRejected """
+    app = current_app._get_current_object()
+    user_key = str(user_id)
+    now = time.time()
+
+    with _lock:
+        _prune_finished(now)
+        pending = sum(1 for job in _jobs.values() if job['status'] in ('queued', 'running'))
+        if pending >= AI_MAX_PENDING:
+            _counters['rejected'] += 1
+            raise JobRejected("AI 佇列已滿，請稍後再試")
+        if _active_per_user[user_key] >= AI_PER_USER_LIMIT:
+            _counters['rejected'] += 1
+            raise JobRejected(f"同時進行中的 AI 任務最多 {AI_PER_USER_LIMIT} 個")
+
+        job_id = uuid.uuid4().hex
+        _jobs[job_id] = {
+            'id': job_id, 'user_id': user_key, 'kind': kind, 'status': 'queued',
+            'result': None, 'error': None,
+            'created_at': now, 'started_at': None, 'finished_at': None,
+        }
+        _active_per_user[user_key] += 1
+        _counters['submitted'] += 1
+
+    _executor.submit(_run_job, app, job_id, fn, args)
+    return job_id
+
+def _run_job(app, job_id, fn, args):
+    with _lock:
+        job = _jobs[job_id]
+        job['status'] = 'running'
+        job['started_at'] = time.time()
+
+    try:
+        with app.app_context():
+            result = fn(*args)
+        # 工作函式以 {"error": ...} 回報 AI 失敗 (與同步路由共用回傳格式)，這種結果也算失敗
+        if isinstance(result, dict) and result.get('error'):
+            status, error = 'failed', str(result['error'])
+        else:
+            status, error = 'done', None
+    except Exception as e:
+        result, status, error = None, 'failed', str(e)
+
+    with _lock:
+        job.update(status=status, result=result, error=error, finished_at=time.time())
+        _active_per_user[job['user_id']] -= 1
+        if _active_per_user[job['user_id']] <= 0:
+            del _active_per_user[job['user_id']]
+        _counters['completed' if status == 'done' else 'failed'] += 1
+
+def get_job(job_id, user_id):
+    """ 取得工作狀態的副本；不存在或不屬於該使用者時回傳 None """
+    with _lock:
+        job = _jobs.get(job_id)
+        if not job or job['user_id'] != str(user_id):
+            return None
+        return {k: job[k] for k in ('id', 'kind', 'status', 'result', 'error', 'created_at', 'started_at', 'finished_at')}
+
+def queue_metrics():
+    """ 佇列深度與累計計數，供監控使用 """
+    with _lock:
+        queued = sum(1 for job in _jobs.values() if job['status'] == 'queued')
+        running = sum(1 for job in _jobs.values() if job['status'] == 'running')
+        return {
+            'workers': AI_WORKERS,
+            'max_pending': AI_MAX_PENDING,
+            'per_user_limit': AI_PER_USER_LIMIT,
+            'queued': queued,
+            'running': running,
+            'active_users': len(_active_per_user),
+            **_counters,
+        }
@@ -0,0 +1,180 @@
+# ai_limits.py
+"""
+Gemini 呼叫的流量控制與容錯：
+- 每把 API Key 一個 token bucket，依 Gemini 配額限速 (同一把 Key 的請求在本行程內共用額度)
+- 429 / 5xx / 逾時等可重試錯誤以指數退避 (full jitter) 重送
+- 每次請求帶逾時設定
+- 主要模型超過延遲預算時，對備援模型發出對沖請求 (hedged request)，兩者誰先成功就用誰；
+  主要請求在專屬執行緒上執行，執行緒池只跑對沖請求
+多個 gunicorn worker 時 bucket 各自計算，AI_RATE_PER_MINUTE 請依 worker 數分配。
+"""
+import os
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from instrumentation import count_ai_event
+
+AI_RATE_PER_MINUTE = float(os.environ.get('AI_RATE_PER_MINUTE', 15))
+AI_BURST = int(os.environ.get('AI_BURST', 5))
+AI_RATE_WAIT = float(os.environ.get('AI_RATE_WAIT', 10))        # 等不到額度的最長秒數
+AI_MAX_RETRIES = int(os.environ.get('AI_MAX_RETRIES', 2))
+AI_BACKOFF_BASE = float(os.environ.get('AI_BACKOFF_BASE', 0.5))
+AI_BACKOFF_MAX = float(os.environ.get('AI_BACKOFF_MAX', 8))
+AI_TIMEOUT = float(os.environ.get('AI_TIMEOUT', 60))
+AI_HEDGE_AFTER = float(os.environ.get('AI_HEDGE_AFTER', 0))     # 0 代表不對沖
+AI_FALLBACK_MODEL = os.environ.get('AI_FALLBACK_MODEL', '')
+
+# google.api_core 例外帶有 HTTP 狀態碼 (code)；不匯入 SDK，以狀態碼與類別名稱判斷
+RETRYABLE_CODES = {429, 500, 502, 503, 504}
+RETRYABLE_NAMES = {'ResourceExhausted', 'TooManyRequests', 'ServiceUnavailable', 'InternalServerError',
+                   'DeadlineExceeded', 'GatewayTimeout', 'TimeoutError', 'ConnectionError'}
+TIMEOUT_NAMES = {'DeadlineExceeded', 'GatewayTimeout', 'TimeoutError'}
+
+class RateLimited(Exception):
+    pass
+
+class TokenBucket:
+    """ 每秒補充 rate 個 token，最多累積 capacity 個 """
+    def __init__(self, rate, capacity):
+        self.rate, self.capacity = rate, capacity
+        self.tokens, self.updated = float(capacity), time.monotonic()
+        self._lock = threading.Lock()
+
+    def _take(self):
+        """ 取得一個 token 回傳 0；否則回傳還需等待的秒數 """
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+    def try_acquire(self):
+        return self._take() == 0
+
+    def acquire(self, max_wait):
+        deadline = time.monotonic() + max_wait
+        while True:
+            delay = self._take()
+            if delay == 0:
+                return True
+            if time.monotonic() + delay > deadline:
+                return False
+            time.sleep(delay)
+
+_lock = threading.Lock()
+_buckets = {}
+_stats = {'calls': 0, 'throttled': 0, 'retried': 0, 'timeouts': 0, 'hedged': 0, 'hedge_wins': 0}
+_hedge_pool = ThreadPoolExecutor(max_workers=int(os.environ.get('AI_HEDGE_WORKERS', 8)),
+                                 thread_name_prefix='ai-hedge')
+
+def _count(event):
+    with _lock:
+        _stats[event] += 1
+    count_ai_event(event)
+
+def limiter_stats():
+    with _lock:
+        return {'rate_per_minute': AI_RATE_PER_MINUTE, 'burst': AI_BURST, 'keys': len(_buckets), **_stats}
+
+def bucket_for(api_key):
+    with _lock:
+        bucket = _buckets.get(api_key)
+        if bucket is None:
+            bucket = _buckets[api_key] = TokenBucket(AI_RATE_PER_MINUTE / 60.0, AI_BURST)
+        return bucket
+
+def acquire(api_key):
+    """ 等待該 Key 的額度；超過 AI_RATE_WAIT 仍等不到時拋出 RateLimited """
+    if not bucket_for(api_key).acquire(AI_RATE_WAIT):
+        _count('throttled')
+        raise RateLimited("AI 請求過於頻繁，請稍後再試")
+
+def is_retryable(exc):
+    return getattr(exc, 'code', None) in RETRYABLE_CODES or type(exc).__name__ in RETRYABLE_NAMES
+
+def backoff_or_raise(exc, attempt):
+    """ 可重試且還有次數時等待退避時間後返回，否則拋出原本的例外 """
+    if type(exc).__name__ in TIMEOUT_NAMES:
+        _count('timeouts')
+    if attempt >= AI_MAX_RETRIES or not is_retryable(exc):
+        raise exc
+    _count('retried')
+    time.sleep(random.uniform(0, min(AI_BACKOFF_MAX, AI_BACKOFF_BASE * 2 ** attempt)))
+
+def generate(model, prompt, **kwargs):
+    """ 帶逾時設定呼叫 generate_content """
+    _count('calls')
+    return model.generate_content(prompt, request_options={'timeout': AI_TIMEOUT}, **kwargs)
+
+def _call_with_retry(api_key, model, prompt, prepaid=False, give_up=None):
+    """ give_up() 為真時不再重試，直接拋出這次的錯誤 (對沖的另一個請求已有結果時使用) """
+    attempt = 0
+    while True:
+        if not prepaid or attempt:
+            acquire(api_key)
+        try:
+            return generate(model, prompt).text
+        except Exception as e:
+            if give_up and give_up():
+                raise
+            backoff_or_raise(e, attempt)
+            if give_up and give_up():
+                raise
+            attempt += 1
+
+def _spawn(fn, *args, **kwargs):
+    """ 在專屬執行緒執行 fn 並回傳 Future；主要請求不進 _hedge_pool，避免池子變成隱藏的併發上限 """
+    future = Future()
+
+    def run():
+        if future.set_running_or_notify_cancel():
+            try:
+                future.set_result(fn(*args, **kwargs))
+            except BaseException as e:
+                future.set_exception(e)
+
+    threading.Thread(target=run, name='ai-primary', daemon=True).start()
+    return future
+
+def generate_text(api_key, model_name, get_model, prompt, fallback_name=None):
+    """
+    送出請求並回傳 (文字, 實際回答的模型名稱)；get_model(名稱) 回傳模型實例。
+    設定 AI_HEDGE_AFTER 且有 fallback_name 時，主要請求超過預算仍未完成，就在 _hedge_pool
+    對備援模型發出第二個請求，兩者誰先成功就用誰的結果 (同時完成時以主要模型為準)。
+    預算從主要請求取得額度之後才開始計算，限流等待不會觸發對沖。
+    """
+    model = get_model(model_name)
+    if not (AI_HEDGE_AFTER > 0 and fallback_name):
+        return _call_with_retry(api_key, model, prompt), model_name
+
+    # 先在呼叫端等到額度，計時才從請求真正送出時算起
+    acquire(api_key)
+    settled = threading.Event()
+    primary = _spawn(_call_with_retry, api_key, model, prompt, True, give_up=settled.is_set)
+    pending = {primary: model_name}
+    try:
+        if not wait([primary], timeout=AI_HEDGE_AFTER).done:
+            # 額度不足時不對沖，避免為了搶快反而讓其他請求被限流
+            if bucket_for(api_key).try_acquire():
+                _count('hedged')
+                hedge = _hedge_pool.submit(_call_with_retry, api_key, get_model(fallback_name), prompt, True,
+                                           give_up=settled.is_set)
+                pending[hedge] = fallback_name
+
+        while pending:
+            done = wait(list(pending), return_when=FIRST_COMPLETED).done
+            for future in sorted(done, key=lambda f: f is not primary):
+                name = pending.pop(future)
+                if future.exception() is None:
+                    if future is not primary:
+                        _count('hedge_wins')
+                    return future.result(), name
+        # 兩個請求都失敗：回報主要請求的錯誤
+        raise primary.exception()
+    finally:
+        # 已有結果 (或全部失敗) 時，讓還在跑的另一個請求不再重試
+        settled.set()
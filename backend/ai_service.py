@@ -1,39 +1,218 @@
 # ai_service.py
+import threading
+import time
+from collections import namedtuple
+from flask import g, has_app_context
 from sqlalchemy import text
 from database import db
-import google.generativeai as genai  # 改用 Google 官方套件
+import ai_cache
+from instrumentation import observe_ai, count_ai_cache_hit
+import ai_limits
+
+DEFAULT_MODEL = "gemini-1.5-flash"
+
+AIConfig = namedtuple('AIConfig', ['api_key', 'system_prompt', 'model_name'])
+
+_registry_lock = threading.Lock()
+_model_registry = {}   # (api_key, model_name, system_prompt) -> 模型實例
+_clients = {}          # api_key -> GenerativeServiceClient
 
 def get_ai_config(user_id):
-    """ 從資料庫抓取該使用者的 AI 設定 """
+    """
+    取得該使用者的 AI 設定；只在同一個請求 (app context) 內快取。
+    不做跨請求的行程內快取：多個 worker 時，其他行程會一直拿著改過前的 API Key。
+    """
+    key = str(user_id)
+    request_cache = g.setdefault('_ai_configs', {}) if has_app_context() else {}
+    if key in request_cache:
+        return request_cache[key]
+
     sql = text("SELECT api_key, system_prompt, model_name FROM ai_settings WHERE user_id = :uid")
     result = db.session.execute(sql, {'uid': user_id}).fetchone()
-    return result
+    config = AIConfig(result.api_key, result.system_prompt, result.model_name) if result else None
+    request_cache[key] = config
+    return config
+
+def invalidate_ai_config(user_id):
+    """ /api/config/ai 更新設定後呼叫：清掉本請求內的設定快取與舊設定對應的模型 """
+    old = g.get('_ai_configs', {}).pop(str(user_id), None) if has_app_context() else None
+    if old:
+        with _registry_lock:
+            _model_registry.pop((old.api_key, old.model_name or DEFAULT_MODEL, old.system_prompt), None)
+
+class _Reply:
+    def __init__(self, text):
+        self.text = text
+
+def _response_text(response):
+    # 只取第一個候選的文字；被安全機制擋下等沒有內容的回應視為空字串
+    return ''.join(part.text for candidate in response.candidates[:1] for part in candidate.content.parts)
+
+class GeminiModel:
+    """
+    以 GenerativeServiceClient 的公開 API 呼叫 Gemini，介面與 genai.GenerativeModel.generate_content 相容
+    (回傳物件的 .text；stream=True 時逐段回傳)。
+    """
+    def __init__(self, client, model_name, system_prompt):
+        self.client = client
+        self.model_name = model_name if model_name.startswith('models/') else f"models/{model_name}"
+        self.system_prompt = system_prompt
+
+    def _request(self, prompt):
+        from google.ai import generativelanguage as glm
+        fields = {'model': self.model_name,
+                  'contents': [glm.Content(role='user', parts=[glm.Part(text=prompt)])]}
+        # Gemini 的 System Prompt 隨每次請求送出
+        if self.system_prompt:
+            fields['system_instruction'] = glm.Content(parts=[glm.Part(text=self.system_prompt)])
+        return glm.GenerateContentRequest(**fields)
+
+    def generate_content(self, prompt, stream=False, request_options=None):
+        timeout = (request_options or {}).get('timeout')
+        if stream:
+            return (_Reply(_response_text(chunk))
+                    for chunk in self.client.stream_generate_content(self._request(prompt), timeout=timeout))
+        return _Reply(_response_text(self.client.generate_content(self._request(prompt), timeout=timeout)))
+
+def _client_for(api_key):
+    """ 每把 API Key 一個已設定好的連線；不使用 genai.configure() 的全域 Key，多執行緒下不會互相覆蓋 """
+    # Google SDK 載入很慢，延到第一次真正建立連線時才匯入 (只處理任務 CRUD 的行程完全不需要)
+    from google.ai import generativelanguage as glm
+    with _registry_lock:
+        client = _clients.get(api_key)
+        if client is None:
+            client = _clients[api_key] = glm.GenerativeServiceClient(client_options={"api_key": api_key})
+        return client
+
+def _default_model_factory(api_key, model_name, system_prompt):
+    return GeminiModel(_client_for(api_key), model_name, system_prompt)
+
+# 可替換的模型建構函式 (測試 / 壓測時換成本地假模型，不必連網)
+_model_factory = _default_model_factory
+
+def set_model_factory(factory):
+    """
+    替換模型建構函式；factory(api_key, model_name, system_prompt) 需回傳具
+    generate_content(prompt, request_options=..., stream=...) 的物件
+    """
+    global _model_factory
+    with _registry_lock:
+        _model_factory = factory or _default_model_factory
+        _model_registry.clear()
 
-def ask_ai(user_id, prompt_message):
-    """ Gemini 專用的 AI 請求函式 """
+def get_model(api_key, model_name, system_prompt):
+    """ 依 (api_key, model_name, system_prompt) 重用已建立的模型實例 """
+    key = (api_key, model_name, system_prompt)
+    with _registry_lock:
+        model = _model_registry.get(key)
+    if model is None:
+        model = _model_factory(api_key, model_name, system_prompt)
+        with _registry_lock:
+            model = _model_registry.setdefault(key, model)
+    return model
+
+def ask_ai(user_id, prompt_message, use_cache=True, refresh=False):
+    """
+    Gemini 專用的 AI 請求函式 (相同模型 / System Prompt / 提問會先查快取)。
+    refresh 為 true (使用者要求重新產生) 時不讀快取，一定呼叫模型，新的回答再覆寫快取。
+    """
     config = get_ai_config(user_id)
     
     if not config or not config.api_key:
         return {"error": "尚未配置 API Key"}
 
     try:
-        # 1. 配置 Gemini API Key
-        genai.configure(api_key=config.api_key)
+        # 1. 初始化模型 (預設使用 gemini-1.5-flash，速度快且便宜)
+        model_name = config.model_name or DEFAULT_MODEL
 
-        # 2. 初始化模型 (預設使用 gemini-1.5-flash，速度快且便宜)
-        model_name = config.model_name or "gemini-1.5-flash"
-        
-        # 3. 建立模型實例並設定 System Prompt
-        # Gemini 的 System Prompt 是在初始化時定義的
-        model = genai.GenerativeModel(
-            model_name=model_name,
-            system_instruction=config.system_prompt
-        )
-
-        # 4. 發送請求
-        response = model.generate_content(prompt_message)
+        # 💾 先查快取，命中就不必送出網路請求
+        if use_cache and not refresh:
+            cached = ai_cache.get_cached(model_name, config.system_prompt, prompt_message)
+            if cached is not None:
+                count_ai_cache_hit('ask')
+                return {"content": cached, "cached": True}
+
+        # 2. 取得 (或重用) 對應這組 Key / 模型 / System Prompt 的模型實例
+        model_for = lambda name: get_model(config.api_key, name, config.system_prompt)
+        fallback_name = None
+        if ai_limits.AI_FALLBACK_MODEL and ai_limits.AI_FALLBACK_MODEL != model_name:
+            fallback_name = ai_limits.AI_FALLBACK_MODEL
+
+        # 3. 發送請求 (限速、重試與對沖由 ai_limits 處理)
+        started = time.perf_counter()
+        try:
+            content, answered_by = ai_limits.generate_text(config.api_key, model_name, model_for,
+                                                           prompt_message, fallback_name)
+        except Exception:
+            observe_ai('ask', model_name, time.perf_counter() - started, 'error')
+            raise
+        elapsed = time.perf_counter() - started
+        ai_cache.record_miss(elapsed)
+        # 對沖勝出時回答來自備援模型：指標與快取都記在實際回答的模型下，之後查主要模型的快取不會拿到備援的回答
+        observe_ai('ask', answered_by, elapsed, 'ok')
+
+        if use_cache and content:
+            ai_cache.store(answered_by, config.system_prompt, prompt_message, content)
         
-        return {"content": response.text}
+        return {"content": content}
 
     except Exception as e:
-        return {"error": f"Gemini 請求失敗: {str(e)}"}
\ No newline at end of file
+        return {"error": f"Gemini 請求失敗: {str(e)}"}
+
+def stream_ai(user_id, prompt_message, use_cache=True, refresh=False):
+    """
+    串流版 ask_ai：逐段產生 {'type': 'chunk', 'text'}，最後產生 {'type': 'done', 'content'}
+    或 {'type': 'error', 'error'}。完成的全文會寫入快取，之後相同請求可直接命中；refresh 同 ask_ai。
+    """
+    config = get_ai_config(user_id)
+    if not config or not config.api_key:
+        yield {"type": "error", "error": "尚未配置 API Key"}
+        return
+
+    model_name = config.model_name or DEFAULT_MODEL
+    if use_cache and not refresh:
+        cached = ai_cache.get_cached(model_name, config.system_prompt, prompt_message)
+        if cached is not None:
+            count_ai_cache_hit('stream')
+            yield {"type": "chunk", "text": cached}
+            yield {"type": "done", "content": cached, "cached": True}
+            return
+
+    parts = []
+    started = time.perf_counter()
+    try:
+        model = get_model(config.api_key, model_name, config.system_prompt)
+        attempt = 0
+        while True:
+            try:
+                ai_limits.acquire(config.api_key)
+                for chunk in ai_limits.generate(model, prompt_message, stream=True):
+                    try:
+                        text_part = chunk.text
+                    except ValueError:
+                        # 被安全機制擋下或沒有文字內容的片段
+                        continue
+                    if text_part:
+                        parts.append(text_part)
+                        yield {"type": "chunk", "text": text_part}
+                break
+            except ai_limits.RateLimited:
+                raise
+            except Exception as e:
+                # 已經送出部分內容就不能重來，只有還沒收到任何片段時才重試
+                if parts:
+                    raise
+                ai_limits.backoff_or_raise(e, attempt)
+                attempt += 1
+        elapsed = time.perf_counter() - started
+        ai_cache.record_miss(elapsed)
+        observe_ai('stream', model_name, elapsed, 'ok')
+    except Exception as e:
+        observe_ai('stream', model_name, time.perf_counter() - started, 'error')
+        yield {"type": "error", "error": f"Gemini 請求失敗: {str(e)}"}
+        return
+
+    content = ''.join(parts)
+    if use_cache and content:
+        ai_cache.store(model_name, config.system_prompt, prompt_message, content)
+    yield {"type": "done", "content": content}
@@ -1,128 +1,143 @@
 import os
-from flask import Flask, request, make_response, jsonify
+import importlib
+from flask import Flask, request, make_response
 from flask_cors import CORS
+import config
 from database import db
-
-# 匯入藍圖
-from routes.task_routes import task_bp
-from routes.progress_routes import progress_bp
-from routes.auth_routes import auth_bp
-from routes.review_routes import review_bp
-from routes.teacher_routes import teacher_bp
-from routes.config_routes import config_bp
-
-# 匯入原本的 config 作為備援
-try:
-    from config import SQLALCHEMY_DATABASE_URI, SQLALCHEMY_TRACK_MODIFICATIONS
-except ImportError:
-    SQLALCHEMY_DATABASE_URI = None
-    SQLALCHEMY_TRACK_MODIFICATIONS = False
-
-app = Flask(__name__)
-
-# --- 1. 資料庫配置 ---
-db_url = os.environ.get('DATABASE_URL')
-if db_url:
-    if db_url.startswith("postgres://"):
-        db_url = db_url.replace("postgres://", "postgresql://", 1)
-    app.config['SQLALCHEMY_DATABASE_URI'] = db_url
-else:
-    app.config['SQLALCHEMY_DATABASE_URI'] = SQLALCHEMY_DATABASE_URI
-
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-
-# 初始化資料庫
-db.init_app(app)
-
-# --- 2. CORS 修正版 (專為 Vercel 前端優化) ---
-from flask_cors import CORS
+from migrations import migration_lock, run_migrations, schema_version, latest_version
+from data_version import compress_response
+import instrumentation
+
+# 藍圖清單：(名稱, 模組, 變數, 路徑前綴)；模組在 create_app 時才匯入
+BLUEPRINTS = [
+    ('task', 'routes.task_routes', 'task_bp', None),
+    ('progress', 'routes.progress_routes', 'progress_bp', '/progress'), # 確保這裡的路徑與前端一致
+    ('auth', 'routes.auth_routes', 'auth_bp', '/auth'),
+    ('review', 'routes.review_routes', 'review_bp', '/api/review'),
+    ('teacher', 'routes.teacher_routes', 'teacher_bp', '/api/teacher'), # 修正重複路徑
+    ('config', 'routes.config_routes', 'config_bp', '/api/config'),
+    ('ai', 'routes.ai_routes', 'ai_bp', '/api/ai'),
+    ('sync', 'routes.sync_routes', 'sync_bp', '/api/sync'),
+]
+
+def enabled_blueprints():
+    """ APP_BLUEPRINTS=task,progress 可只載入部分藍圖 (例如只服務任務 CRUD 的行程)；未設定時全部載入 """
+    names = [n.strip() for n in os.environ.get('APP_BLUEPRINTS', '').split(',') if n.strip()]
+    return [bp for bp in BLUEPRINTS if not names or bp[0] in names]
 
 # 定義你的 Vercel 網址
 VERCEL_URL = "https://ai-self-study-manager.vercel.app"
 
-# A. 基礎宣告
-CORS(app, 
-     supports_credentials=True, 
-     resources={r"/*": {"origins": [VERCEL_URL]}})
-
-# B. 攔截 OPTIONS 預檢請求
-@app.before_request
-def handle_preflight():
-    if request.method == "OPTIONS":
-        res = make_response()
-        res.headers.add("Access-Control-Allow-Origin", VERCEL_URL)
-        res.headers.add("Access-Control-Allow-Headers", "Content-Type, Authorization, X-Requested-With")
-        res.headers.add("Access-Control-Allow-Methods", "GET, POST, PUT, DELETE, OPTIONS")
-        res.headers.add("Access-Control-Allow-Credentials", "true")
-        return res, 200
-
-# C. 確保所有 Response 都帶有 Header
-@app.after_request
-def add_cors_headers(response):
-    response.headers["Access-Control-Allow-Origin"] = VERCEL_URL
-    response.headers["Access-Control-Allow-Credentials"] = "true"
-    response.headers["Access-Control-Allow-Methods"] = "GET, POST, PUT, DELETE, OPTIONS"
-    response.headers["Access-Control-Allow-Headers"] = "Content-Type, Authorization, X-Requested-With"
-    return response
-    
-# --- 3. 自動建立資料庫表 ---
-with app.app_context():
-    try:
-        db.create_all()
-        print("Database tables created successfully.")
-    except Exception as e:
-        print(f"Error creating database tables: {e}")
-
-# --- 4. 註冊藍圖 ---
-app.register_blueprint(task_bp)
-app.register_blueprint(progress_bp, url_prefix='/progress') # 確保這裡的路徑與前端一致
-app.register_blueprint(auth_bp, url_prefix='/auth')
-app.register_blueprint(review_bp, url_prefix='/api/review')
-app.register_blueprint(teacher_bp, url_prefix='/api/teacher') # 修正重複路徑
-app.register_blueprint(config_bp, url_prefix='/api/config')
-
-# 加入這段在 app.register_blueprint 之後
-# backend/app.py
-
-with app.app_context():
-    db.create_all()  # 正常建立
-    
-    # 💡 強制檢查並補齊缺失欄位的特殊邏輯
-    try:
-        from sqlalchemy import text
-        # 1. 檢查並補齊 is_corrected
-        db.session.execute(text("ALTER TABLE progresses ADD COLUMN IF NOT EXISTS is_corrected BOOLEAN DEFAULT FALSE;"))
-        # 2. 檢查並補齊 ai_insight
-        db.session.execute(text("ALTER TABLE progresses ADD COLUMN IF NOT EXISTS ai_insight TEXT;"))
-        # 3. 檢查並補齊可能遺失的 progress_percent (如果你的 model 有這欄)
-        db.session.execute(text("ALTER TABLE progresses ADD COLUMN IF NOT EXISTS progress_percent INTEGER DEFAULT 0;"))
-        
-        db.session.commit()
-        print("✅ 資料庫欄位補齊檢查完成！")
-    except Exception as e:
-        db.session.rollback()
-        print(f"⚠️ 欄位補齊失敗 (可能已存在): {e}")
-
-    # ⛔ 務必註解掉這行，不要再刪除資料了
-    # db.drop_all()
-    
-@app.route('/')
-def hello():
-    return 'Flask Self-Study Backend OK!'
-
-if __name__ == '__main__':
-    port = int(os.environ.get("PORT", 5000))
-    app.run(host='0.0.0.0', port=port)
-
-
-
-
-
-
-
-
-
-
 
+def create_app(auto_migrate=None):
+    """
+    建立 Flask app。gunicorn 請使用 `gunicorn wsgi:app`。
+    auto_migrate 為 None 時依 config.AUTO_MIGRATE 決定是否在啟動時建表與執行遷移；
+    關閉時仍會檢查資料庫版本，落後程式碼才補跑遷移。
+    """
+    app = Flask(__name__)
+
+    # --- 1. 資料庫配置 (連線字串與連線池設定都在 config.py) ---
+    app.config['SQLALCHEMY_DATABASE_URI'] = config.SQLALCHEMY_DATABASE_URI
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = config.SQLALCHEMY_TRACK_MODIFICATIONS
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = config.SQLALCHEMY_ENGINE_OPTIONS
+
+    # 初始化資料庫
+    db.init_app(app)
+
+    # 延遲 / SQL 次數 / AI 耗時量測 (最先掛上，計時才涵蓋其他 hook；/metrics 輸出)
+    instrumentation.init_app(app)
+
+    # --- 2. CORS 修正版 (專為 Vercel 前端優化) ---
+    # A. 基礎宣告
+    CORS(app, 
+         supports_credentials=True, 
+         resources={r"/*": {"origins": [VERCEL_URL]}})
+
+    # B. 攔截 OPTIONS 預檢請求
+    @app.before_request
+    def handle_preflight():
+        if request.method == "OPTIONS":
+            res = make_response()
+            res.headers.add("Access-Control-Allow-Origin", VERCEL_URL)
+            res.headers.add("Access-Control-Allow-Headers", "Content-Type, Authorization, X-Requested-With")
+            res.headers.add("Access-Control-Allow-Methods", "GET, POST, PUT, DELETE, OPTIONS")
+            res.headers.add("Access-Control-Allow-Credentials", "true")
+            return res, 200
+
+    # C. 確保所有 Response 都帶有 Header
+    @app.after_request
+    def add_cors_headers(response):
+        response.headers["Access-Control-Allow-Origin"] = VERCEL_URL
+        response.headers["Access-Control-Allow-Credentials"] = "true"
+        response.headers["Access-Control-Allow-Methods"] = "GET, POST, PUT, DELETE, OPTIONS"
+        response.headers["Access-Control-Allow-Headers"] = "Content-Type, Authorization, X-Requested-With"
+        response.headers["Access-Control-Expose-Headers"] = "X-Next-Cursor, ETag"
+        return response
+
+    # D. 大型 JSON 回應壓縮 (串流回應不處理)
+    app.after_request(compress_response)
+
+    # --- 3. 註冊藍圖 ---
+    for _, module_name, attr, prefix in enabled_blueprints():
+        blueprint = getattr(importlib.import_module(module_name), attr)
+        app.register_blueprint(blueprint, url_prefix=prefix)
+
+    @app.route('/')
+    def hello():
+        return 'Flask Self-Study Backend OK!'
+
+    # --- 4. 建表與遷移 ---
+    # 💡 每個 worker 開機都跑 create_all + 遷移檢查會拖慢冷啟動，正式環境改在部署時執行一次 `python -m migrations`；
+    #    沒有自動遷移時只查一次 schema_migrations 的最新版本，部署漏跑遷移時不會帶著缺表的資料庫上線
+    if config.AUTO_MIGRATE if auto_migrate is None else auto_migrate:
+        migrate(app)
+    else:
+        migrate_if_pending(app)
+
+    # ⛔ 務必不要再呼叫 db.drop_all()，會刪除資料
+    return app
+
+
+def migrate(app):
+    """ 依 models 建立缺少的表，再套用尚未執行的版本化遷移 """
+    with app.app_context():
+        try:
+            db.create_all()
+            run_migrations(db.engine)
+        except Exception as e:
+            print(f"⚠️ 資料庫建表/遷移失敗: {e}")
+
+
+def migrate_if_pending(app):
+    """
+    開機快速檢查：資料庫版本已是最新就直接啟動，否則取得遷移鎖後補跑 migrate()。
+    多個 worker 同時開機時，沒搶到鎖的會等待，拿到鎖後重新檢查版本 (通常已由別的 worker 遷移完成)；
+    自己補跑後仍落後才拒絕啟動。
+    """
+    with app.app_context():
+        current, latest = schema_version(db.engine), latest_version()
+        if current >= latest:
+            return
+        with migration_lock(db.engine):
+            current = schema_version(db.engine)
+            if current < latest:
+                print(f"⚠️ 資料庫遷移版本 {current} 落後程式碼 {latest}，啟動時補跑遷移")
+                migrate(app)
+                current = schema_version(db.engine)
+    if current < latest:
+        raise RuntimeError(f"資料庫遷移版本 {current} 落後程式碼 {latest}，請先執行 `python -m migrations`")
+
+
+def __getattr__(name):
+    # 相容舊的啟動指令 `gunicorn app:app`：第一次取用時才建立 app
+    if name == 'app':
+        globals()['app'] = create_app()
+        return globals()['app']
+    raise AttributeError(name)
 
 
+if __name__ == '__main__':
+    # 本地開發：直接執行 python app.py 時自動建表與遷移
+    port = int(os.environ.get("PORT", 5000))
+    create_app(auto_migrate=True).run(host='0.0.0.0', port=port)
@@ -0,0 +1,2 @@
+# benchmarks/__init__.py
+""" 效能量測腳本 (非單元測試)：在 backend 目錄下以 `python -m benchmarks.<名稱>` 執行 """
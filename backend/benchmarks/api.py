@@ -0,0 +1,235 @@
+# benchmarks/api.py
+"""
+端到端 API 壓測：建立一個全新的資料庫、寫入合成資料，透過 Flask test client 呼叫各藍圖的主要路由，
+AI 呼叫以 set_model_factory 換成本地假模型 (不連網)。每個情境回報 p50 / p95 延遲、
+每次請求的 SQL 數、平均回應大小與單次請求的記憶體峰值 (tracemalloc)。
+
+    python -m benchmarks.api                                   # 預設 5 位使用者、2000 筆進度 (SQLite 暫存檔)
+    python -m benchmarks.api --users 50 --progress 200000 --iterations 30
+    python -m benchmarks.api --only progress,review --save baseline.json
+    python -m benchmarks.api --compare baseline.json --tolerance 0.25   # 退步超過 25% 或 SQL 數增加時結束碼為 1
+
+--database-url 可指向空的 PostgreSQL 測試資料庫 (不要指向正式資料庫，會寫入大量資料)。
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+WINDOW_DAYS = 14   # tasks.windowed 情境的日期區間長度
+
+class _Reply:
+    def __init__(self, text):
+        self.text = text
+
+class StubModel:
+    """ 假的 Gemini 模型：批次提示回傳合法 JSON，其餘回傳固定文字；latency 模擬網路延遲 """
+    def __init__(self, latency=0.0):
+        self.latency = latency
+
+    def _answer(self, prompt):
+        if 'JSON 陣列' in prompt:
+            ids = [int(i) for i in re.findall(r'\(id=(\d+)\)', prompt)]
+            return json.dumps([{'id': i, 'insight': f'模擬診斷 {i}'} for i in ids], ensure_ascii=False)
+        return '模擬回覆：' + prompt[-40:]
+
+    def generate_content(self, prompt, stream=False, **kwargs):
+        time.sleep(self.latency)
+        text = self._answer(prompt)
+        if stream:
+            return [_Reply(text[i:i + 20]) for i in range(0, len(text), 20)]
+        return _Reply(text)
+
+def _scenarios(ctx):
+    """ (名稱, 藍圖, 方法, 路徑或產生路徑的函式, 請求內容或產生函式)；i 為第幾次呼叫 """
+    uid, start, end = ctx['user_id'], ctx['start'], ctx['end']
+    tasks, progresses = ctx['task_ids'], ctx['progress_ids']
+    period = f"start={start}&end={end}"
+    window_end = (date.fromisoformat(start) + timedelta(days=WINDOW_DAYS)).isoformat()
+    return [
+        ('tasks.list_all', 'task', 'GET', f'/tasks?user_id={uid}', None),
+        # 同樣的欄位與排序，只差有沒有日期區間：比較前端改為只載入目前區間的效益 (回應大小與延遲)
+        ('tasks.unwindowed', 'task', 'GET', f'/tasks?user_id={uid}&fields=id,subject,title,date,status', None),
+        ('tasks.windowed', 'task', 'GET',
+         f'/tasks?user_id={uid}&start={start}&end={window_end}&fields=id,subject,title,date,status', None),
+        ('tasks.list_page', 'task', 'GET', f'/tasks?user_id={uid}&{period}&limit=100&fields=id,subject,date,status', None),
+        ('tasks.create', 'task', 'POST', '/tasks',
+         lambda i: {'user_id': uid, 'subject': '數學', 'title': f'bench {i}', 'type': '評量', 'date': start}),
+        ('tasks.patch', 'task', 'PATCH', lambda i: f'/tasks/{tasks[i % len(tasks)]}',
+         lambda i: {'user_id': uid, 'title': f'patched {i}'}),
+        ('progress.with_tasks_stream', 'progress', 'GET', f'/progress/with_tasks?user_id={uid}', None),
+        ('progress.with_tasks_page', 'progress', 'GET', f'/progress/with_tasks?user_id={uid}&{period}&limit=200', None),
+        ('progress.summary', 'progress', 'GET', f'/progress/summary?user_id={uid}', None),
+        ('progress.trend', 'progress', 'GET', f'/progress/trend?user_id={uid}&granularity=week&points=50', None),
+        ('progress.patch', 'progress', 'PATCH', lambda i: f'/progress/{progresses[i % len(progresses)]}',
+         lambda i: {'user_id': uid, 'score': 60 + i % 40, 'student_note': f'p.{i} 計算錯誤'}),
+        ('progress.bulk_20', 'progress', 'POST', '/progress/bulk', lambda i: {'user_id': uid, 'rows': [
+            {'task_id': tasks[(i * 20 + k) % len(tasks)], 'date': start, 'progress_percent': 50}
+            for k in range(20)]}),
+        ('review.list', 'review', 'GET', f'/api/review/list?user_id={uid}&{period}', None),
+        ('review.search', 'review', 'GET', f'/api/review/search?user_id={uid}&q=計算', None),
+        ('review.ai_diagnose', 'review', 'POST', '/api/review/ai_diagnose',
+         lambda i: {'user_id': uid, 'id': progresses[i % len(progresses)], 'subject': '數學', 'unit': '第1單元',
+                    'note': f'計算錯誤 #{i}'}),
+        ('review.ai_diagnose_batch', 'review', 'POST', '/api/review/ai_diagnose_batch',
+         lambda i: {'user_id': uid, 'ids': progresses[(i * 10) % len(progresses):][:10], 'force': True}),
+        ('teacher.analysis', 'teacher', 'GET', f'/api/teacher/analysis?user_id={uid}&{period}', None),
+        ('teacher.generate_quiz', 'teacher', 'POST', '/api/teacher/generate_quiz',
+         lambda i: {'user_id': uid, 'subject': ['數學', '社會', '自然'][i % 3]}),
+        ('config.publishers', 'config', 'GET', f'/api/config/publishers?user_id={uid}', None),
+        ('config.global', 'config', 'GET', f'/api/config/global?user_id={uid}', None),
+        ('config.ai', 'config', 'GET', f'/api/config/ai?user_id={uid}', None),
+        ('sync.snapshot', 'sync', 'GET', f'/api/sync?user_id={uid}', None),
+        ('sync.delta', 'sync', 'GET', f'/api/sync?user_id={uid}&cursor=0&limit=500', None),
+    ]
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * (len(ordered) - 1)))))
+    return ordered[index]
+
+def run(client, engine, scenarios, iterations, warmup=2):
+    from sqlalchemy import event
+
+    counter = {'n': 0}
+    def count_query(*_):
+        counter['n'] += 1
+    event.listen(engine, 'before_cursor_execute', count_query)
+
+    def call(method, path, body, i):
+        url = path(i) if callable(path) else path
+        payload = body(i) if callable(body) else body
+        response = client.open(url, method=method, json=payload)
+        data = response.get_data()  # 讀完串流回應
+        if response.status_code >= 400:
+            raise RuntimeError(f"{method} {url} -> {response.status_code}: {response.get_data(as_text=True)[:200]}")
+        return len(data)
+
+    results = []
+    try:
+        for name, blueprint, method, path, body in scenarios:
+            for i in range(warmup):
+                call(method, path, body, iterations + i)
+
+            timings, queries, sizes = [], [], []
+            for i in range(iterations):
+                before = counter['n']
+                started = time.perf_counter()
+                sizes.append(call(method, path, body, i))
+                timings.append((time.perf_counter() - started) * 1000)
+                queries.append(counter['n'] - before)
+
+            # 記憶體另外量一次：tracemalloc 會明顯拖慢執行，不與延遲量測混在一起
+            tracemalloc.start()
+            call(method, path, body, iterations + warmup)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+            results.append({
+                'name': name, 'blueprint': blueprint, 'iterations': iterations,
+                'p50_ms': round(statistics.median(timings), 2),
+                'p95_ms': round(_percentile(timings, 95), 2),
+                'mean_ms': round(statistics.mean(timings), 2),
+                'queries': round(statistics.mean(queries), 1),
+                'resp_kb': round(statistics.mean(sizes) / 1024, 1),
+                'peak_kb': round(peak / 1024, 1),
+            })
+    finally:
+        event.remove(engine, 'before_cursor_execute', count_query)
+    return results
+
+def print_report(results):
+    header = f"{'scenario':<28}{'p50 ms':>10}{'p95 ms':>10}{'mean ms':>10}{'SQL/req':>9}{'resp KB':>10}{'peak KB':>10}"
+    print(header)
+    print('-' * len(header))
+    for r in results:
+        print(f"{r['name']:<28}{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}{r['mean_ms']:>10.2f}"
+              f"{r['queries']:>9.1f}{r['resp_kb']:>10.1f}{r['peak_kb']:>10.1f}")
+
+def compare(results, baseline, tolerance, min_ms=1.0):
+    """ 與基準比較：p95 或回應大小增加超過 tolerance (且差距夠大)、SQL 數增加都算退步 """
+    previous = {r['name']: r for r in baseline['results']}
+    regressions = []
+    for r in results:
+        old = previous.get(r['name'])
+        if not old:
+            continue
+        if r['p95_ms'] > old['p95_ms'] * (1 + tolerance) and r['p95_ms'] - old['p95_ms'] > min_ms:
+            regressions.append(f"{r['name']}: p95 {old['p95_ms']} -> {r['p95_ms']} ms")
+        if r['queries'] > old['queries']:
+            regressions.append(f"{r['name']}: SQL/req {old['queries']} -> {r['queries']}")
+        # 舊的基準檔沒有 resp_kb 時略過
+        if 'resp_kb' in old and r['resp_kb'] > old['resp_kb'] * (1 + tolerance) and r['resp_kb'] - old['resp_kb'] > 1:
+            regressions.append(f"{r['name']}: resp {old['resp_kb']} -> {r['resp_kb']} KB")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='端到端 API 壓測')
+    parser.add_argument('--database-url', help='空的測試資料庫；預設為暫存 SQLite 檔')
+    parser.add_argument('--users', type=int, default=5)
+    parser.add_argument('--progress', type=int, default=2000, help='進度總筆數 (1k ~ 1M)')
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--ai-latency-ms', type=float, default=0, help='假模型每次回應的延遲')
+    parser.add_argument('--only', help='只跑指定藍圖，例如 task,progress')
+    parser.add_argument('--save', help='把結果存成 JSON (作為之後比較的基準)')
+    parser.add_argument('--compare', help='與先前 --save 的 JSON 比較')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    args = parser.parse_args(argv)
+
+    tmp_dir = None
+    if not args.database_url:
+        tmp_dir = tempfile.mkdtemp(prefix='selfstudy-bench-')
+        args.database_url = f"sqlite:///{os.path.join(tmp_dir, 'bench.db')}"
+    # config.py 在匯入時讀取 DATABASE_URL；量測期間關閉 /metrics 的額外計數，避免影響結果
+    os.environ['DATABASE_URL'] = args.database_url
+    os.environ.setdefault('METRICS_ENABLED', '0')
+    # 假模型不受 Gemini 配額限制，放寬限速避免壓測變成在量等待時間
+    os.environ.setdefault('AI_RATE_PER_MINUTE', '1000000')
+    os.environ.setdefault('AI_BURST', '1000')
+
+    from app import create_app
+    from database import db
+    import ai_service
+    from benchmarks.seed import seed_database
+
+    app = create_app(auto_migrate=False)
+    data = seed_database(app, args.users, args.progress)
+    ai_service.set_model_factory(lambda key, model, prompt: StubModel(args.ai_latency_ms / 1000))
+
+    ctx = {'user_id': 1, 'task_ids': data['task_ids'][1], 'progress_ids': data['progress_ids'][1],
+           'start': data['start'].isoformat(), 'end': data['end'].isoformat()}
+    scenarios = _scenarios(ctx)
+    if args.only:
+        wanted = {b.strip() for b in args.only.split(',')}
+        scenarios = [s for s in scenarios if s[1] in wanted]
+
+    with app.app_context():
+        engine = db.engine
+    results = run(app.test_client(), engine, scenarios, args.iterations)
+
+    print(f"\n資料量：{args.users} 位使用者、{args.progress} 筆進度；每個情境 {args.iterations} 次\n")
+    print_report(results)
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump({'users': args.users, 'progress': args.progress, 'results': results}, f,
+                      ensure_ascii=False, indent=2)
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("\n❌ 效能退步：")
+            for line in regressions:
+                print(f"  - {line}")
+            return 1
+        print("\n✅ 與基準相比沒有退步")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,139 @@
+# benchmarks/seed.py
+"""
+產生壓測用的合成資料：多位使用者、任務與進度 (含錯題筆記、老師回饋、分數)。
+原始資料以 executemany 直接寫入，再重跑各遷移的回填步驟，讓彙總表、筆記解析欄位與搜尋索引
+都走和正式環境相同的回填流程。create_app() 開機時就會把空資料庫遷移到最新版，
+所以不能只靠 run_migrations (已套用的版本不會再跑)，而是直接呼叫回填遷移的 upgrade()。
+
+    python -m benchmarks.seed --database-url sqlite:////tmp/bench.db --users 20 --progress 100000
+"""
+import argparse
+import importlib
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+from sqlalchemy import text
+
+SUBJECTS = ['國語', '數學', '社會', '自然', '英文']
+TASK_TYPES = ['自修', '評量', '學校課本', '學校作業', '考卷', '學校定期評量', '補習班']
+MISTAKES = ['計算錯誤', '單位換算錯', '年份記錯', '時序搞混', '粗心看錯題目', '觀念不清', '算式列錯',
+            '字音字形', '文法時態', '實驗步驟順序', '地名混淆', '圖表判讀錯誤']
+FEEDBACK = ['再練習一次', '注意單位', '請訂正後重做', '觀念需要再複習', '很好，繼續保持']
+
+SEMESTER_START = date(2025, 2, 10)
+SEMESTER_DAYS = 140
+BATCH_SIZE = 5000
+
+# 由進度衍生資料的遷移；upgrade() 皆可重跑 (建表 checkfirst、欄位 if missing、整批重算)
+BACKFILL_MIGRATIONS = ['m004_unit_mastery_rollup', 'm006_materialized_note_fields', 'm009_search_postings']
+# 回填後必須有資料的衍生表 / 欄位
+DERIVED_CHECKS = {
+    'unit_mastery_daily': "SELECT COUNT(*) FROM unit_mastery_daily",
+    'search_postings': "SELECT COUNT(*) FROM search_postings",
+    'progresses.clean_note': "SELECT COUNT(*) FROM progresses WHERE clean_note IS NOT NULL",
+}
+
+def _note(rng):
+    page = rng.randint(1, 120)
+    return f"p.{page}-{page + rng.randint(0, 3)} {rng.choice(MISTAKES)} {rng.choice(MISTAKES)}"
+
+def _insert(conn, table, rows):
+    for i in range(0, len(rows), BATCH_SIZE):
+        conn.execute(table.insert(), rows[i:i + BATCH_SIZE])
+
+def backfill_derived(conn):
+    """ 重跑衍生資料的回填遷移，並確認彙總表、搜尋索引與筆記解析欄位都有資料 """
+    for name in BACKFILL_MIGRATIONS:
+        importlib.import_module(f"migrations.{name}").upgrade(conn)
+    counts = {label: conn.execute(text(sql)).scalar() for label, sql in DERIVED_CHECKS.items()}
+    empty = [label for label, count in counts.items() if not count]
+    assert not empty, f"回填後衍生資料仍為空: {', '.join(empty)}"
+    return counts
+
+def seed_database(app, users=5, progress_rows=2000, seed=42, log=print):
+    """
+    在 app 的資料庫建立表並寫入合成資料 (資料庫需為空)；回傳各使用者的任務 id 清單等摘要。
+    每位使用者的任務數約為進度筆數的 0.8 倍：多數任務一筆進度、部分任務多筆或尚無進度。
+    """
+    from database import db, SubjectConfig, AISetting
+    from models import User, Task, Progress
+
+    rng = random.Random(seed)
+    started = time.perf_counter()
+    per_user_progress = max(1, progress_rows // users)
+    per_user_tasks = max(1, int(per_user_progress * 0.8))
+
+    with app.app_context():
+        db.create_all()
+        task_ids, progress_ids = {}, {}
+        with db.engine.begin() as conn:
+            _insert(conn, User.__table__, [
+                {'id': u, 'username': f'bench{u}', 'password': 'bench'} for u in range(1, users + 1)])
+            _insert(conn, SubjectConfig.__table__, [
+                {'user_id': u, 'subject_name': s, 'publisher': '康軒', 'grade': 6,
+                 'midterm_date': SEMESTER_START + timedelta(days=60),
+                 'final_date': SEMESTER_START + timedelta(days=SEMESTER_DAYS - 5)}
+                for u in range(1, users + 1) for s in SUBJECTS])
+            _insert(conn, AISetting.__table__, [
+                {'user_id': u, 'api_key': 'bench-key', 'model_name': 'bench-model', 'system_prompt': '你是家教'}
+                for u in range(1, users + 1)])
+
+            next_task_id, next_progress_id = 1, 1
+            for u in range(1, users + 1):
+                tasks, progresses = [], []
+                for _ in range(per_user_tasks):
+                    subject = rng.choice(SUBJECTS)
+                    tasks.append({
+                        'id': next_task_id, 'user_id': u, 'subject': subject,
+                        'title': f"{subject} 第{rng.randint(1, 12)}課練習", 'type': rng.choice(TASK_TYPES),
+                        'date': SEMESTER_START + timedelta(days=rng.randrange(SEMESTER_DAYS)),
+                        'status': '未開始', 'unit': f"第{rng.randint(1, 12)}單元",
+                    })
+                    next_task_id += 1
+                for _ in range(per_user_progress):
+                    task = rng.choice(tasks)
+                    percent = rng.choice([30, 50, 80, 100, 100])
+                    progresses.append({
+                        'id': next_progress_id, 'task_id': task['id'], 'user_id': u,
+                        'date': task['date'] + timedelta(days=rng.randint(-3, 3)),
+                        'progress_percent': percent, 'student_note': _note(rng),
+                        'teacher_feedback': rng.choice(FEEDBACK) if rng.random() < 0.3 else None,
+                        'score': rng.choice([None, 0] + list(range(40, 101, 5))),
+                        'is_corrected': rng.random() < 0.4,
+                    })
+                    if percent >= 100:
+                        task['status'] = '已完成'
+                    next_progress_id += 1
+                _insert(conn, Task.__table__, tasks)
+                _insert(conn, Progress.__table__, progresses)
+                task_ids[u] = [t['id'] for t in tasks]
+                progress_ids[u] = [p['id'] for p in progresses]
+
+        log(f"寫入 {users} 位使用者、{next_task_id - 1} 筆任務、{next_progress_id - 1} 筆進度 "
+            f"({time.perf_counter() - started:.1f}s)，開始回填衍生資料…")
+        with db.engine.begin() as conn:
+            counts = backfill_derived(conn)
+
+    log("衍生資料：" + "、".join(f"{label} {count} 筆" for label, count in counts.items()))
+    log(f"資料準備完成 ({time.perf_counter() - started:.1f}s)")
+    return {'users': users, 'task_ids': task_ids, 'progress_ids': progress_ids,
+            'start': SEMESTER_START, 'end': SEMESTER_START + timedelta(days=SEMESTER_DAYS)}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='產生壓測用合成資料')
+    parser.add_argument('--database-url', required=True, help='例如 sqlite:////tmp/bench.db 或 PostgreSQL 連線字串')
+    parser.add_argument('--users', type=int, default=5)
+    parser.add_argument('--progress', type=int, default=2000, help='進度總筆數 (1k ~ 1M)')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args(argv)
+
+    os.environ['DATABASE_URL'] = args.database_url
+    from app import create_app
+    seed_database(create_app(auto_migrate=False), args.users, args.progress, args.seed)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
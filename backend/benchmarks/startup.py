@@ -0,0 +1,92 @@
+# benchmarks/startup.py
+"""
+冷啟動量測與匯入時間預算檢查。
+每一輪都開新的 Python 行程，量測 `import app` 與 `create_app()` 的耗時，
+並確認啟動後沒有載入 Google AI SDK 等重量級套件。
+
+    python -m benchmarks.startup                  # 5 輪，輸出中位數，預算 STARTUP_BUDGET_MS
+    python -m benchmarks.startup --runs 10 --budget-ms 800
+    python -m benchmarks.startup --budget-ms 0    # 只檢查重量級套件，不檢查時間
+    APP_BLUEPRINTS=task,progress python -m benchmarks.startup
+
+超過預算或載入了不該載入的套件時以結束碼 1 結束，可放進部署前的檢查步驟。
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 只有真正呼叫 AI 時才應該載入的套件
+HEAVY_MODULES = ['google.generativeai', 'google.ai.generativelanguage', 'grpc', 'numpy']
+# import app + create_app() 中位數的預設上限 (目前約 450 ms，留空間給較慢的部署機器)
+STARTUP_BUDGET_MS = float(os.environ.get('STARTUP_BUDGET_MS', 1500))
+
+CHILD_SCRIPT = """
+import json, sys, time
+t0 = time.perf_counter()
+import app
+t1 = time.perf_counter()
+flask_app = app.create_app(auto_migrate=False)
+t2 = time.perf_counter()
+print(json.dumps({
+    'import_ms': (t1 - t0) * 1000,
+    'create_ms': (t2 - t1) * 1000,
+    'modules': len(sys.modules),
+    'routes': len(list(flask_app.url_map.iter_rules())),
+    'heavy': [m for m in %r if m in sys.modules],
+}))
+""" % (HEAVY_MODULES,)
+
+def migrated_sqlite_url(directory):
+    """
+    量測不需要真的資料庫；未指定時用暫存 SQLite 檔 (避免載入 MySQL / PostgreSQL 驅動)，
+    先以 `python -m migrations` 建到最新版本，量到的才是正式環境開機的快速路徑 (只查一次遷移版本)
+    """
+    url = f"sqlite:///{os.path.join(directory, 'startup.db')}"
+    subprocess.run([sys.executable, '-m', 'migrations'], cwd=BACKEND_DIR, env=dict(os.environ, DATABASE_URL=url),
+                   capture_output=True, check=True)
+    return url
+
+def run_once(database_url):
+    env = dict(os.environ, DATABASE_URL=database_url)
+    out = subprocess.run([sys.executable, '-c', CHILD_SCRIPT], cwd=BACKEND_DIR, env=env,
+                         capture_output=True, text=True, check=True).stdout
+    # app 初始化時可能有 print，最後一行才是量測結果
+    return json.loads(out.strip().splitlines()[-1])
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--budget-ms', type=float, default=STARTUP_BUDGET_MS,
+                        help='import + create_app 中位數上限 (0 代表不檢查)')
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database_url = os.environ.get('DATABASE_URL') or migrated_sqlite_url(tmp)
+        results = [run_once(database_url) for _ in range(args.runs)]
+    import_ms = statistics.median(r['import_ms'] for r in results)
+    create_ms = statistics.median(r['create_ms'] for r in results)
+    total_ms = statistics.median(r['import_ms'] + r['create_ms'] for r in results)
+    heavy = sorted({m for r in results for m in r['heavy']})
+
+    print(f"runs={args.runs}  import app: {import_ms:.1f} ms  create_app: {create_ms:.1f} ms  total: {total_ms:.1f} ms")
+    print(f"modules loaded: {results[-1]['modules']}  routes: {results[-1]['routes']}")
+
+    failed = False
+    if heavy:
+        print(f"❌ 啟動時載入了重量級套件: {', '.join(heavy)}")
+        failed = True
+    if args.budget_ms and total_ms > args.budget_ms:
+        print(f"❌ 超過匯入時間預算 {args.budget_ms:.0f} ms")
+        failed = True
+    if not failed:
+        print("✅ 啟動檢查通過")
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,160 @@
+# data_version.py
+"""
+每位使用者一個遞增的資料版本號：寫入路由在 commit 前呼叫 record_change() / bump_data_version()，
+讀取路由以版本號產生 ETag，前端帶 If-None-Match 且版本未變時直接回 304。
+record_change() 同時寫入 change_log，供 /api/sync 增量同步；超過保留期限的紀錄定期清除。
+另外負責大型 JSON 回應的 gzip / brotli 壓縮。
+"""
+import gzip
+import os
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta
+from flask import request, make_response
+from database import db, UserDataVersion, upsert_statement
+
+try:
+    import brotli  # 選用套件，未安裝時只提供 gzip
+except ImportError:
+    brotli = None
+
+COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))
+COMPRESS_LEVEL = int(os.environ.get('COMPRESS_LEVEL', 6))
+CHANGE_LOG_RETENTION_DAYS = int(os.environ.get('CHANGE_LOG_RETENTION_DAYS', 30))
+CHANGE_LOG_PRUNE_INTERVAL = int(os.environ.get('CHANGE_LOG_PRUNE_INTERVAL', 3600))   # 每個行程最多多久清一次 (秒)
+
+def bump_data_version(user_id):
+    """
+    在目前的交易中把版本號 +1；與資料變更一起 commit，ETag 不會早於資料更新。
+    以單一 upsert 完成：先 UPDATE 再 INSERT 時，兩個請求同時寫第一筆會有一個撞到主鍵而整筆交易失敗
+    """
+    if not user_id:
+        return
+    uid = int(user_id)
+    table = UserDataVersion.__table__
+    stmt = upsert_statement(db.session.get_bind().dialect.name, table, {'user_id': uid, 'version': 1},
+                            ['user_id'], lambda new: {'version': table.c.version + 1})
+    if stmt is not None:
+        db.session.execute(stmt)
+        return
+    result = db.session.execute(db.text(
+        "UPDATE user_data_versions SET version = version + 1 WHERE user_id = :uid"), {'uid': uid})
+    if result.rowcount == 0:
+        db.session.execute(db.text(
+            "INSERT INTO user_data_versions (user_id, version) VALUES (:uid, 1)"), {'uid': uid})
+
+OP_UPSERT = 'upsert'
+OP_DELETE = 'delete'
+
+def record_changes(user_id, entity, entity_ids, op=OP_UPSERT):
+    """
+    在目前的交易中記錄異動 (entity: task / progress / config.*) 並更新版本號。
+    新增的資料需先 flush 取得 id。
+    """
+    ids = [int(i) for i in entity_ids if i is not None]
+    if not user_id or not ids:
+        return
+    now = datetime.now()
+    db.session.execute(db.text("""
+        INSERT INTO change_log (user_id, entity, entity_id, op, changed_at)
+        VALUES (:uid, :entity, :eid, :op, :at)
+    """), [{'uid': int(user_id), 'entity': entity, 'eid': i, 'op': op, 'at': now} for i in ids])
+    bump_data_version(user_id)
+
+def record_change(user_id, entity, entity_id=0, op=OP_UPSERT):
+    record_changes(user_id, entity, [entity_id], op)
+
+def prune_change_log(conn, now=None):
+    """
+    清除超過 CHANGE_LOG_RETENTION_DAYS 的異動紀錄；先把各使用者被清掉的最大 id 記到 change_log_floor，
+    游標落在這之前的裝置下次同步會收到完整快照，不會因為紀錄被刪而漏資料。回傳刪除筆數。
+    """
+    cutoff = (now or datetime.now()) - timedelta(days=CHANGE_LOG_RETENTION_DAYS)
+    params = {'cutoff': cutoff}
+    # 有異動紀錄的使用者一定已有 user_data_versions 列 (record_changes 會一起更新版本號)
+    conn.execute(db.text("""
+        UPDATE user_data_versions
+        SET change_log_floor = (
+            SELECT MAX(c.id) FROM change_log c
+            WHERE c.user_id = user_data_versions.user_id AND c.changed_at < :cutoff
+        )
+        WHERE EXISTS (
+            SELECT 1 FROM change_log c
+            WHERE c.user_id = user_data_versions.user_id AND c.changed_at < :cutoff
+        )
+    """), params)
+    return conn.execute(db.text("DELETE FROM change_log WHERE changed_at < :cutoff"), params).rowcount
+
+_last_prune = [0.0]
+_prune_lock = threading.Lock()
+
+def maybe_prune_change_log():
+    """ 由 /api/sync 呼叫：每個行程每 CHANGE_LOG_PRUNE_INTERVAL 秒最多清一次；失敗只記錄，不影響同步 """
+    now = time.monotonic()
+    with _prune_lock:
+        if _last_prune[0] and now - _last_prune[0] < CHANGE_LOG_PRUNE_INTERVAL:
+            return
+        _last_prune[0] = now
+    try:
+        with db.engine.begin() as conn:
+            deleted = prune_change_log(conn)
+        if deleted:
+            print(f"🧹 清除 {deleted} 筆逾期異動紀錄")
+    except Exception as e:
+        print(f"⚠️ 清除異動紀錄失敗: {e}")
+
+def get_change_log_floor(user_id):
+    return db.session.execute(db.text(
+        "SELECT change_log_floor FROM user_data_versions WHERE user_id = :uid"), {'uid': int(user_id)}).scalar() or 0
+
+def get_data_version(user_id):
+    row = db.session.execute(db.text(
+        "SELECT version FROM user_data_versions WHERE user_id = :uid"), {'uid': int(user_id)}).fetchone()
+    return row.version if row else 0
+
+def _etag_for(user_id):
+    # 同一個版本下，不同查詢參數 (區間、欄位、分頁) 的回應也不同，所以把完整路徑一起納入
+    path_hash = zlib.crc32(request.full_path.encode('utf-8')) & 0xffffffff
+    return f'W/"{int(user_id)}-{get_data_version(user_id)}-{path_hash:08x}"'
+
+def conditional(user_id, build):
+    """
+    條件式 GET：版本未變且 If-None-Match 相符時回 304，不執行 build()；
+    否則呼叫 build() 產生回應並附上 ETag。build 回傳值與一般路由相同。
+    """
+    etag = _etag_for(user_id)
+    client_tags = [t.strip() for t in request.headers.get('If-None-Match', '').split(',')]
+    if etag in client_tags:
+        response = make_response('', 304)
+    else:
+        response = make_response(build())
+        if response.status_code != 200:
+            return response
+    response.headers['ETag'] = etag
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+def _accepts(encoding):
+    return encoding in request.headers.get('Accept-Encoding', '').lower()
+
+def compress_response(response):
+    """ after_request：壓縮夠大的 JSON 回應；串流回應 (with_tasks、SSE) 不處理 """
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or response.mimetype != 'application/json' or 'Content-Encoding' in response.headers):
+        return response
+
+    body = response.get_data()
+    if len(body) < COMPRESS_MIN_SIZE:
+        return response
+
+    if brotli is not None and _accepts('br'):
+        response.set_data(brotli.compress(body))
+        response.headers['Content-Encoding'] = 'br'
+    elif _accepts('gzip'):
+        response.set_data(gzip.compress(body, compresslevel=COMPRESS_LEVEL))
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        return response
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
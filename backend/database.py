@@ -1,3 +1,4 @@
+from flask import g, has_app_context
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy import text
 from datetime import datetime
@@ -25,13 +26,142 @@ class AISetting(db.Model):
     model_name = db.Column(db.String(50))
     base_url = db.Column(db.String(255))
 
+# 預設科目 (新用戶初始化 subject_configs 時使用)
+DEFAULT_SUBJECTS = ['國語', '數學', '社會', '自然', '英文']
+# 代表「全部科目」的查詢值
+ALL_SUBJECTS_VALUES = ('', '全部', 'all')
+
+# AI 回覆快取 (以模型、System Prompt 與提問內容的雜湊為鍵)
+class AIResponseCache(db.Model):
+    __tablename__ = 'ai_response_cache'
+    cache_key = db.Column(db.String(64), primary_key=True)
+    model_name = db.Column(db.String(50))
+    content = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False)
+    last_hit_at = db.Column(db.DateTime, nullable=False, index=True)
+    hit_count = db.Column(db.Integer, default=0, nullable=False)
+
+# 每位使用者的資料版本號 (任何寫入都會 +1，用來產生 ETag)
+# change_log_floor：該使用者已清除的異動紀錄最大 id，游標小於它的同步必須改拿完整快照
+class UserDataVersion(db.Model):
+    __tablename__ = 'user_data_versions'
+    user_id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False, default=0)
+    change_log_floor = db.Column(db.BigInteger, nullable=False, default=0, server_default='0')
+
+# 每位使用者的異動紀錄 (增量同步用)；id 即同步游標，刪除以 op='delete' 留下墓碑
+class ChangeLog(db.Model):
+    __tablename__ = 'change_log'
+    id = db.Column(db.BigInteger().with_variant(db.Integer, 'sqlite'), primary_key=True, autoincrement=True)
+    user_id = db.Column(db.Integer, nullable=False)
+    entity = db.Column(db.String(30), nullable=False)
+    entity_id = db.Column(db.Integer, nullable=False)
+    op = db.Column(db.String(10), nullable=False)
+    changed_at = db.Column(db.DateTime, nullable=False)
+    __table_args__ = (db.Index('ix_change_log_user_id', 'user_id', 'id'),
+                      db.Index('ix_change_log_changed_at', 'changed_at'))
+
+# 進度文字的倒排索引 (search_index.py 維護)
+class SearchPosting(db.Model):
+    __tablename__ = 'search_postings'
+    progress_id = db.Column(db.Integer, primary_key=True)
+    field = db.Column(db.String(16), primary_key=True)
+    term = db.Column(db.String(32), primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False)
+    __table_args__ = (db.Index('ix_search_postings_user_term', 'user_id', 'term', 'progress_id'),)
+
 # --- 函式部分 ---
 
+def upsert_statement(dialect, table, values, key_columns, updates):
+    """
+    單一語句的「不存在就新增、已存在就更新」：PostgreSQL / SQLite 用 ON CONFLICT DO UPDATE，MySQL 用 ON DUPLICATE KEY UPDATE。
+    dialect 為方言名稱 (bind.dialect.name)；updates(new) 回傳 {欄位: 運算式}，new 代表這次要寫入的值。
+    其他方言回傳 None，由呼叫端自行退回一般寫法。
+    """
+    if dialect == 'mysql':
+        from sqlalchemy.dialects.mysql import insert
+        stmt = insert(table).values(**values)
+        return stmt.on_duplicate_key_update(updates(stmt.inserted))
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        return None
+    stmt = insert(table).values(**values)
+    return stmt.on_conflict_do_update(index_elements=list(key_columns), set_=updates(stmt.excluded))
+
+def normalize_subject(subject):
+    """ 統一科目查詢值：去除空白；空值或「全部」回傳 None，代表不過濾科目 """
+    value = (subject or '').strip()
+    if value.lower() in ALL_SUBJECTS_VALUES:
+        return None
+    return value
+
+def clean_subject(subject):
+    """ 寫入任務用：去除空白；空值或「全部」不是合法科目 (前端以科目名稱比對顏色)，拋出 ValueError """
+    value = normalize_subject(subject)
+    if not value:
+        raise ValueError("科目不可為空白或「全部」")
+    return value
+
+def subject_filter_sql(subject, column='t.subject'):
+    """ 產生精確比對的科目條件 (可走索引)；全部科目時回傳空字串 """
+    return f"AND {column} = :sub" if subject else ""
+
+def get_user_subjects(user_id):
+    """ 使用者的科目清單：以 subject_configs 為準，沒有設定時回傳預設科目 """
+    return list(load_subject_configs(user_id)['subjects']) or list(DEFAULT_SUBJECTS)
+
+# 科目設定快取：只存在 flask.g (同一請求內共用一次查詢)。
+# 💡 不做跨請求的行程快取：多個 gunicorn worker 時，設定變更只能清掉目前 worker 的快取，其他 worker 會讀到舊設定
+DEFAULT_SUBJECT_CONFIG = {"publisher": "康軒", "grade": 6}
+
+def load_subject_configs(user_id):
+    """
+    一次讀取使用者全部科目設定：
+    {'subjects': {科目: {publisher, grade}}, 'exam_dates': {midterm_date, final_date}}
+    """
+    key = str(user_id)
+    request_cache = g.setdefault('_subject_configs', {}) if has_app_context() else {}
+    if key in request_cache:
+        return request_cache[key]
+
+    sql = text("""
+        SELECT subject_name, publisher, grade, midterm_date, final_date
+        FROM subject_configs WHERE user_id = :uid ORDER BY id
+    """)
+    rows = db.session.execute(sql, {'uid': user_id}).fetchall()
+
+    configs = {'subjects': {}, 'exam_dates': {"midterm_date": None, "final_date": None}}
+    exam_row = None
+    for r in rows:
+        configs['subjects'][r.subject_name] = {"publisher": r.publisher, "grade": r.grade}
+        if exam_row is None and r.midterm_date is not None:
+            exam_row = r
+    if exam_row is not None:
+        configs['exam_dates'] = {
+            "midterm_date": _date_str(exam_row.midterm_date),
+            "final_date": _date_str(exam_row.final_date)
+        }
+
+    request_cache[key] = configs
+    return configs
+
+def invalidate_subject_configs(user_id):
+    """ /api/config/publishers 或 /global 寫入後呼叫，同一請求之後的讀取才會看到新設定 """
+    if has_app_context():
+        g.get('_subject_configs', {}).pop(str(user_id), None)
+
+def _date_str(value):
+    if not value:
+        return None
+    # SQLite 等驅動可能直接回傳字串
+    return value.strftime('%Y-%m-%d') if hasattr(value, 'strftime') else str(value)[:10]
+
 def get_subject_publisher(user_id, subject):
     try:
-        sql = text("SELECT publisher FROM subject_configs WHERE user_id = :uid AND subject_name = :sub")
-        result = db.session.execute(sql, {'uid': user_id, 'sub': subject}).fetchone()
-        return result[0] if result else "康軒"
+        return get_subject_config(user_id, subject)["publisher"]
     except Exception as e:
         print(f"查詢出版社出錯: {e}")
         return "康軒"
@@ -40,25 +170,15 @@ def get_subject_publisher(user_id, subject):
 def get_subject_config(user_id, subject):
     """ 供路由調用：回傳特定學科的出版社與年級 """
     try:
-        sql = text("SELECT publisher, grade FROM subject_configs WHERE user_id = :uid AND subject_name = :sub")
-        result = db.session.execute(sql, {'uid': user_id, 'sub': subject}).fetchone()
-        if result:
-            return {"publisher": result[0], "grade": result[1]}
-        return {"publisher": "康軒", "grade": 6}
+        config = load_subject_configs(user_id)['subjects'].get(subject)
+        return dict(config) if config else dict(DEFAULT_SUBJECT_CONFIG)
     except Exception as e:
         print(f"get_subject_config 出錯: {e}")
-        return {"publisher": "康軒", "grade": 6}
+        return dict(DEFAULT_SUBJECT_CONFIG)
 
 def get_exam_dates(user_id):
     try:
-        sql = text("SELECT midterm_date, final_date FROM subject_configs WHERE user_id = :uid AND midterm_date IS NOT NULL LIMIT 1")
-        result = db.session.execute(sql, {'uid': user_id}).fetchone()
-        if result:
-            return {
-                "midterm_date": result[0].strftime('%Y-%m-%d') if result[0] else None,
-                "final_date": result[1].strftime('%Y-%m-%d') if result[1] else None
-            }
-        return {"midterm_date": None, "final_date": None}
+        return dict(load_subject_configs(user_id)['exam_dates'])
     except Exception as e:
         print(f"查詢考期出錯: {e}")
         return {"midterm_date": None, "final_date": None}
@@ -81,8 +201,7 @@ def update_all_subject_configs(user_id, grade, midterm_date, final_date):
             db.session.execute(sql, {'uid': user_id, 'grade': grade, 'md': midterm_date, 'fd': final_date})
         else:
             # 3. 如果不存在（新用戶），為預設的五個科目建立初始設定
-            subjects = ['國語', '數學', '社會', '自然', '英文']
-            for sub in subjects:
+            for sub in DEFAULT_SUBJECTS:
                 insert_sql = text("""
                     INSERT INTO subject_configs (user_id, subject_name, grade, midterm_date, final_date, publisher)
                     VALUES (:uid, :sub, :grade, :md, :fd, '康軒')
@@ -93,6 +212,7 @@ def update_all_subject_configs(user_id, grade, midterm_date, final_date):
                 })
         
         db.session.commit()
+        invalidate_subject_configs(user_id)
         return True
     except Exception as e:
         db.session.rollback()
@@ -0,0 +1,189 @@
+# instrumentation.py
+"""
+請求層級的效能量測：每個請求的延遲、SQL 查詢次數、慢查詢與 AI 呼叫耗時。
+以 Prometheus 文字格式在 /metrics 輸出 (依藍圖加標籤)，數值只存在本行程記憶體，
+多個 gunicorn worker 時每個 worker 各自計數。
+
+環境變數：
+    METRICS_ENABLED=0     關閉量測與 /metrics
+    METRICS_TOKEN=xxx     /metrics 需帶 Authorization: Bearer xxx
+    SLOW_QUERY_MS=200     超過此毫秒數的 SQL 會印出 (0 或未設定為關閉)
+"""
+import os
+import threading
+import time
+from flask import g, request, has_request_context, Response
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1').strip().lower() not in ('0', 'false', 'no', 'off')
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', 0) or 0)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+AI_BUCKETS = (0.25, 0.5, 1, 2, 5, 10, 20, 40, 60)
+
+_lock = threading.Lock()
+
+class Histogram:
+    """ 極簡版 Prometheus histogram：依標籤值組合累計各 bucket、總和與次數 """
+    def __init__(self, name, help_text, label_names, buckets):
+        self.name, self.help, self.label_names, self.buckets = name, help_text, label_names, buckets
+        self._series = {}  # labels -> [bucket counts..., sum, count]
+
+    def observe(self, value, *labels):
+        with _lock:
+            series = self._series.setdefault(labels, [0] * len(self.buckets) + [0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with _lock:
+            items = sorted(self._series.items())
+        for labels, series in items:
+            base = _labels(self.label_names, labels)
+            for bound, count in zip(self.buckets, series):
+                lines.append(f'{self.name}_bucket{{{base}{"," if base else ""}le="{bound}"}} {count}')
+            lines.append(f'{self.name}_bucket{{{base}{"," if base else ""}le="+Inf"}} {series[-1]}')
+            lines.append(f"{self.name}_sum{{{base}}} {series[-2]:.6f}")
+            lines.append(f"{self.name}_count{{{base}}} {series[-1]}")
+        return lines
+
+class Counter:
+    def __init__(self, name, help_text, label_names):
+        self.name, self.help, self.label_names = name, help_text, label_names
+        self._values = {}
+
+    def inc(self, *labels, amount=1):
+        with _lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with _lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            lines.append(f"{self.name}{{{_labels(self.label_names, labels)}}} {value}")
+        return lines
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(names, values):
+    return ','.join(f'{n}="{_escape(v)}"' for n, v in zip(names, values))
+
+REQUEST_LATENCY = Histogram('http_request_duration_seconds', 'Request latency (streamed responses: time to first byte)',
+                            ('blueprint', 'endpoint', 'method', 'status'), LATENCY_BUCKETS)
+REQUEST_QUERIES = Histogram('http_request_sql_queries', 'SQL statements executed per request',
+                            ('blueprint', 'endpoint'), QUERY_COUNT_BUCKETS)
+SQL_LATENCY = Histogram('sql_query_duration_seconds', 'SQL statement latency',
+                        ('blueprint',), LATENCY_BUCKETS)
+SLOW_QUERIES = Counter('sql_slow_queries_total', 'SQL statements slower than SLOW_QUERY_MS', ('blueprint',))
+AI_LATENCY = Histogram('ai_request_duration_seconds', 'Gemini call latency',
+                       ('kind', 'model', 'outcome'), AI_BUCKETS)
+AI_CACHE_HITS = Counter('ai_cache_hits_total', 'AI requests answered from ai_response_cache', ('kind',))
+AI_EVENTS = Counter('ai_call_events_total', 'Gemini calls, throttles, retries, timeouts and hedges', ('event',))
+
+METRICS = [REQUEST_LATENCY, REQUEST_QUERIES, SQL_LATENCY, SLOW_QUERIES, AI_LATENCY, AI_CACHE_HITS, AI_EVENTS]
+
+def _current_blueprint():
+    if has_request_context():
+        return request.blueprint or 'app'
+    return 'background'  # 背景工作 (ai_jobs)、遷移等非請求情境
+
+# --- SQLAlchemy 事件：所有 Engine 的每一條 SQL ---
+
+# 開始時間記在這次執行的 context 上 (每條 SQL 一個)，不放 conn.info 的堆疊：
+# 執行失敗時不會觸發 after_cursor_execute，堆疊會留下沒配對的項目，讓之後的計時錯位
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._query_started = time.perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, '_query_started', None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    blueprint = _current_blueprint()
+    SQL_LATENCY.observe(elapsed, blueprint)
+    if has_request_context():
+        g._sql_queries = g.get('_sql_queries', 0) + 1
+    if SLOW_QUERY_MS and elapsed * 1000 >= SLOW_QUERY_MS:
+        SLOW_QUERIES.inc(blueprint)
+        print(f"🐢 慢查詢 {elapsed * 1000:.0f} ms [{blueprint}] {' '.join(statement.split())[:500]}")
+
+_listeners_installed = False
+
+def install_sql_listeners():
+    global _listeners_installed
+    if _listeners_installed:
+        return
+    event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+    _listeners_installed = True
+
+# --- AI 呼叫 (由 ai_service 呼叫) ---
+
+def observe_ai(kind, model, seconds, outcome):
+    """ kind: ask / stream；outcome: ok / error """
+    if METRICS_ENABLED:
+        AI_LATENCY.observe(seconds, kind, model or '', outcome)
+
+def count_ai_cache_hit(kind):
+    if METRICS_ENABLED:
+        AI_CACHE_HITS.inc(kind)
+
+def count_ai_event(event):
+    """ event: calls / throttled / retried / timeouts / hedged / hedge_wins (由 ai_limits 呼叫) """
+    if METRICS_ENABLED:
+        AI_EVENTS.inc(event)
+
+# --- Flask 掛載 ---
+
+def _start_timer():
+    g._request_started = time.perf_counter()
+    g._sql_queries = 0
+
+def _record(status):
+    started = g.pop('_request_started', None)
+    if started is None:
+        return
+    blueprint = request.blueprint or 'app'
+    endpoint = request.endpoint or 'unmatched'
+    REQUEST_LATENCY.observe(time.perf_counter() - started, blueprint, endpoint, request.method, str(status))
+    REQUEST_QUERIES.observe(g.get('_sql_queries', 0), blueprint, endpoint)
+
+def _after_request(response):
+    _record(response.status_code)
+    return response
+
+def _teardown_request(exc):
+    # 未處理的例外不會經過 after_request，在這裡補記為 500
+    if exc is not None:
+        _record(500)
+
+def render_metrics():
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+def metrics_view():
+    if METRICS_TOKEN and request.headers.get('Authorization') != f"Bearer {METRICS_TOKEN}":
+        return Response('unauthorized\n', status=401, mimetype='text/plain')
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+def init_app(app):
+    """ 在註冊藍圖前呼叫，讓計時涵蓋其他 before/after_request 處理 """
+    if not METRICS_ENABLED:
+        return
+    install_sql_listeners()
+    app.before_request(_start_timer)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+    app.add_url_rule('/metrics', 'metrics', metrics_view, methods=['GET'])
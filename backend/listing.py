@@ -0,0 +1,77 @@
+# listing.py
+""" 列表型 API 的共用查詢參數：日期區間、條件篩選、Keyset 分頁與欄位投影 """
+from datetime import datetime
+from database import normalize_subject
+
+MAX_PAGE_LIMIT = 1000
+
+def _parse_date(value, name):
+    try:
+        return datetime.strptime(value[:10], '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} 日期格式錯誤，需為 YYYY-MM-DD")
+
+def parse_list_args(args, allowed_fields):
+    """
+    解析 start/end/subject/type/status/cursor/limit/fields 查詢參數。
+    參數不合法時拋出 ValueError，由路由轉成 400。
+    """
+    opts = {
+        'start': _parse_date(args['start'], 'start') if args.get('start') else None,
+        'end': _parse_date(args['end'], 'end') if args.get('end') else None,
+        'subject': normalize_subject(args.get('subject')),
+        'type': args.get('type') or None,
+        'status': args.get('status') or None,
+        'cursor': None,
+        'limit': None,
+        'fields': None,
+    }
+
+    # cursor 為上一頁最後一筆的任務 id (依 id 遞增排序)
+    if args.get('cursor'):
+        try:
+            opts['cursor'] = int(args['cursor'])
+        except ValueError:
+            raise ValueError("cursor 格式錯誤")
+
+    if args.get('limit'):
+        try:
+            limit = int(args['limit'])
+        except ValueError:
+            raise ValueError("limit 必須是整數")
+        if limit <= 0:
+            raise ValueError("limit 必須大於 0")
+        opts['limit'] = min(limit, MAX_PAGE_LIMIT)
+
+    if args.get('fields'):
+        fields = [f.strip() for f in args['fields'].split(',') if f.strip()]
+        unknown = [f for f in fields if f not in allowed_fields]
+        if unknown:
+            raise ValueError(f"不支援的欄位: {', '.join(unknown)}")
+        opts['fields'] = fields
+
+    return opts
+
+def task_filter_sql(opts, alias='t'):
+    """ 產生 tasks 表的 WHERE 片段 (不含 user_id) 與對應參數 """
+    clauses, params = [], {}
+    if opts['start']:
+        clauses.append(f"{alias}.date >= :start")
+        params['start'] = opts['start']
+    if opts['end']:
+        clauses.append(f"{alias}.date <= :end")
+        params['end'] = opts['end']
+    for key in ('subject', 'type', 'status'):
+        if opts[key]:
+            clauses.append(f"{alias}.{key} = :{key}")
+            params[key] = opts[key]
+    if opts['cursor']:
+        clauses.append(f"{alias}.id > :cursor")
+        params['cursor'] = opts['cursor']
+    return clauses, params
+
+def set_next_cursor(response, opts, last_id, row_count):
+    """ 本頁筆數等於 limit 時，於 X-Next-Cursor 標頭回傳下一頁游標 """
+    if opts['limit'] and row_count == opts['limit'] and last_id is not None:
+        response.headers['X-Next-Cursor'] = str(last_id)
+    return response
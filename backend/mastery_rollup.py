@@ -0,0 +1,90 @@
+# mastery_rollup.py
+"""
+單元精熟度彙總表 (unit_mastery_daily) 的增量維護。
+進度寫入前後各取一次快照，先扣掉舊值再加上新值，教師看板只需加總少量彙總列。
+"""
+from sqlalchemy import Date, and_, text
+from database import db, upsert_statement
+from models.mastery import UnitMastery
+
+FAILED_THRESHOLD = 90
+KEY_COLUMNS = ('user_id', 'subject', 'unit', 'day')
+COUNTER_COLUMNS = ('total_score', 'entry_count', 'failed_count')
+
+def score_points(score):
+    # 與教師看板原本的計算方式一致：沒有分數視為 0，小數無條件捨去
+    try:
+        return int(float(score)) if score else 0
+    except (TypeError, ValueError):
+        return 0
+
+def rollup_key(user_id, subject, unit, day):
+    # 科目 / 單元為 NULL 時存成空字串：唯一鍵遇到 NULL 不會衝突，upsert 會變成重複插入
+    return (user_id, subject or '', unit or '', day)
+
+def mastery_snapshot(task, progress):
+    """ 回傳某筆進度在彙總表中的貢獻；沒有日期的進度不列入 (看板以日期區間查詢) """
+    if task is None or progress is None or not progress.date:
+        return None
+    return rollup_key(task.user_id, task.subject, task.unit, progress.date) + (score_points(progress.score),)
+
+def _apply_delta(key, total, count, failed):
+    """
+    以單一 SQL 原子地累加 (同一單元同一天的兩個請求同時寫入也不會遺失或撞唯一鍵)，
+    扣到沒有任何進度的彙總列在 SQL 內刪除
+    """
+    table = UnitMastery.__table__
+    values = dict(zip(KEY_COLUMNS + COUNTER_COLUMNS, key + (total, count, failed)))
+    stmt = upsert_statement(db.session.get_bind().dialect.name, table, values, KEY_COLUMNS,
+                            lambda new: {c: table.c[c] + new[c] for c in COUNTER_COLUMNS})
+    if stmt is not None:
+        db.session.execute(stmt)
+    else:
+        matches = and_(*(table.c[c] == values[c] for c in KEY_COLUMNS))
+        result = db.session.execute(table.update().where(matches).values(
+            {c: table.c[c] + values[c] for c in COUNTER_COLUMNS}))
+        if result.rowcount == 0 and count > 0:
+            db.session.execute(table.insert().values(**values))
+
+    if count <= 0:
+        db.session.execute(table.delete().where(
+            and_(*(table.c[c] == values[c] for c in KEY_COLUMNS)), table.c.entry_count <= 0))
+
+def rebuild_unit_mastery(conn):
+    """ 清空彙總表並由全部進度重新計算 (遷移使用) """
+    conn.execute(text("DELETE FROM unit_mastery_daily"))
+    rows = conn.execute(text("""
+        SELECT t.user_id, t.subject, t.unit, p.date, p.score
+        FROM tasks t
+        JOIN progresses p ON t.id = p.task_id
+        WHERE p.date IS NOT NULL AND t.user_id IS NOT NULL
+    """).columns(date=Date))
+    buckets = {}
+    for row in rows:
+        points = score_points(row.score)
+        b = buckets.setdefault(rollup_key(row.user_id, row.subject, row.unit, row.date), [0, 0, 0])
+        b[0] += points
+        b[1] += 1
+        b[2] += 1 if points < FAILED_THRESHOLD else 0
+
+    if buckets:
+        conn.execute(UnitMastery.__table__.insert(), [
+            dict(zip(KEY_COLUMNS + COUNTER_COLUMNS, k + tuple(v))) for k, v in buckets.items()
+        ])
+
+def apply_mastery_change(before, after):
+    """ 以「移除舊快照、加入新快照」更新彙總表；commit 由呼叫端與進度一起處理 """
+    if before == after:
+        return
+    deltas = {}
+    for snapshot, sign in ((before, -1), (after, 1)):
+        if not snapshot:
+            continue
+        points = snapshot[4]
+        d = deltas.setdefault(snapshot[:4], [0, 0, 0])
+        d[0] += sign * points
+        d[1] += sign
+        d[2] += sign * (1 if points < FAILED_THRESHOLD else 0)
+    for key, (total, count, failed) in deltas.items():
+        if total or count or failed:
+            _apply_delta(key, total, count, failed)
@@ -0,0 +1,109 @@
+# migrations/__init__.py
+"""
+版本化資料庫遷移：每個 mNNN_*.py 模組定義 VERSION、DESCRIPTION 與 upgrade(conn)。
+已套用的版本記錄在 schema_migrations 表，重複執行只會跳過，不會重做。
+"""
+import importlib
+import os
+import pkgutil
+from contextlib import contextmanager
+from datetime import datetime
+from sqlalchemy import exc, inspect, text
+
+MIGRATIONS_TABLE = 'schema_migrations'
+MIGRATION_LOCK_KEY = 7203101                  # PostgreSQL advisory lock 的鍵值
+MIGRATION_LOCK_WAIT = int(os.environ.get('MIGRATION_LOCK_WAIT', 600))   # MySQL GET_LOCK 最長等待秒數
+
+def _migration_names():
+    return sorted(info.name for info in pkgutil.iter_modules(__path__)
+                  if info.name.startswith('m') and info.name[1:4].isdigit())
+
+def load_migrations():
+    """ 依檔名順序載入所有遷移模組 """
+    modules = [importlib.import_module(f"{__name__}.{name}") for name in _migration_names()]
+    versions = [m.VERSION for m in modules]
+    if len(versions) != len(set(versions)):
+        raise RuntimeError(f"遷移版本號重複: {versions}")
+    return modules
+
+def latest_version():
+    """ 程式碼中最新的遷移版本：取自檔名 mNNN_，開機檢查時不必匯入各遷移模組 """
+    return max((int(name[1:4]) for name in _migration_names()), default=0)
+
+def schema_version(engine):
+    """ 資料庫已套用的最新版本 (單一 MAX 查詢)；還沒有 schema_migrations 表時回傳 0 """
+    try:
+        with engine.connect() as conn:
+            return conn.execute(text(f"SELECT MAX(version) FROM {MIGRATIONS_TABLE}")).scalar() or 0
+    except exc.DBAPIError:
+        return 0
+
+def _ensure_migrations_table(conn):
+    conn.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS {MIGRATIONS_TABLE} (
+            version INTEGER PRIMARY KEY,
+            description VARCHAR(255),
+            applied_at TIMESTAMP
+        )
+    """))
+
+def applied_versions(engine):
+    with engine.begin() as conn:
+        _ensure_migrations_table(conn)
+        return {r[0] for r in conn.execute(text(f"SELECT version FROM {MIGRATIONS_TABLE}"))}
+
+@contextmanager
+def migration_lock(engine):
+    """
+    跨行程的遷移鎖：多個 worker 同時開機時只有一個在跑遷移，其他的在這裡等它完成。
+    PostgreSQL 用 pg_advisory_lock，MySQL 用 GET_LOCK (皆為連線層級，鎖住期間保留同一條連線)；
+    SQLite 只用於本地開發與測試，不另外加鎖。
+    """
+    dialect = engine.dialect.name
+    with engine.connect() as conn:
+        if dialect == 'postgresql':
+            conn.execute(text("SELECT pg_advisory_lock(:key)"), {'key': MIGRATION_LOCK_KEY})
+        elif dialect == 'mysql':
+            got = conn.execute(text("SELECT GET_LOCK(:name, :wait)"),
+                               {'name': MIGRATIONS_TABLE, 'wait': MIGRATION_LOCK_WAIT}).scalar()
+            if got != 1:
+                raise RuntimeError(f"等待遷移鎖逾時 ({MIGRATION_LOCK_WAIT} 秒)")
+        conn.commit()
+        try:
+            yield
+        finally:
+            if dialect == 'postgresql':
+                conn.execute(text("SELECT pg_advisory_unlock(:key)"), {'key': MIGRATION_LOCK_KEY})
+            elif dialect == 'mysql':
+                conn.execute(text("SELECT RELEASE_LOCK(:name)"), {'name': MIGRATIONS_TABLE})
+            conn.commit()
+
+def run_migrations(engine, log=print):
+    """ 依序套用尚未執行的遷移，每個版本各自一個交易；回傳本次套用的版本清單 """
+    done = applied_versions(engine)
+    newly_applied = []
+    for module in load_migrations():
+        if module.VERSION in done:
+            continue
+        with engine.begin() as conn:
+            module.upgrade(conn)
+            conn.execute(
+                text(f"INSERT INTO {MIGRATIONS_TABLE} (version, description, applied_at) VALUES (:v, :d, :t)"),
+                {'v': module.VERSION, 'd': module.DESCRIPTION, 't': datetime.now()}
+            )
+        log(f"✅ 套用遷移 {module.VERSION:03d}: {module.DESCRIPTION}")
+        newly_applied.append(module.VERSION)
+    return newly_applied
+
+# --- 遷移模組共用的冪等工具 (透過 inspector 檢查，MySQL / PostgreSQL / SQLite 皆適用) ---
+
+def add_column_if_missing(conn, table, column, ddl):
+    columns = {c['name'] for c in inspect(conn).get_columns(table)}
+    if column not in columns:
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+
+def create_index_if_missing(conn, table, name, columns, unique=False):
+    indexes = {i['name'] for i in inspect(conn).get_indexes(table)}
+    if name not in indexes:
+        kind = 'UNIQUE INDEX' if unique else 'INDEX'
+        conn.execute(text(f"CREATE {kind} {name} ON {table} ({', '.join(columns)})"))
@@ -0,0 +1,35 @@
+# migrations/__main__.py
+""" 離線執行遷移：在 backend 目錄下執行 `python -m migrations` (讀取 DATABASE_URL 或 config.py) """
+import os
+import sys
+from sqlalchemy import create_engine
+
+from migrations import run_migrations, load_migrations, applied_versions, migration_lock
+
+def _database_uri():
+    db_url = os.environ.get('DATABASE_URL')
+    if db_url:
+        return db_url.replace("postgres://", "postgresql://", 1) if db_url.startswith("postgres://") else db_url
+    from config import SQLALCHEMY_DATABASE_URI
+    return SQLALCHEMY_DATABASE_URI
+
+def main(argv):
+    engine = create_engine(_database_uri())
+
+    if '--status' in argv:
+        done = applied_versions(engine)
+        for m in load_migrations():
+            print(f"[{'x' if m.VERSION in done else ' '}] {m.VERSION:03d} {m.DESCRIPTION}")
+        return 0
+
+    # 全新資料庫先依 models 建立基本表，再補上遷移
+    from database import db
+    import models  # noqa: F401  註冊所有 model 到 metadata
+    with migration_lock(engine):
+        db.metadata.create_all(bind=engine)
+        applied = run_migrations(engine)
+    print(f"完成，本次套用 {len(applied)} 個遷移。" if applied else "資料庫已是最新版本。")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
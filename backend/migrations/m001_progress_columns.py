@@ -0,0 +1,10 @@
+# 取代 app.py 啟動時的 ALTER TABLE ... ADD COLUMN IF NOT EXISTS 區塊
+from migrations import add_column_if_missing
+
+VERSION = 1
+DESCRIPTION = "progresses 補齊 is_corrected / ai_insight / progress_percent 欄位"
+
+def upgrade(conn):
+    add_column_if_missing(conn, 'progresses', 'is_corrected', 'BOOLEAN DEFAULT FALSE')
+    add_column_if_missing(conn, 'progresses', 'ai_insight', 'TEXT')
+    add_column_if_missing(conn, 'progresses', 'progress_percent', 'INTEGER DEFAULT 0')
@@ -0,0 +1,11 @@
+# 熱門查詢 (review /list、teacher /analysis、generate_quiz) 的複合索引
+from migrations import create_index_if_missing
+
+VERSION = 2
+DESCRIPTION = "tasks(user_id, subject, date) 與 progresses(task_id, date, score) 複合索引"
+
+def upgrade(conn):
+    # 依使用者 + 科目 + 日期區間找任務
+    create_index_if_missing(conn, 'tasks', 'ix_tasks_user_subject_date', ['user_id', 'subject', 'date'])
+    # JOIN 進度後直接在索引內完成 date 範圍與 score < 100 判斷並依日期排序
+    create_index_if_missing(conn, 'progresses', 'ix_progresses_task_date_score', ['task_id', 'date', 'score'])
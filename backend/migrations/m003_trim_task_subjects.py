@@ -0,0 +1,8 @@
+# 科目改為精確比對後，先清掉歷史資料前後多餘的空白
+from sqlalchemy import text
+
+VERSION = 3
+DESCRIPTION = "tasks.subject 去除前後空白 (配合科目精確比對)"
+
+def upgrade(conn):
+    conn.execute(text("UPDATE tasks SET subject = TRIM(subject) WHERE subject <> TRIM(subject)"))
@@ -0,0 +1,10 @@
+# 建立教師看板用的 unit_mastery_daily 彙總表，並由既有進度重新計算一次
+from mastery_rollup import rebuild_unit_mastery
+from models.mastery import UnitMastery
+
+VERSION = 4
+DESCRIPTION = "建立 unit_mastery_daily 彙總表並回填歷史進度"
+
+def upgrade(conn):
+    UnitMastery.__table__.create(conn, checkfirst=True)
+    rebuild_unit_mastery(conn)
@@ -0,0 +1,8 @@
+# AI 回覆快取表
+from database import AIResponseCache
+
+VERSION = 5
+DESCRIPTION = "建立 ai_response_cache 表"
+
+def upgrade(conn):
+    AIResponseCache.__table__.create(conn, checkfirst=True)
@@ -0,0 +1,40 @@
+# 錯題筆記解析結果改在寫入時產生，存進 progresses；既有資料一次回填
+import json
+from sqlalchemy import text
+
+from migrations import add_column_if_missing
+from note_parser import parse_note
+
+VERSION = 6
+DESCRIPTION = "progresses 新增 note_pages / note_tags / clean_note 並回填"
+
+BACKFILL_BATCH = 500
+
+def upgrade(conn):
+    add_column_if_missing(conn, 'progresses', 'note_pages', 'VARCHAR(100)')
+    add_column_if_missing(conn, 'progresses', 'note_tags', 'TEXT')
+    add_column_if_missing(conn, 'progresses', 'clean_note', 'TEXT')
+
+    # 依 id 區間分批讀取與回填，大表也不必一次把全部筆記載入記憶體
+    last_id = 0
+    while True:
+        rows = conn.execute(text("""
+            SELECT p.id, t.subject, p.student_note
+            FROM progresses p
+            LEFT JOIN tasks t ON t.id = p.task_id
+            WHERE p.id > :after
+            ORDER BY p.id
+            LIMIT :batch
+        """), {'after': last_id, 'batch': BACKFILL_BATCH}).fetchall()
+        if not rows:
+            break
+
+        updates = []
+        for row in rows:
+            pages, tags, clean_note = parse_note(row.subject, row.student_note)
+            updates.append({'id': row.id, 'pages': pages[:100], 'tags': json.dumps(tags, ensure_ascii=False), 'clean': clean_note})
+        conn.execute(
+            text("UPDATE progresses SET note_pages = :pages, note_tags = :tags, clean_note = :clean WHERE id = :id"),
+            updates
+        )
+        last_id = rows[-1].id
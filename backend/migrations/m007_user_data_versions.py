@@ -0,0 +1,8 @@
+# 使用者資料版本表 (ETag / 條件式 GET)
+from database import UserDataVersion
+
+VERSION = 7
+DESCRIPTION = "建立 user_data_versions 表"
+
+def upgrade(conn):
+    UserDataVersion.__table__.create(conn, checkfirst=True)
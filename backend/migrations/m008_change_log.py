@@ -0,0 +1,8 @@
+# 增量同步的異動紀錄表
+from database import ChangeLog
+
+VERSION = 8
+DESCRIPTION = "建立 change_log 表 (增量同步)"
+
+def upgrade(conn):
+    ChangeLog.__table__.create(conn, checkfirst=True)
@@ -0,0 +1,15 @@
+# 全文搜尋倒排索引：建表並為既有進度回填
+from sqlalchemy import text
+from database import SearchPosting
+from search_index import reindex_progresses
+
+VERSION = 9
+DESCRIPTION = "建立 search_postings 搜尋索引並回填"
+
+BATCH_SIZE = 500
+
+def upgrade(conn):
+    SearchPosting.__table__.create(conn, checkfirst=True)
+    ids = [r[0] for r in conn.execute(text("SELECT id FROM progresses ORDER BY id"))]
+    for i in range(0, len(ids), BATCH_SIZE):
+        reindex_progresses(ids[i:i + BATCH_SIZE], conn=conn)
@@ -0,0 +1,8 @@
+# unit_mastery_daily 的科目 / 單元改以空字串取代 NULL，讓唯一鍵能支撐原子 upsert；直接重新計算整張表
+from mastery_rollup import rebuild_unit_mastery
+
+VERSION = 10
+DESCRIPTION = "unit_mastery_daily 科目/單元 NULL 改為空字串並重新彙總"
+
+def upgrade(conn):
+    rebuild_unit_mastery(conn)
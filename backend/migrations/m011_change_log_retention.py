@@ -0,0 +1,9 @@
+# 異動紀錄保留期限：記錄每位使用者已清除到哪個 id，並為依時間清除建立索引
+from migrations import add_column_if_missing, create_index_if_missing
+
+VERSION = 11
+DESCRIPTION = "user_data_versions 新增 change_log_floor、change_log 依 changed_at 建索引"
+
+def upgrade(conn):
+    add_column_if_missing(conn, 'user_data_versions', 'change_log_floor', 'BIGINT NOT NULL DEFAULT 0')
+    create_index_if_missing(conn, 'change_log', 'ix_change_log_changed_at', ['changed_at'])
@@ -0,0 +1,96 @@
+# mistake_clusters.py
+"""
+相似錯題分群：把錯題筆記轉成字元 n-gram 的 TF-IDF 向量 (以 dict 表示的稀疏向量)，
+同科目同單元內以餘弦相似度分群。每群只需請 AI 診斷一筆代表，診斷結果再套用到同群的其他筆。
+筆記多為短句，稀疏 dict 的內積就足夠快，不需要額外的數值運算套件。
+"""
+import math
+import os
+import re
+
+CLUSTER_SIMILARITY = float(os.environ.get('CLUSTER_SIMILARITY', 0.75))   # 0 以下代表不分群
+NGRAM_SIZES = (2, 3)
+
+# 中日韓文字與英數的連續片段；空白與標點視為分隔
+_WORD_RE = re.compile(r'[0-9a-z㐀-䶿一-鿿豈-﫿]+')
+
+def _words(text):
+    return _WORD_RE.findall((text or '').lower())
+
+def char_ngrams(text):
+    """ 各片段內的字元 n-gram 計數 (不跨越標點)；比最短 n-gram 還短的片段整段計入 """
+    counts = {}
+    for word in _words(text):
+        grams = [word[i:i + n] for n in NGRAM_SIZES for i in range(len(word) - n + 1)] or [word]
+        for gram in grams:
+            counts[gram] = counts.get(gram, 0) + 1
+    return counts
+
+def vectorize(texts):
+    """ 回傳與 texts 等長的 L2 正規化 TF-IDF 向量 ({n-gram: 權重})；空白筆記得到空向量 """
+    grams = [char_ngrams(t) for t in texts]
+    df = {}
+    for counts in grams:
+        for gram in counts:
+            df[gram] = df.get(gram, 0) + 1
+    total = len(texts)
+    vectors = []
+    for counts in grams:
+        vec = {g: (1 + math.log(c)) * (math.log((1 + total) / (1 + df[g])) + 1) for g, c in counts.items()}
+        norm = math.sqrt(sum(w * w for w in vec.values()))
+        vectors.append({g: w / norm for g, w in vec.items()} if norm else {})
+    return vectors
+
+def cosine(a, b):
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(w * b.get(g, 0.0) for g, w in a.items())
+
+def _medoid(indices, vectors):
+    """ 與同群其他筆相似度總和最高者作為代表 """
+    if len(indices) <= 2:
+        return indices[0]
+    return max(indices, key=lambda i: sum(cosine(vectors[i], vectors[j]) for j in indices if j != i))
+
+def cluster_items(items, threshold=None):
+    """
+    items: [{'id', 'unit', 'note'}, ...] (同一科目)。回傳 [(代表, [成員...]), ...]，成員含代表本身。
+    同單元內依序比對各群的第一筆 (leader)，相似度達門檻就加入，否則自成一群；
+    只和 leader 比較可避免 A~B、B~C 串成一大群。空白筆記各自成群。
+    """
+    threshold = CLUSTER_SIMILARITY if threshold is None else threshold
+    if threshold <= 0 or len(items) < 2:
+        return [(item, [item]) for item in items]
+
+    vectors = vectorize([item['note'] for item in items])
+    groups = {}   # 單元 -> [[索引...], ...]
+    order = []
+    for i, item in enumerate(items):
+        clusters = groups.setdefault(item.get('unit') or '', [])
+        home = None
+        if vectors[i]:
+            home = next((c for c in clusters if vectors[c[0]] and cosine(vectors[i], vectors[c[0]]) >= threshold), None)
+        if home is None:
+            home = [i]
+            clusters.append(home)
+            order.append(home)
+        else:
+            home.append(i)
+
+    return [(items[_medoid(c, vectors)], [items[i] for i in c]) for c in order]
+
+def find_similar(note, candidates, threshold=None):
+    """
+    candidates: [(id, 筆記), ...]。回傳與 note 最相似且達門檻的 (id, 相似度)，沒有則回傳 None。
+    IDF 以 note 與所有候選一起計算。
+    """
+    threshold = CLUSTER_SIMILARITY if threshold is None else threshold
+    if threshold <= 0 or not candidates or not _words(note):
+        return None
+    vectors = vectorize([note] + [text for _, text in candidates])
+    target, best = vectors[0], None
+    for (cid, _), vec in zip(candidates, vectors[1:]):
+        score = cosine(target, vec)
+        if score >= threshold and (best is None or score > best[1]):
+            best = (cid, score)
+    return best
@@ -3,3 +3,4 @@ from database import db  # 從同一個地方 import
 from .user import User
 from .task import Task
 from .progress import Progress
+from .mastery import UnitMastery
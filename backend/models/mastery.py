@@ -0,0 +1,19 @@
+from database import db
+
+class UnitMastery(db.Model):
+    """ 教師看板用的彙總表：每位使用者 / 科目 / 單元 / 日期一筆，由進度寫入時增量維護 """
+    __tablename__ = 'unit_mastery_daily'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False)
+    subject = db.Column(db.String(20))
+    unit = db.Column(db.String(100))
+    day = db.Column(db.Date, nullable=False)
+    total_score = db.Column(db.Integer, default=0, nullable=False)
+    entry_count = db.Column(db.Integer, default=0, nullable=False)
+    failed_count = db.Column(db.Integer, default=0, nullable=False)
+
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'subject', 'unit', 'day', name='uq_unit_mastery_key'),
+        db.Index('ix_unit_mastery_user_subject_day', 'user_id', 'subject', 'day'),
+    )
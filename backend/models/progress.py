@@ -1,6 +1,10 @@
 from database import db
 from datetime import date
 
+def latest_progress_order(alias='progresses'):
+    """ 「最新進度」的排序：日期較新者優先，同日取 id 較大者 (讀取的 JOIN 與任務狀態同步共用，兩邊才會指向同一筆) """
+    return f"{alias}.date DESC, {alias}.id DESC"
+
 class Progress(db.Model):
     __tablename__ = 'progresses'
 
@@ -14,6 +18,13 @@ class Progress(db.Model):
     score = db.Column(db.Float)
     is_corrected = db.Column(db.Boolean, default=False)
     ai_insight = db.Column(db.Text)
+    # 由 note_parser 在寫入時產生的衍生欄位 (錯題列表直接讀取，不必每次重新解析)
+    note_pages = db.Column(db.String(100))
+    note_tags = db.Column(db.Text)
+    clean_note = db.Column(db.Text)
+
+    # 與 migrations/m002 同名，全新資料庫由 create_all 直接建立
+    __table_args__ = (db.Index('ix_progresses_task_date_score', 'task_id', 'date', 'score'),)
 
     def to_dict(self):
         return {
@@ -27,4 +38,7 @@ class Progress(db.Model):
             'score': self.score
         }
 
-
+    @classmethod
+    def latest_for_task(cls, task_id):
+        """ 任務的最新一筆進度 (排序同 latest_progress_order)；沒有進度時回傳 None """
+        return cls.query.filter_by(task_id=task_id).order_by(db.text(latest_progress_order())).first()
@@ -13,6 +13,9 @@ class Task(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     #user = db.relationship('User', backref='tasks')
 
+    # 與 migrations/m002 同名，全新資料庫由 create_all 直接建立
+    __table_args__ = (db.Index('ix_tasks_user_subject_date', 'user_id', 'subject', 'date'),)
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -0,0 +1,102 @@
+# note_parser.py
+"""
+錯題筆記解析：擷取頁碼、依科目的關鍵字字典貼標籤、產生去除頁碼後的筆記。
+關鍵字比對使用 Aho–Corasick 自動機，一次掃描即可找出所有關鍵字；
+解析結果在寫入進度時就存進 progresses (note_pages / note_tags / clean_note)，讀取時不必重算。
+"""
+import json
+import os
+import re
+from collections import deque
+
+PAGES_RE = re.compile(r'[pP]\.?\s?\d+.*?\d+')
+
+# 科目 -> [(關鍵字, 標籤)]；科目名稱包含左側字串即套用 (依序取第一個符合的科目)
+DEFAULT_TAG_RULES = {
+    "社會": [("時序", "🗓️ 時序"), ("年份", "🗓️ 時序")],
+    "數學": [("計算", "🧮 計算"), ("算式", "🧮 計算"), ("單位", "📏 單位細節")],
+}
+
+def _load_tag_rules():
+    # 可用 NOTE_TAG_RULES_FILE 指定 JSON 檔覆寫：{"科目": [["關鍵字", "標籤"], ...]}
+    path = os.environ.get('NOTE_TAG_RULES_FILE')
+    if not path:
+        return DEFAULT_TAG_RULES
+    with open(path, encoding='utf-8') as f:
+        return {subject: [tuple(pair) for pair in pairs] for subject, pairs in json.load(f).items()}
+
+class KeywordAutomaton:
+    """ Aho–Corasick 多關鍵字比對：建構一次，之後每段文字只需線性掃描一遍 """
+
+    def __init__(self, rules):
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [set()]
+        # 標籤依規則中第一次出現的順序輸出
+        self._tag_order = {}
+        for keyword, tag in rules:
+            self._tag_order.setdefault(tag, len(self._tag_order))
+            self._add(keyword, tag)
+        self._build_failure_links()
+
+    def _add(self, keyword, tag):
+        node = 0
+        for ch in keyword:
+            if ch not in self._goto[node]:
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(set())
+                self._goto[node][ch] = len(self._goto) - 1
+            node = self._goto[node][ch]
+        self._out[node].add(tag)
+
+    def _build_failure_links(self):
+        # 第一層節點的失敗連結指回根節點，其餘以 BFS 逐層推導
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(ch, 0) if node else 0
+                self._out[child] |= self._out[self._fail[child]]
+
+    def find_tags(self, text):
+        found = set()
+        node = 0
+        for ch in text:
+            while node and ch not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(ch, 0)
+            if self._out[node]:
+                found |= self._out[node]
+        return sorted(found, key=self._tag_order.get)
+
+_automata = [(subject, KeywordAutomaton(rules)) for subject, rules in _load_tag_rules().items()]
+_subject_automaton_cache = {}
+
+def _automaton_for(subject):
+    sub = str(subject or "")
+    if sub not in _subject_automaton_cache:
+        _subject_automaton_cache[sub] = next((a for key, a in _automata if key in sub), None)
+    return _subject_automaton_cache[sub]
+
+def parse_note(subject, note):
+    """ 回傳 (頁碼, 標籤清單, 去除頁碼後的筆記) """
+    if not note:
+        return "", [], ""
+    pages_match = PAGES_RE.search(note)
+    pages = pages_match.group(0) if pages_match else ""
+    automaton = _automaton_for(subject)
+    tags = automaton.find_tags(note) if automaton else []
+    clean_note = PAGES_RE.sub('', note).strip()
+    return pages, tags, clean_note
+
+def materialize_note(progress, subject):
+    """ 寫入進度時呼叫：把解析結果存到 progresses 的衍生欄位 """
+    pages, tags, clean_note = parse_note(subject, progress.student_note)
+    progress.note_pages = pages[:100]
+    progress.note_tags = json.dumps(tags, ensure_ascii=False)
+    progress.clean_note = clean_note
@@ -0,0 +1,58 @@
+import json
+import time
+from flask import Blueprint, request, jsonify, Response
+from ai_jobs import get_job, queue_metrics
+from ai_cache import cache_stats
+from ai_limits import limiter_stats
+
+ai_bp = Blueprint('ai', __name__)
+
+SSE_POLL_INTERVAL = 0.5
+SSE_TIMEOUT = 180
+
+# 1. 輪詢 AI 背景工作狀態
+@ai_bp.route('/jobs/<job_id>', methods=['GET', 'OPTIONS'])
+def get_ai_job(job_id):
+    if request.method == 'OPTIONS': return '', 200
+
+    user_id = request.args.get('user_id')
+    if not user_id: return jsonify({"error": "User ID required"}), 400
+
+    job = get_job(job_id, user_id)
+    if not job: return jsonify({"error": "找不到此工作"}), 404
+    return jsonify(job)
+
+# 2. 以 Server-Sent Events 推送工作狀態，直到完成或失敗
+@ai_bp.route('/jobs/<job_id>/events', methods=['GET'])
+def stream_ai_job(job_id):
+    user_id = request.args.get('user_id')
+    if not user_id: return jsonify({"error": "User ID required"}), 400
+    if not get_job(job_id, user_id): return jsonify({"error": "找不到此工作"}), 404
+
+    def events():
+        last_status = None
+        deadline = time.time() + SSE_TIMEOUT
+        while time.time() < deadline:
+            job = get_job(job_id, user_id)
+            if not job:
+                break
+            if job['status'] != last_status:
+                last_status = job['status']
+                yield f"event: status\ndata: {json.dumps(job)}\n\n"
+            if job['status'] in ('done', 'failed'):
+                return
+            time.sleep(SSE_POLL_INTERVAL)
+        yield "event: timeout\ndata: {}\n\n"
+
+    return Response(events(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+# 3. 佇列深度與處理量
+@ai_bp.route('/metrics', methods=['GET'])
+def get_ai_metrics():
+    return jsonify({**queue_metrics(), 'limits': limiter_stats()})
+
+# 4. AI 回覆快取命中率與估計省下的時間
+@ai_bp.route('/cache', methods=['GET'])
+def get_ai_cache_stats():
+    return jsonify(cache_stats())
@@ -1,6 +1,8 @@
 from flask import Blueprint, request, jsonify
-from database import db, get_exam_dates, update_all_subject_configs 
+from database import db, get_exam_dates, update_all_subject_configs, get_user_subjects, invalidate_subject_configs
 from sqlalchemy import text
+from ai_service import invalidate_ai_config
+from data_version import record_change, conditional
 
 config_bp = Blueprint('config', __name__)
 
@@ -14,8 +16,10 @@ def handle_publishers():
         user_id = request.args.get('user_id')
         if not user_id: return jsonify({"error": "User ID required"}), 400
         sql = text("SELECT subject_name, publisher, grade FROM subject_configs WHERE user_id = :uid")
-        results = db.session.execute(sql, {'uid': user_id}).fetchall()
-        return jsonify([{"subject_name": r.subject_name, "publisher": r.publisher, "grade": r.grade} for r in results])
+        return conditional(user_id, lambda: jsonify([
+            {"subject_name": r.subject_name, "publisher": r.publisher, "grade": r.grade}
+            for r in db.session.execute(sql, {'uid': user_id}).fetchall()
+        ]))
 
     # --- POST 邏輯 ---
     data = request.json
@@ -37,7 +41,9 @@ def handle_publishers():
                 'uid': user_id, 'sub': item['subject_name'], 
                 'pub': item['publisher'], 'grade': item['grade']
             })
+        record_change(user_id, 'config.publishers')
         db.session.commit()
+        invalidate_subject_configs(user_id)
         return jsonify({"message": "設定已成功儲存"})
     except Exception as e:
         db.session.rollback()
@@ -58,6 +64,10 @@ def handle_global_config():
     # POST 儲存
     data = request.json
     success = update_all_subject_configs(user_id, data.get('grade'), data.get('midterm_date'), data.get('final_date'))
+    if success:
+        # update_all_subject_configs 內部已 commit，版本號在資料可見之後才更新，不會讓舊資料帶上新 ETag
+        record_change(user_id, 'config.global')
+        db.session.commit()
     return jsonify({"message": "全域設定儲存成功"}) if success else (jsonify({"error": "失敗"}), 500)
 
 # 3. 處理 AI 設定
@@ -86,13 +96,28 @@ def handle_ai_settings():
             'prompt': data.get('system_prompt'), 'model': data.get('model_name'),
             'url': data.get('base_url')
         })
+        record_change(user_id, 'config.ai')
         db.session.commit()
+        invalidate_ai_config(user_id)
         return jsonify({"message": "AI 設定已儲存"})
 
     # GET 讀取
+    return conditional(user_id, lambda: _ai_settings_payload(user_id))
+
+def _ai_settings_payload(user_id):
     sql = text("SELECT api_key, system_prompt, model_name, base_url FROM ai_settings WHERE user_id = :uid")
     res = db.session.execute(sql, {'uid': user_id}).fetchone()
     return jsonify({
         "api_key": res.api_key, "system_prompt": res.system_prompt,
         "model_name": res.model_name, "base_url": res.base_url
     }) if res else jsonify({})
+
+
+# 4. 科目清單 (前端下拉選單與各看板的科目篩選來源)
+@config_bp.route('/subjects', methods=['GET', 'OPTIONS'])
+def handle_subjects():
+    if request.method == 'OPTIONS': return '', 200
+
+    user_id = request.args.get('user_id')
+    if not user_id: return jsonify({"error": "User ID required"}), 400
+    return jsonify(get_user_subjects(user_id))
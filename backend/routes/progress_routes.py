@@ -1,7 +1,15 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response, stream_with_context
 from models import Progress
-from database import db
-from datetime import datetime
+from models.progress import latest_progress_order
+from database import db, get_exam_dates, normalize_subject, subject_filter_sql, DEFAULT_SUBJECTS
+from datetime import datetime, date, timedelta
+import json
+from note_parser import materialize_note
+from mastery_rollup import mastery_snapshot, apply_mastery_change
+from listing import parse_list_args, task_filter_sql, set_next_cursor
+from data_version import record_change, record_changes, conditional
+from search_index import reindex_progresses, SEARCH_FIELDS
+from score_series import build_series, GRANULARITIES, MAX_POINTS, MAX_WINDOW
 
 progress_bp = Blueprint('progress', __name__)
 
@@ -28,39 +36,313 @@ def create_progress():
         student_note=data.get('student_note', ''),
         score=data.get('score', 0)
     )
+    materialize_note(new_progress, task.subject)
     db.session.add(new_progress)
+    apply_mastery_change(None, mastery_snapshot(task, new_progress))
+    db.session.flush()
+    record_change(user_id, 'progress', new_progress.id)
+    reindex_progresses([new_progress.id])
     db.session.commit()
     return jsonify(new_progress.to_dict()), 201
 
+# 回傳欄位 -> 需要的 SQL 欄位 (欄位投影時只 SELECT 用得到的部分)
+WITH_TASKS_FIELDS = {
+    'task_id': ['t.id AS task_id'],
+    'subject': ['t.subject'],
+    'title': ['t.title'],
+    'type': ['t.type'],
+    'unit': ['t.unit'],
+    'target_date': ['t.date AS task_date'],
+    'created_at': ['t.date AS task_date'],
+    'progress_percent': ['p.progress_percent'],
+    'student_note': ['p.student_note'],
+    'score': ['p.score'],
+    'id': [],
+}
+
+def latest_progress_join(task_alias='t'):
+    """
+    LEFT JOIN 每個任務的最新進度 (日期較新者優先，同日取 id 較大者，確保結果可重現)。
+    以相關子查詢逐任務走 (task_id, date) 索引取出最新一筆的 id，再以主鍵 JOIN；
+    視窗函式版本在 SQLite 上會對物化結果做巢狀掃描，任務數一多就變成 O(任務數 × 進度數)。
+    """
+    return f"""LEFT JOIN progresses p ON p.id = (
+            SELECT lp.id FROM progresses lp
+            WHERE lp.task_id = {task_alias}.id
+            ORDER BY {latest_progress_order('lp')}
+            LIMIT 1
+        )"""
+
+def build_with_tasks_sql(opts):
+    """ 組出 /with_tasks 查詢：先在 CTE 內篩選/分頁任務，再 LEFT JOIN 每個任務的最新進度 """
+    fields = opts['fields'] or list(WITH_TASKS_FIELDS)
+    columns = ['t.id AS task_id', 'p.id AS progress_id']
+    for f in fields:
+        for col in WITH_TASKS_FIELDS[f]:
+            if col not in columns:
+                columns.append(col)
+    task_columns = sorted({c.split(' ')[0] for c in columns if c.startswith('t.')})
+
+    clauses, params = task_filter_sql(opts)
+    where = ' AND '.join(['t.user_id = :uid'] + clauses)
+    limit = ''
+    if opts['limit']:
+        limit = 'LIMIT :limit'
+        params['limit'] = opts['limit']
+
+    sql = f"""
+        WITH ut AS (
+            SELECT {', '.join(task_columns)}
+            FROM tasks t
+            WHERE {where}
+            ORDER BY t.id
+            {limit}
+        )
+        SELECT {', '.join(columns)}
+        FROM ut t
+        {latest_progress_join('t')}
+        ORDER BY t.id
+    """
+    return sql, params, fields
+
+def _combine_row(row, fields):
+    """ 將 JOIN 結果轉成前端既有的欄位格式 (無進度時給預設值) """
+    has_progress = row.progress_id is not None
+    combined = {}
+    for f in fields:
+        if f in ('target_date', 'created_at'):
+            combined[f] = _format_date(row.task_date)
+        elif f == 'id':
+            combined[f] = row.progress_id
+        elif f == 'progress_percent':
+            combined[f] = row.progress_percent if has_progress else 0
+        elif f in ('student_note', 'score'):
+            combined[f] = getattr(row, f) if has_progress else ''
+        else:
+            combined[f] = getattr(row, f)
+    return combined
+
+def _format_date(value):
+    if not value:
+        return None
+    # SQLite 等驅動可能直接回傳字串
+    return value.strftime('%Y-%m-%d') if hasattr(value, 'strftime') else str(value)[:10]
+
+def _stream_json_array(rows, convert):
+    """ 逐列輸出 JSON 陣列，避免一次把整份歷史組成大 list """
+    yield '['
+    first = True
+    for row in rows:
+        yield ('' if first else ',') + json.dumps(convert(row))
+        first = False
+    yield ']'
+
 @progress_bp.route('/with_tasks', methods=['GET', 'OPTIONS'])
 def get_progress_with_tasks():
     user_id = request.args.get('user_id', type=int)
     if not user_id:
         return jsonify([]), 401
+    return conditional(user_id, lambda: _progress_with_tasks(user_id))
 
-    from models.task import Task
-    tasks = Task.query.filter_by(user_id=user_id).all()
-    results = []
-
-    for task in tasks:
-        progress = Progress.query.filter_by(task_id=task.id).first()
-        combined = {
-            'task_id': task.id,
-            'subject': task.subject,
-            'title': task.title,
-            'type': task.type,
-            'unit': task.unit,
-            'target_date': task.date.strftime('%Y-%m-%d') if task.date else None,
-            'created_at': task.date.strftime('%Y-%m-%d') if task.date else None,
-            'progress_percent': progress.progress_percent if progress else 0,
-            'student_note': progress.student_note if progress else '',
-            'score': progress.score if progress else '',
-            'id': progress.id if progress else None
-        }
-        results.append(combined)
+def _progress_with_tasks(user_id):
+    try:
+        opts = parse_list_args(request.args, WITH_TASKS_FIELDS)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # 🚀 單一 LEFT JOIN 取代逐筆查詢 (原本 N 個任務要 N+1 次查詢)
+    sql, params, fields = build_with_tasks_sql(opts)
+    params['uid'] = user_id
+
+    if opts['limit']:
+        # 分頁模式：單頁筆數有上限，直接組好並附上下一頁游標
+        rows = db.session.execute(db.text(sql), params).fetchall()
+        response = jsonify([_combine_row(r, fields) for r in rows])
+        return set_next_cursor(response, opts, rows[-1].task_id if rows else None, len(rows))
+
+    rows = db.session.execute(
+        db.text(sql).execution_options(stream_results=True, yield_per=500), params
+    )
+    return Response(stream_with_context(_stream_json_array(rows, lambda r: _combine_row(r, fields))),
+                    mimetype='application/json')
+
+
+# 衝刺看板的「核心」定義 (與 ReportPage 相同)：主科且為正式作業類型
+CORE_TYPES = ['自修', '評量', '學校課本', '學校作業', '考卷']
+
+def build_summary_sql(subject, exam_dates):
+    """ 以條件彙總一次算出各科、核心/其他分組的完成率與進度債務 """
+    exam_columns = ""
+    for key in ('midterm', 'final'):
+        if exam_dates.get(f"{key}_date"):
+            exam_columns += f",\n               SUM(CASE WHEN done = 0 AND date <= :{key} THEN 1 ELSE 0 END) AS before_{key}"
+    return f"""
+        WITH ut AS (
+            SELECT t.id, t.subject, t.type, t.date
+            FROM tasks t
+            WHERE t.user_id = :uid {subject_filter_sql(subject)}
+        ),
+        st AS (
+            SELECT ut.subject, ut.date,
+                   CASE WHEN ut.subject IN :core_subjects AND ut.type IN :core_types THEN 1 ELSE 0 END AS is_core,
+                   CASE WHEN COALESCE(p.progress_percent, 0) >= 100 THEN 1 ELSE 0 END AS done
+            FROM ut
+            {latest_progress_join('ut')}
+        )
+        SELECT subject, is_core, COUNT(*) AS total, SUM(done) AS completed,
+               SUM(CASE WHEN done = 0 AND date < :today THEN 1 ELSE 0 END) AS overdue,
+               SUM(CASE WHEN done = 0 AND date = :today THEN 1 ELSE 0 END) AS due_today,
+               SUM(CASE WHEN done = 0 AND date > :today AND date <= :d3 THEN 1 ELSE 0 END) AS due_1_3,
+               SUM(CASE WHEN done = 0 AND date > :d3 AND date <= :d7 THEN 1 ELSE 0 END) AS due_4_7,
+               SUM(CASE WHEN done = 0 AND date > :d7 AND date <= :d14 THEN 1 ELSE 0 END) AS due_8_14,
+               SUM(CASE WHEN done = 0 AND date > :d14 THEN 1 ELSE 0 END) AS due_later,
+               SUM(CASE WHEN done = 0 AND date IS NULL THEN 1 ELSE 0 END) AS no_date{exam_columns}
+        FROM st
+        GROUP BY subject, is_core
+    """
+
+SUMMARY_COUNTERS = ['total', 'completed', 'overdue', 'due_today', 'due_1_3', 'due_4_7',
+                    'due_8_14', 'due_later', 'no_date', 'before_midterm', 'before_final']
+
+def _rate(completed, total):
+    return round(completed * 100 / total, 1) if total else 0
+
+@progress_bp.route('/summary', methods=['GET', 'OPTIONS'])
+def get_progress_summary():
+    """ 衝刺看板摘要：逾期數、剩餘天數分布、各科完成率與核心/其他分組，全部在 SQL 內計算 """
+    if request.method == 'OPTIONS': return '', 200
+
+    user_id = request.args.get('user_id', type=int)
+    if not user_id:
+        return jsonify({}), 401
+    subject = normalize_subject(request.args.get('subject'))
+
+    today = date.today()
+    exam_dates = get_exam_dates(user_id)
+    params = {
+        'uid': user_id, 'sub': subject, 'today': today,
+        'd3': today + timedelta(days=3), 'd7': today + timedelta(days=7), 'd14': today + timedelta(days=14),
+        'core_subjects': DEFAULT_SUBJECTS, 'core_types': CORE_TYPES,
+    }
+    for key in ('midterm', 'final'):
+        if exam_dates.get(f"{key}_date"):
+            params[key] = datetime.strptime(exam_dates[f"{key}_date"], '%Y-%m-%d').date()
+
+    sql = db.text(build_summary_sql(subject, exam_dates)).bindparams(
+        db.bindparam('core_subjects', expanding=True), db.bindparam('core_types', expanding=True))
+    rows = db.session.execute(sql, params).fetchall()
+
+    def empty():
+        return {k: 0 for k in SUMMARY_COUNTERS}
+
+    totals, groups, by_subject = empty(), {'core': empty(), 'other': empty()}, {}
+    for row in rows:
+        values = row._mapping
+        group = groups['core' if row.is_core else 'other']
+        sub = by_subject.setdefault(row.subject, empty())
+        for k in SUMMARY_COUNTERS:
+            v = int(values.get(k) or 0)
+            totals[k] += v
+            group[k] += v
+            sub[k] += v
+
+    def finish(counters):
+        counters['incomplete'] = counters['total'] - counters['completed']
+        counters['completion_rate'] = _rate(counters['completed'], counters['total'])
+        return counters
+
+    return jsonify({
+        'today': today.strftime('%Y-%m-%d'),
+        'exam_dates': exam_dates,
+        'summary': finish(totals),
+        'groups': {name: finish(c) for name, c in groups.items()},
+        'by_subject': [dict(finish(c), subject=name) for name, c in sorted(by_subject.items(), key=lambda x: str(x[0]))],
+    })
+
+@progress_bp.route('/trend', methods=['GET', 'OPTIONS'])
+def get_score_trend():
+    """
+    成績趨勢：依科目回傳日/週/月平均分數與移動平均。
+    參數：granularity=day|week|month、window=移動平均區間數、points=降採樣目標點數、start/end/subject
+    """
+    if request.method == 'OPTIONS': return '', 200
+
+    user_id = request.args.get('user_id', type=int)
+    if not user_id:
+        return jsonify([]), 401
+
+    granularity = request.args.get('granularity', 'week')
+    if granularity not in GRANULARITIES:
+        return jsonify({"error": f"granularity 僅支援 {', '.join(GRANULARITIES)}"}), 400
+    window = request.args.get('window', 4, type=int)
+    points = request.args.get('points', type=int)
+    if window is None or not 1 <= window <= MAX_WINDOW:
+        return jsonify({"error": f"window 需介於 1 到 {MAX_WINDOW}"}), 400
+    if points is not None and not 3 <= points <= MAX_POINTS:
+        return jsonify({"error": f"points 需介於 3 到 {MAX_POINTS}"}), 400
+
+    try:
+        opts = parse_list_args(request.args, ())
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    clauses, params = [], {'uid': user_id}
+    if opts['subject']:
+        clauses.append("t.subject = :subject")
+        params['subject'] = opts['subject']
+    if opts['start']:
+        clauses.append("p.date >= :start")
+        params['start'] = opts['start']
+    if opts['end']:
+        clauses.append("p.date <= :end")
+        params['end'] = opts['end']
+    extra = ''.join(f" AND {c}" for c in clauses)
+
+    # 只傳回每科每日一列 (與原本前端相同，0 分或沒有分數不列入平均)
+    sql = f"""
+        SELECT t.subject, p.date AS day, SUM(p.score) AS total, COUNT(*) AS cnt
+        FROM progresses p
+        JOIN tasks t ON t.id = p.task_id
+        WHERE t.user_id = :uid AND p.score > 0 AND p.date IS NOT NULL{extra}
+        GROUP BY t.subject, p.date
+    """
+    rows = db.session.execute(db.text(sql), params).fetchall()
+    return jsonify({
+        'granularity': granularity,
+        'window': window,
+        'series': build_series([tuple(r) for r in rows], granularity, window, points),
+    })
 
-    return jsonify(results)
+def task_status_for(percent):
+    """ 由進度百分比推導任務狀態 """
+    percent = int(percent)
+    if percent == 100:
+        return '已完成'
+    if percent == 0:
+        return '未開始'
+    return '進行中'
 
+def apply_progress_fields(progress, task, data):
+    """ 套用進度欄位並同步任務狀態、筆記解析與精熟度彙總 (單筆 PATCH 與批次儲存共用) """
+    mastery_before = mastery_snapshot(task, progress) if progress.id else None
+
+    if 'progress_percent' in data:
+        progress.progress_percent = data['progress_percent']
+        # 🔥 核心聯動：依百分比自動更新 Task 狀態
+        task.status = task_status_for(data['progress_percent'])
+
+    if 'student_note' in data:
+        progress.student_note = data['student_note']
+    if 'student_note' in data or progress.clean_note is None:
+        materialize_note(progress, task.subject)
+    if 'teacher_feedback' in data:
+        progress.teacher_feedback = data['teacher_feedback']
+    if 'score' in data:
+        progress.score = data['score']
+    if 'date' in data:
+        progress.date = datetime.strptime(data['date'], '%Y-%m-%d').date()
+
+    apply_mastery_change(mastery_before, mastery_snapshot(task, progress))
 
 @progress_bp.route('/<int:progress_id>', methods=['PATCH', 'OPTIONS'])
 def update_progress(progress_id):
@@ -77,38 +359,107 @@ def update_progress(progress_id):
     if not progress:
         return jsonify({'error': 'Progress not found'}), 404
 
-    # 檢查該進度的任務是否屬於該使用者
+    # 檢查該進度的任務是否屬於該使用者 (同一個 task 直接用來更新狀態，不再重查)
     from models.task import Task
     task = Task.query.filter_by(id=progress.task_id, user_id=user_id).first()
     if not task:
         return jsonify({'error': 'Unauthorized'}), 403
-    
-    # 更新進度欄位
-    if 'progress_percent' in data:
-        progress.progress_percent = data['progress_percent']
-        
-        # 🔥 核心聯動：如果百分比達到 100，自動更新 Task 狀態
-        from models.task import Task
-        target_task = Task.query.get(progress.task_id)
-        if target_task:
-            if int(data['progress_percent']) == 100:
-                target_task.status = '已完成'
-            elif int(data['progress_percent']) == 0:
-                target_task.status = '未開始'
-            else:
-                target_task.status = '進行中'
-
-    if 'student_note' in data:
-        progress.student_note = data['student_note']
-    if 'teacher_feedback' in data:
-        progress.teacher_feedback = data['teacher_feedback']
-    if 'score' in data:
-        progress.score = data['score']
-    if 'date' in data:
-        progress.date = datetime.strptime(data['date'], '%Y-%m-%d').date()
 
+    apply_progress_fields(progress, task, data)
+    record_change(user_id, 'progress', progress.id)
+    if any(f in data for f in SEARCH_FIELDS):
+        db.session.flush()
+        reindex_progresses([progress.id])
+    if 'progress_percent' in data:
+        record_change(user_id, 'task', task.id)  # 任務狀態可能跟著變動
     db.session.commit()
     return jsonify(progress.to_dict())
 
 
+BULK_MAX_ROWS = 500
+
+def _clean_bulk_row(row):
+    """ 驗證並轉換批次儲存的一筆資料 (task_id / id / progress_percent / score / date)；格式錯誤時拋出 ValueError """
+    if not isinstance(row, dict) or 'task_id' not in row:
+        raise ValueError('每筆資料都需要 task_id')
+    if not row.get('id') and 'date' not in row:
+        raise ValueError('新增的進度需要 date')
+    cleaned = dict(row)
+    try:
+        cleaned['task_id'] = int(row['task_id'])
+        cleaned['id'] = int(row['id']) if row.get('id') else None
+        if 'progress_percent' in row:
+            cleaned['progress_percent'] = int(row['progress_percent'])
+        if row.get('score') is not None:
+            cleaned['score'] = float(row['score'])
+        if 'date' in row:
+            datetime.strptime(row['date'], '%Y-%m-%d')
+    except (TypeError, ValueError):
+        raise ValueError('task_id / id / progress_percent / score / date 格式錯誤')
+    if 'progress_percent' in row and not 0 <= cleaned['progress_percent'] <= 100:
+        raise ValueError('progress_percent 需介於 0 到 100')
+    return cleaned
+
+@progress_bp.route('/bulk', methods=['POST', 'OPTIONS'])
+def bulk_save_progress():
+    """
+    批次儲存進度：rows 內有 id 的更新該筆，沒有 id 的新增。
+    任務歸屬以一次 IN 查詢驗證，所有寫入與任務狀態同步在同一個交易完成。
+    """
+    if request.method == 'OPTIONS': return '', 200
+
+    data = request.get_json() or {}
+    user_id = data.get('user_id')
+    rows = data.get('rows') or []
+    if not user_id:
+        return jsonify({'error': 'user_id required'}), 400
+    if not isinstance(rows, list) or not rows or len(rows) > BULK_MAX_ROWS:
+        return jsonify({'error': f'rows 需為 1 到 {BULK_MAX_ROWS} 筆'}), 400
+    try:
+        rows = [_clean_bulk_row(row) for row in rows]
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    from models.task import Task
+    task_ids = {row['task_id'] for row in rows}
+    tasks = {t.id: t for t in Task.query.filter(Task.user_id == user_id, Task.id.in_(task_ids)).all()}
+    unauthorized = sorted(task_ids - set(tasks))
+    if unauthorized:
+        return jsonify({'error': 'Unauthorized', 'task_ids': unauthorized}), 403
+
+    progress_ids = {row['id'] for row in rows if row['id']}
+    existing = {p.id: p for p in Progress.query.filter(Progress.id.in_(progress_ids)).all()} if progress_ids else {}
+    # 進度必須屬於該列指定的任務，否則 task.status 與精熟度彙總會更新到錯的任務上
+    mismatched = sorted({row['id'] for row in rows
+                         if row['id'] and (row['id'] not in existing or existing[row['id']].task_id != row['task_id'])})
+    if mismatched:
+        return jsonify({'error': 'Progress not found', 'ids': mismatched}), 404
 
+    try:
+        saved = []
+        for row in rows:
+            task = tasks[row['task_id']]
+            if row['id']:
+                progress = existing[row['id']]
+            else:
+                progress = Progress(task_id=task.id, user_id=user_id, progress_percent=0, student_note='', score=0)
+                db.session.add(progress)
+            apply_progress_fields(progress, task, row)
+            saved.append(progress)
+
+        # 先 flush 取得新 id 並組好回應，commit 後就不必再逐筆重新載入
+        db.session.flush()
+        payload = {
+            'progress': [p.to_dict() for p in saved],
+            'tasks': [{'id': t.id, 'status': t.status} for t in tasks.values()]
+        }
+        record_changes(user_id, 'progress', [p.id for p in saved])
+        reindex_progresses([p.id for p, row in zip(saved, rows)
+                            if not row['id'] or any(f in row for f in SEARCH_FIELDS)])
+        record_changes(user_id, 'task', list(tasks))
+        db.session.commit()
+        return jsonify(payload)
+    except Exception as e:
+        db.session.rollback()
+        print(f"❌ 批次儲存進度失敗: {e}")
+        return jsonify({'error': '批次儲存失敗'}), 500
@@ -1,34 +1,38 @@
 from flask import Blueprint, request, jsonify, make_response
-from database import db, get_subject_publisher, get_subject_config
-import re, traceback
+from database import db, get_subject_config, normalize_subject, subject_filter_sql
+import json, traceback
+from note_parser import parse_note
 # 🚀 引入 AI 服務
 from ai_service import ask_ai
+from ai_jobs import submit_job, JobRejected
+from ai_batch import diagnose_batch, grade_text
+from data_version import record_change, record_changes, conditional
+from search_index import reindex_progresses, search as search_progress_text, SEARCH_FIELDS
+from mistake_clusters import cluster_items, find_similar
 
 review_bp = Blueprint('review', __name__)
 
 def parse_note_content(subject, note, db_insight=None):
     """
-    核心解析引擎：處理診斷內容
+    核心解析引擎：處理診斷內容 (已有 AI 診斷時不再貼關鍵字標籤)
     """
-    if not note:
-        return "", [], "", db_insight or ""
-        
-    pages_match = re.search(r'[pP]\.?\s?\d+.*?\d+', note)
-    pages = pages_match.group(0) if pages_match else ""
-    
-    tags = []
-    insight = db_insight or ""
-    sub = str(subject or "")
-    
-    if not db_insight:
-        if "社會" in sub:
-            if any(k in note for k in ['時序', '年份']): tags.append('🗓️ 時序')
-        elif "數學" in sub:
-            if any(k in note for k in ['計算', '算式']): tags.append('🧮 計算')
-            if "單位" in note: tags.append('📏 單位細節')
+    pages, tags, clean_note = parse_note(subject, note)
+    return pages, ([] if db_insight else tags), clean_note, db_insight or ""
 
-    clean_note = re.sub(r'[pP]\.?\s?\d+.*?\d+', '', note).strip()
-    return pages, tags, clean_note, insight
+def _review_item(row):
+    # 優先使用寫入時就解析好的欄位；舊資料尚未回填時才即時解析
+    if row.clean_note is not None:
+        pages, clean_note = row.note_pages or "", row.clean_note
+        tags = [] if row.ai_insight else json.loads(row.note_tags or '[]')
+        insight = row.ai_insight or ""
+    else:
+        pages, tags, clean_note, insight = parse_note_content(row.subject, row.student_note, row.ai_insight)
+    return {
+        "id": row.id, "subject": row.subject, "unit": row.unit, "type": row.type,
+        "score": row.score, "date": str(row.date),
+        "is_corrected": bool(row.is_corrected),
+        "pages": pages, "tags": tags, "clean_note": clean_note, "insight": insight
+    }
 
 # --- 統一格式：加入 OPTIONS 處理與簡化路徑 ---
 
@@ -36,21 +40,25 @@ def parse_note_content(subject, note, db_insight=None):
 def get_review_list():
     if request.method == 'OPTIONS': return '', 200
     
-    subject = request.args.get('subject', '') 
+    subject = normalize_subject(request.args.get('subject')) 
     user_id = request.args.get('user_id')
     start_date = request.args.get('start')
     end_date = request.args.get('end')
     
     if not user_id:
         return jsonify([]), 401
+    return conditional(user_id, lambda: _review_list(user_id, subject, start_date, end_date))
 
-    sql = """
-        SELECT p.id, t.subject, t.unit, t.type, p.student_note, p.score, p.date, p.is_corrected, p.ai_insight
+def _review_list(user_id, subject, start_date, end_date):
+    # 科目精確比對 (可走 tasks 複合索引)；未指定科目時直接省略條件
+    sql = f"""
+        SELECT p.id, t.subject, t.unit, t.type, p.student_note, p.score, p.date, p.is_corrected, p.ai_insight,
+               p.note_pages, p.note_tags, p.clean_note
         FROM tasks t
         JOIN progresses p ON t.id = p.task_id
         WHERE t.user_id = :uid 
           AND p.user_id = :uid 
-          AND t.subject LIKE :sub 
+          {subject_filter_sql(subject)}
           AND p.score < 100
           AND p.date BETWEEN :start AND :end
         ORDER BY p.date DESC
@@ -58,27 +66,119 @@ def get_review_list():
     
     params = {
         'uid': user_id, 
-        'sub': f'%{subject}%',
+        'sub': subject,
         'start': start_date,
         'end': end_date
     }
     
     try:
         results = db.session.execute(db.text(sql), params).fetchall()
-        processed_data = []
-        for row in results:
-            pages, tags, clean_note, insight = parse_note_content(row.subject, row.student_note, row.ai_insight)
-            processed_data.append({
-                "id": row.id, "subject": row.subject, "unit": row.unit, "type": row.type,
-                "score": row.score, "date": str(row.date),
-                "is_corrected": bool(row.is_corrected),
-                "pages": pages, "tags": tags, "clean_note": clean_note, "insight": insight
-            })
+        processed_data = [_review_item(row) for row in results]
         return jsonify(processed_data)
     except Exception as e:
         print(f"Database error: {e}")
         return jsonify({"error": "Internal Server Error"}), 500
 
+SEARCH_MAX_LIMIT = 200
+
+@review_bp.route('/search', methods=['GET', 'OPTIONS'])
+def search_history():
+    """ 全文搜尋筆記 / 老師回饋 / AI 診斷：q 以空白分隔多個關鍵字 (全部需出現)，fields=note,feedback,insight """
+    if request.method == 'OPTIONS': return '', 200
+
+    user_id = request.args.get('user_id', type=int)
+    if not user_id:
+        return jsonify([]), 401
+    query = (request.args.get('q') or '').strip()
+    if not query:
+        return jsonify({"error": "請輸入搜尋關鍵字"}), 400
+
+    fields = None
+    if request.args.get('fields'):
+        fields = {f.strip() for f in request.args['fields'].split(',') if f.strip()}
+        unknown = fields - set(SEARCH_FIELDS.values())
+        if unknown:
+            return jsonify({"error": f"不支援的欄位: {', '.join(sorted(unknown))}"}), 400
+    limit = min(request.args.get('limit', 50, type=int) or 50, SEARCH_MAX_LIMIT)
+
+    def build():
+        results, candidates = search_progress_text(
+            user_id, query, fields, normalize_subject(request.args.get('subject')),
+            request.args.get('start'), request.args.get('end'), limit)
+        return jsonify({"results": results, "count": len(results), "candidates": candidates})
+    return conditional(user_id, build)
+
+SIMILAR_INSIGHT_CANDIDATES = 200
+
+def _save_insight(user_id, record_id, insight):
+    db.session.execute(
+        db.text("UPDATE progresses SET ai_insight = :insight WHERE id = :id"),
+        {'insight': insight, 'id': record_id}
+    )
+    record_change(user_id, 'progress', record_id)
+    reindex_progresses([record_id])
+    db.session.commit()
+
+def _similar_insight(user_id, record_id, subject, unit, note):
+    """ 同科目同單元已診斷過的相似錯題：回傳 (id, ai_insight)，沒有則回傳 None """
+    rows = db.session.execute(db.text("""
+        SELECT p.id, p.student_note, p.clean_note, p.ai_insight
+        FROM tasks t
+        JOIN progresses p ON t.id = p.task_id
+        WHERE t.user_id = :uid AND t.subject = :sub AND COALESCE(t.unit, '') = :unit
+          AND p.ai_insight IS NOT NULL AND p.ai_insight <> '' AND p.id <> :rid
+        ORDER BY p.date DESC
+        LIMIT :limit
+    """), {'uid': user_id, 'sub': subject, 'unit': unit or '', 'rid': record_id or 0,
+           'limit': SIMILAR_INSIGHT_CANDIDATES}).fetchall()
+    candidates = [(row.id, row.clean_note if row.clean_note is not None else parse_note(subject, row.student_note)[2])
+                  for row in rows]
+    match = find_similar(parse_note(subject, note)[2], candidates)
+    if not match:
+        return None
+    return match[0], next(row.ai_insight for row in rows if row.id == match[0])
+
+def _has_insight(record_id):
+    if not record_id:
+        return False
+    current = db.session.execute(db.text("SELECT ai_insight FROM progresses WHERE id = :id"),
+                                 {'id': record_id}).scalar()
+    return bool(current)
+
+def diagnose_record(user_id, record_id, subject, unit, note, force=False):
+    """
+    呼叫 AI 診斷單筆錯題並回寫 ai_insight；同步路由與背景工作共用。
+    這筆還沒有診斷、且同單元已有相似錯題的診斷時直接沿用 (不呼叫 AI，回傳 reused_from)；
+    已有診斷代表使用者要求重新分析，一律呼叫 AI，不會被相似錯題的舊診斷覆蓋。force 為 true 時也一律重新診斷。
+    重新診斷時不讀 AI 快取，否則相同提問只會拿回上一次的回答。
+    """
+    regenerate = force or _has_insight(record_id)
+    if not regenerate:
+        reused = _similar_insight(user_id, record_id, subject, unit, note)
+        if reused:
+            source_id, insight = reused
+            if record_id:
+                _save_insight(user_id, record_id, insight)
+            return {"insight": insight, "reused_from": source_id}
+
+    # get_subject_config 已包含出版社，一次查詢即可
+    config = get_subject_config(user_id, subject)
+    
+    user_question = f"教材背景：{grade_text(config['grade'])}、版本：{config['publisher']}。請針對學生在『{subject}』單元『{unit}』遇到的錯誤：『{note}』進行精簡診斷，200字內。"
+
+    ai_response = ask_ai(user_id, user_question, refresh=regenerate)
+
+    if "error" in ai_response:
+        # insight 沿用原本的顯示文字；error 讓背景工作標記為 failed
+        return {"insight": f"💡 {ai_response['error']}", "error": ai_response['error']}
+
+    ai_result = ai_response.get('content', '').strip()
+
+    if record_id and ai_result:
+        _save_insight(user_id, record_id, ai_result)
+    
+    return {"insight": ai_result}
+
 @review_bp.route('/ai_diagnose', methods=['POST', 'OPTIONS'])
 def ai_diagnose():
     if request.method == 'OPTIONS': return '', 200
@@ -90,36 +190,139 @@ def ai_diagnose():
         unit = data.get('unit', '')
         note = data.get('note', '')
         user_id = data.get('user_id')
+        force = bool(data.get('force'))
         
         if not user_id:
             return jsonify({"error": "缺少 User ID"}), 400
 
-        publisher = get_subject_publisher(user_id, subject)
-        config = get_subject_config(user_id, subject)
-        grade_text = f"{config['grade']}年級" if config['grade'] <= 6 else f"國中{config['grade']-6}年級"
-        
-        user_question = f"教材背景：{grade_text}、版本：{publisher}。請針對學生在『{subject}』單元『{unit}』遇到的錯誤：『{note}』進行精簡診斷，200字內。"
+        # 🚀 async 模式：排入背景佇列，立即回傳 job_id 供 /api/ai/jobs 查詢
+        if data.get('async'):
+            try:
+                job_id = submit_job(user_id, 'diagnose', diagnose_record, user_id, record_id, subject, unit, note, force)
+            except JobRejected as e:
+                return jsonify({"error": str(e)}), 429
+            return jsonify({"job_id": job_id, "status": "queued"}), 202
 
-        ai_response = ask_ai(user_id, user_question)
+        return jsonify(diagnose_record(user_id, record_id, subject, unit, note, force))
 
-        if "error" in ai_response:
-            return jsonify({"insight": f"💡 {ai_response['error']}"}), 200
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({"error": "系統處理失敗"}), 500
+    
+BATCH_MAX_ITEMS = 100
 
-        ai_result = ai_response.get('content', '').strip()
+def diagnose_records_batch(user_id, ids=None, start=None, end=None, subject=None, force=False):
+    """
+    批次診斷：一次撈出錯題、每科只查一次設定，相似錯題分群後只把每群代表打包呼叫 AI，
+    結果套用到同群成員，最後單一交易寫回。
+    一次最多處理 BATCH_MAX_ITEMS 筆，超出的筆數以 remaining / has_more 回報，前端可再呼叫一次。
+    """
+    params = {'uid': user_id, 'limit': BATCH_MAX_ITEMS}
+    if ids:
+        condition = "p.id IN :ids"
+        params['ids'] = list(ids)
+    else:
+        # 「全部未訂正」模式：區間內仍未訂正的錯題
+        condition = f"p.is_corrected IS NOT TRUE AND p.score < 100 AND p.date BETWEEN :start AND :end {subject_filter_sql(subject)}"
+        params.update({'start': start, 'end': end, 'sub': subject})
+    if not force:
+        condition += " AND (p.ai_insight IS NULL OR p.ai_insight = '')"
 
-        if record_id and ai_result:
-            db.session.execute(
-                db.text("UPDATE progresses SET ai_insight = :insight WHERE id = :id"),
-                {'insight': ai_result, 'id': record_id}
-            )
-            db.session.commit()
-        
-        return jsonify({"insight": ai_result})
+    source = f"""
+        FROM tasks t
+        JOIN progresses p ON t.id = p.task_id
+        WHERE t.user_id = :uid AND {condition}
+    """
+    sql = db.text(f"SELECT p.id, t.subject, t.unit, p.student_note, p.clean_note {source} ORDER BY p.date DESC LIMIT :limit")
+    if ids:
+        sql = sql.bindparams(db.bindparam('ids', expanding=True))
+    rows = db.session.execute(sql, params).fetchall()
+
+    # 剛好取滿上限時才另外計算總數，得知還有多少筆沒輪到
+    remaining = 0
+    if len(rows) >= BATCH_MAX_ITEMS:
+        count_sql = db.text(f"SELECT COUNT(*) {source}")
+        if ids:
+            count_sql = count_sql.bindparams(db.bindparam('ids', expanding=True))
+        remaining = max(db.session.execute(count_sql, params).scalar() - len(rows), 0)
+
+    items_by_subject = {}
+    for row in rows:
+        clean_note = row.clean_note if row.clean_note is not None else parse_note(row.subject, row.student_note)[2]
+        items_by_subject.setdefault(row.subject, []).append({'id': row.id, 'unit': row.unit, 'note': clean_note})
+    configs = {sub: get_subject_config(user_id, sub) for sub in items_by_subject}
+
+    clusters_by_subject = {sub: cluster_items(items) for sub, items in items_by_subject.items()}
+    representatives = {sub: [rep for rep, _ in clusters] for sub, clusters in clusters_by_subject.items()}
+    insights, errors, requests_made = diagnose_batch(user_id, representatives, configs, refresh=force)
+    for clusters in clusters_by_subject.values():
+        for rep, members in clusters:
+            for member in members:
+                if member is rep:
+                    continue
+                if rep['id'] in insights:
+                    insights[member['id']] = insights[rep['id']]
+                elif rep['id'] in errors:
+                    errors[member['id']] = errors[rep['id']]
+
+    if insights:
+        db.session.execute(
+            db.text("UPDATE progresses SET ai_insight = :insight WHERE id = :id"),
+            [{'insight': text, 'id': pid} for pid, text in insights.items()]
+        )
+        record_changes(user_id, 'progress', list(insights))
+        reindex_progresses(list(insights))
+        db.session.commit()
+
+    return {
+        "results": [{"id": pid, "insight": text} for pid, text in insights.items()],
+        "errors": [{"id": pid, "error": msg} for pid, msg in errors.items()],
+        "total": len(rows),
+        "remaining": remaining,
+        "has_more": remaining > 0,
+        "clusters": sum(len(reps) for reps in representatives.values()),
+        "ai_requests": requests_made
+    }
+
+@review_bp.route('/ai_diagnose_batch', methods=['POST', 'OPTIONS'])
+def ai_diagnose_batch():
+    if request.method == 'OPTIONS': return '', 200
+
+    try:
+        data = request.json or {}
+        user_id = data.get('user_id')
+        ids = data.get('ids') or []
+
+        if not user_id:
+            return jsonify({"error": "缺少 User ID"}), 400
+        if not ids and not data.get('all_uncorrected'):
+            return jsonify({"error": "請提供 ids 或 all_uncorrected"}), 400
+        try:
+            if not isinstance(ids, list):
+                raise ValueError(ids)
+            ids = [int(i) for i in ids]
+        except (TypeError, ValueError):
+            return jsonify({"error": "ids 需為數字陣列"}), 400
+        if data.get('all_uncorrected') and not (data.get('start') and data.get('end')):
+            return jsonify({"error": "all_uncorrected 需要 start 與 end"}), 400
+
+        args = (user_id, ids, data.get('start'), data.get('end'),
+                normalize_subject(data.get('subject')), bool(data.get('force')))
+
+        if data.get('async'):
+            try:
+                job_id = submit_job(user_id, 'diagnose_batch', diagnose_records_batch, *args)
+            except JobRejected as e:
+                return jsonify({"error": str(e)}), 429
+            return jsonify({"job_id": job_id, "status": "queued"}), 202
+
+        return jsonify(diagnose_records_batch(*args))
 
     except Exception as e:
+        db.session.rollback()
         traceback.print_exc()
-        return jsonify({"error": "系統處理失敗"}), 500
-    
+        return jsonify({"error": "批次診斷失敗"}), 500
+
 @review_bp.route('/toggle', methods=['POST', 'OPTIONS'])
 def toggle_review_status():
     if request.method == 'OPTIONS': return '', 200
@@ -137,6 +340,10 @@ def toggle_review_status():
             'status': 1 if is_corrected else 0, 
             'id': record_id
         })
+        # 這個路由沒有帶 user_id，改以該筆進度的擁有者記錄異動
+        owner = db.session.execute(db.text("SELECT user_id FROM progresses WHERE id = :id"), {'id': record_id}).fetchone()
+        if owner:
+            record_change(owner.user_id, 'progress', record_id)
         db.session.commit()
         
         return jsonify({"message": "OK", "id": record_id, "new_status": is_corrected})
@@ -0,0 +1,132 @@
+import os
+from datetime import datetime, timedelta
+from flask import Blueprint, request, jsonify
+from database import db
+from data_version import OP_DELETE, get_change_log_floor, maybe_prune_change_log
+
+sync_bp = Blueprint('sync', __name__)
+
+SYNC_DEFAULT_LIMIT = 500
+SYNC_MAX_LIMIT = 2000
+# change_log 的 id 在 INSERT 時就配好，交易較晚 commit 的紀錄可能出現在已讀過的 id 之前；
+# 游標只推進到超過這個秒數的紀錄為止，較新的紀錄照常回傳，但下次同步會重讀一次
+SYNC_SETTLE_SECONDS = int(os.environ.get('SYNC_SETTLE_SECONDS', 30))
+
+TASK_COLUMNS = "id, subject, title, type, date, status, unit, user_id"
+PROGRESS_COLUMNS = ("id, task_id, user_id, date, progress_percent, student_note, teacher_feedback, "
+                    "score, is_corrected, ai_insight")
+
+def _row_dict(row):
+    data = dict(row._mapping)
+    if data.get('date') is not None:
+        data['date'] = str(data['date'])[:10]
+    if 'is_corrected' in data:
+        data['is_corrected'] = bool(data['is_corrected'])
+    return data
+
+def _fetch(table, columns, user_id, ids=None):
+    """ 讀取目前的完整資料列；ids 為 None 時讀取該使用者全部 """
+    sql = f"SELECT {columns} FROM {table} WHERE user_id = :uid"
+    params = {'uid': user_id}
+    if ids is not None:
+        if not ids:
+            return []
+        sql += " AND id IN :ids"
+        params['ids'] = list(ids)
+        stmt = db.text(sql).bindparams(db.bindparam('ids', expanding=True))
+    else:
+        stmt = db.text(sql + " ORDER BY id")
+    return [_row_dict(r) for r in db.session.execute(stmt, params)]
+
+def _settled_before():
+    return datetime.now() - timedelta(seconds=SYNC_SETTLE_SECONDS)
+
+def _latest_cursor(user_id, floor):
+    # 只算已穩定的紀錄：還在 commit 中的較小 id 不會被游標跳過
+    latest = db.session.execute(db.text(
+        "SELECT MAX(id) FROM change_log WHERE user_id = :uid AND changed_at <= :settled"),
+        {'uid': user_id, 'settled': _settled_before()}).scalar() or 0
+    return max(latest, floor)
+
+def _snapshot(user_id, floor):
+    # 先取游標再讀資料：讀取期間的寫入下次同步會再送一次，不會漏掉
+    latest = _latest_cursor(user_id, floor)
+    return jsonify({
+        'full': True,
+        'cursor': latest,
+        'has_more': False,
+        'tasks': _fetch('tasks', TASK_COLUMNS, user_id),
+        'progress': _fetch('progresses', PROGRESS_COLUMNS, user_id),
+        'deleted': {'tasks': [], 'progress': []},
+        'config': [],
+    })
+
+@sync_bp.route('', methods=['GET', 'OPTIONS'])
+def sync_changes():
+    """
+    增量同步：
+    - 不帶 cursor：回傳完整快照 (全部任務與進度) 與目前的游標
+    - 帶 cursor：只回傳之後有異動的任務 / 進度目前內容，以及被刪除的 id (墓碑)
+    - cursor 之後的紀錄已超過保留期限被清除：改回完整快照 (full 為 true，前端應整份取代本機資料)
+    has_more 為 true 時以回傳的 cursor 繼續拉取；config 列出有變動的設定 (publishers / global / ai)。
+    同一筆異動可能在相鄰兩次同步中都出現 (回傳的是目前內容，重複套用無妨)
+    """
+    if request.method == 'OPTIONS': return '', 200
+
+    user_id = request.args.get('user_id', type=int)
+    if not user_id:
+        return jsonify({}), 401
+
+    cursor = request.args.get('cursor', type=int)
+    limit = min(request.args.get('limit', SYNC_DEFAULT_LIMIT, type=int) or SYNC_DEFAULT_LIMIT, SYNC_MAX_LIMIT)
+
+    maybe_prune_change_log()
+    floor = get_change_log_floor(user_id)
+    if cursor is None or cursor < floor:
+        return _snapshot(user_id, floor)
+
+    rows = db.session.execute(db.text("""
+        SELECT id, entity, entity_id, op,
+               CASE WHEN changed_at <= :settled THEN 1 ELSE 0 END AS settled
+        FROM change_log
+        WHERE user_id = :uid AND id > :cursor
+        ORDER BY id
+        LIMIT :limit
+    """), {'uid': user_id, 'cursor': cursor, 'limit': limit, 'settled': _settled_before()}).fetchall()
+
+    # 游標只推進到第一筆尚未穩定的紀錄之前
+    next_cursor = cursor
+    for row in rows:
+        if not row.settled:
+            break
+        next_cursor = row.id
+
+    # 同一筆資料多次異動只保留最後一次
+    final_ops = {}
+    for row in rows:
+        final_ops[(row.entity, row.entity_id)] = row.op
+
+    upserts = {'task': set(), 'progress': set()}
+    deleted = {'task': set(), 'progress': set()}
+    config = set()
+    for (entity, entity_id), op in final_ops.items():
+        if entity.startswith('config.'):
+            config.add(entity.split('.', 1)[1])
+        elif entity in upserts:
+            (deleted if op == OP_DELETE else upserts)[entity].add(entity_id)
+
+    tasks = _fetch('tasks', TASK_COLUMNS, user_id, upserts['task'])
+    progress = _fetch('progresses', PROGRESS_COLUMNS, user_id, upserts['progress'])
+    # 記錄為更新、但之後已不存在的資料也視為刪除
+    deleted['task'] |= upserts['task'] - {t['id'] for t in tasks}
+    deleted['progress'] |= upserts['progress'] - {p['id'] for p in progress}
+
+    return jsonify({
+        'full': False,
+        'cursor': next_cursor,
+        'has_more': len(rows) == limit and next_cursor == rows[-1].id,
+        'tasks': tasks,
+        'progress': progress,
+        'deleted': {'tasks': sorted(deleted['task']), 'progress': sorted(deleted['progress'])},
+        'config': sorted(config),
+    })
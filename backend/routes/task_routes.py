@@ -1,19 +1,69 @@
 from flask import Blueprint, request, jsonify
 from models.task import Task
 from models.progress import Progress  # 確保這裡引用正確
-from database import db
+from database import db, clean_subject, get_exam_dates
+from task_schedule import expand_recurring_rule
 from datetime import datetime
+from sqlalchemy.orm import load_only
+from note_parser import materialize_note
+from mastery_rollup import mastery_snapshot, apply_mastery_change
+from listing import parse_list_args, set_next_cursor
+from data_version import record_change, record_changes, conditional, OP_DELETE
+from search_index import reindex_progresses, remove_progresses
 
 task_bp = Blueprint('task', __name__)
 
+TASK_FIELDS = ['id', 'subject', 'title', 'type', 'date', 'status', 'unit', 'user_id']
+
+def _project_value(task, field):
+    value = getattr(task, field)
+    if field == 'date':
+        return value.strftime('%Y-%m-%d') if value else None
+    return value
+
 @task_bp.route('/tasks', methods=['GET'])
 def get_tasks():
     user_id = request.args.get('user_id', type=int)
     if not user_id:
         return jsonify([]), 401 
+    return conditional(user_id, lambda: _list_tasks(user_id))
+
+def _list_tasks(user_id):
+    try:
+        opts = parse_list_args(request.args, TASK_FIELDS)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # 篩選、排序與分頁全部交給資料庫處理
+    query = Task.query.filter(Task.user_id == user_id)
+    if opts['start']:
+        query = query.filter(Task.date >= opts['start'])
+    if opts['end']:
+        query = query.filter(Task.date <= opts['end'])
+    if opts['subject']:
+        query = query.filter(Task.subject == opts['subject'])
+    if opts['type']:
+        query = query.filter(Task.type == opts['type'])
+    if opts['status']:
+        query = query.filter(Task.status == opts['status'])
+    if opts['cursor']:
+        query = query.filter(Task.id > opts['cursor'])
+    if opts['fields']:
+        query = query.options(load_only(*[getattr(Task, f) for f in opts['fields'] if f != 'id']))
+
+    query = query.order_by(Task.id)
+    if opts['limit']:
+        query = query.limit(opts['limit'])
 
-    tasks = Task.query.filter_by(user_id=user_id).all()
-    return jsonify([t.to_dict() for t in tasks])
+    tasks = query.all()
+    if opts['fields']:
+        # 只讀取已載入的欄位，避免 to_dict() 觸發延遲載入
+        payload = [{f: _project_value(t, f) for f in opts['fields']} for t in tasks]
+    else:
+        payload = [t.to_dict() for t in tasks]
+
+    response = jsonify(payload)
+    return set_next_cursor(response, opts, tasks[-1].id if tasks else None, len(tasks))
 
 
 @task_bp.route('/tasks', methods=['POST'])
@@ -23,9 +73,14 @@ def add_task():
     if not user_id:
         return jsonify({'error': 'user_id required'}), 400
 
+    try:
+        subject = clean_subject(data.get('subject'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
     date = datetime.strptime(data['date'], '%Y-%m-%d').date()
     new_task = Task(
-        subject=data['subject'],
+        subject=subject,
         title=data['title'],
         type=data['type'],
         date=date,
@@ -34,10 +89,88 @@ def add_task():
         user_id=user_id
     )
     db.session.add(new_task)
+    db.session.flush()
+    record_change(user_id, 'task', new_task.id)
     db.session.commit()
     return jsonify(new_task.to_dict()), 201
 
 
+BULK_MAX_TASKS = 1000
+
+def _insert_tasks(user_id, task_rows):
+    """
+    一次新增多筆任務並取得 id：add_all 後單次 flush。
+    PostgreSQL 上 SQLAlchemy 會合併成多列 INSERT ... RETURNING；其他資料庫退回逐列 INSERT，但仍只 commit 一次。
+    """
+    new_tasks = [Task(user_id=user_id, **row) for row in task_rows]
+    db.session.add_all(new_tasks)
+    db.session.flush()
+    ids = [t.id for t in new_tasks]
+    record_changes(user_id, 'task', ids)
+    db.session.commit()
+    return ids
+
+@task_bp.route('/tasks/bulk', methods=['POST'])
+def add_tasks_bulk():
+    data = request.get_json() or {}
+    user_id = data.get('user_id')
+    if not user_id:
+        return jsonify({'error': 'user_id required'}), 400
+
+    items = data.get('tasks') or []
+    if not isinstance(items, list) or not items or len(items) > BULK_MAX_TASKS:
+        return jsonify({'error': f'tasks 需為 1 到 {BULK_MAX_TASKS} 筆'}), 400
+
+    try:
+        rows = [{
+            'subject': clean_subject(item['subject']),
+            'title': item['title'],
+            'type': item['type'],
+            'date': datetime.strptime(item['date'][:10], '%Y-%m-%d').date(),
+            'status': item.get('status', '未完成'),
+            'unit': item.get('unit', ''),
+        } for item in items]
+    except (KeyError, TypeError, ValueError) as e:
+        # TypeError：項目不是物件，或日期為 null / 數字
+        return jsonify({'error': f'任務資料格式錯誤: {e}'}), 400
+
+    try:
+        ids = _insert_tasks(user_id, rows)
+        return jsonify({'created': len(ids), 'ids': ids}), 201
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+
+@task_bp.route('/tasks/recurring', methods=['POST'])
+def add_recurring_tasks():
+    """ 依規則 (科目、單元範圍、星期、起訖日或考期) 在後端展開並一次寫入 """
+    data = request.get_json() or {}
+    user_id = data.get('user_id')
+    if not user_id:
+        return jsonify({'error': 'user_id required'}), 400
+
+    rule = dict(data)
+    try:
+        rule['subject'] = clean_subject(data.get('subject'))
+        rows, unscheduled = expand_recurring_rule(rule, get_exam_dates(user_id))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    if data.get('dry_run'):
+        return jsonify({'preview': [dict(r, date=r['date'].strftime('%Y-%m-%d')) for r in rows],
+                        'unscheduled_units': unscheduled})
+    if not rows:
+        return jsonify({'error': '規則沒有產生任何任務'}), 400
+
+    try:
+        ids = _insert_tasks(user_id, rows)
+        return jsonify({'created': len(ids), 'ids': ids, 'unscheduled_units': unscheduled}), 201
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+
 # task_routes.py
 
 @task_bp.route('/tasks/<int:task_id>', methods=['PATCH'])
@@ -51,22 +184,45 @@ def update_task(task_id):
     if not task:
         return jsonify({'error': 'Task not found or unauthorized'}), 404
 
+    if 'subject' in data:
+        try:
+            data['subject'] = clean_subject(data['subject'])
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+    if 'date' in data:
+        try:
+            datetime.strptime(data['date'][:10], '%Y-%m-%d')
+        except (TypeError, ValueError):
+            return jsonify({'error': 'date 需為 YYYY-MM-DD'}), 400
+
+    # 科目或單元變動時，這個任務的所有進度都要在彙總表中搬到新的單元
+    moved_progresses = []
+    if any(f in data and data[f] != getattr(task, f) for f in ('subject', 'unit')):
+        moved_progresses = [(p, mastery_snapshot(task, p)) for p in Progress.query.filter_by(task_id=task.id).all()]
+
     # 1. 更新任務基本欄位
     for field in ['subject', 'title', 'type', 'date', 'status', 'unit']:
         if field in data:
             if field == 'date':
-                date_str = data[field][:10]
-                setattr(task, field, datetime.strptime(date_str, '%Y-%m-%d').date())
+                setattr(task, field, datetime.strptime(data[field][:10], '%Y-%m-%d').date())
             else:
                 setattr(task, field, data[field])
 
+    for progress, before in moved_progresses:
+        apply_mastery_change(before, mastery_snapshot(task, progress))
+        materialize_note(progress, task.subject)
+
     # 2. 🔥 聯動邏輯：同步更新 Progress 表
+    touched_progresses = [p for p, _ in moved_progresses]
     if 'status' in data:
-        progress = Progress.query.filter_by(task_id=task.id).first()
+        # 與 /progress/with_tasks、/summary 讀取的是同一筆 (最新進度)，狀態才會一致
+        progress = Progress.latest_for_task(task.id)
         
         if data['status'] == '已完成':
             if progress:
                 progress.progress_percent = 100
+                touched_progresses.append(progress)
             else:
                 # 修正此處：確保包含 user_id，且 score 給予 None 而非空字串
                 new_progress = Progress(
@@ -77,13 +233,21 @@ def update_task(task_id):
                     student_note='任務狀態由月曆標記為已完成',
                     score=0  # 👈 改成 0，避免 Data truncated 錯誤
                 )
+                materialize_note(new_progress, task.subject)
                 db.session.add(new_progress)
+                touched_progresses.append(new_progress)
+                apply_mastery_change(None, mastery_snapshot(task, new_progress))
         
         elif data['status'] == '未開始':
             if progress:
                 progress.progress_percent = 0
+                touched_progresses.append(progress)
 
     try:
+        db.session.flush()
+        record_change(user_id, 'task', task.id)
+        record_changes(user_id, 'progress', {p.id for p in touched_progresses})
+        reindex_progresses({p.id for p in touched_progresses})
         db.session.commit()
         return jsonify(task.to_dict())
     except Exception as e:
@@ -103,9 +267,16 @@ def delete_task(task_id):
     try:
         # 🔥 在刪除 Task 之前，先手動把這筆任務的所有 Progress 刪掉
         # 這樣就不會觸發資料庫的外鍵保護報錯了
+        progresses = Progress.query.filter_by(task_id=task_id).all()
+        for progress in progresses:
+            apply_mastery_change(mastery_snapshot(task, progress), None)
         Progress.query.filter_by(task_id=task_id).delete()
         
         db.session.delete(task)
+        # 刪除留下墓碑，離線副本同步時才知道要移除
+        record_change(task.user_id, 'task', task_id, OP_DELETE)
+        record_changes(task.user_id, 'progress', [p.id for p in progresses], OP_DELETE)
+        remove_progresses([p.id for p in progresses])
         db.session.commit()
         return jsonify({'message': 'Task deleted successfully'})
     except Exception as e:
@@ -1,9 +1,11 @@
+import json
 import traceback
-from flask import Blueprint, request, jsonify
-from database import db, get_subject_publisher, get_subject_config
+from flask import Blueprint, request, jsonify, Response, stream_with_context
+from database import db, get_subject_config, normalize_subject, subject_filter_sql
 from datetime import datetime
 # 🚀 引入通用 AI 服務
-from ai_service import ask_ai 
+from ai_service import ask_ai, stream_ai
+from ai_jobs import submit_job, JobRejected
 
 teacher_bp = Blueprint('teacher', __name__)
 
@@ -11,7 +13,7 @@ teacher_bp = Blueprint('teacher', __name__)
 @teacher_bp.route('/analysis', methods=['GET'])
 def get_teacher_analysis():
     try:
-        subject = request.args.get('subject', '')
+        subject = normalize_subject(request.args.get('subject'))
         start_date = request.args.get('start')
         end_date = request.args.get('end')
         user_id = request.args.get('user_id')
@@ -19,45 +21,36 @@ def get_teacher_analysis():
         if not user_id:
             return jsonify({"error": "Unauthorized"}), 401
 
-        sql = """
-            SELECT t.unit, p.score, p.student_note, t.subject, p.date
-            FROM tasks t
-            JOIN progresses p ON t.id = p.task_id
-            WHERE t.user_id = :uid 
-              AND t.subject LIKE :sub 
-              AND p.date BETWEEN :start AND :end
+        # 🚀 改查預先彙總的 unit_mastery_daily，只需加總區間內的少量彙總列
+        sql = f"""
+            SELECT unit, SUM(total_score) AS total, SUM(entry_count) AS count, SUM(failed_count) AS failed
+            FROM unit_mastery_daily
+            WHERE user_id = :uid 
+              {subject_filter_sql(subject, 'subject')}
+              AND day BETWEEN :start AND :end
+            GROUP BY unit
         """
-        params = {'uid': user_id, 'sub': f'%{subject}%', 'start': start_date, 'end': end_date}
+        params = {'uid': user_id, 'sub': subject, 'start': start_date, 'end': end_date}
         results = db.session.execute(db.text(sql), params).fetchall()
 
+        total_count = sum(int(row.count) for row in results)
         analysis = {
-            "summary": {"total_count": len(results), "avg_score": 0, "failed_count": 0},
+            "summary": {"total_count": total_count, "avg_score": 0, "failed_count": 0},
             "unit_stats": []
         }
 
-        if not results:
+        if not total_count:
             return jsonify(analysis)
 
-        unit_map = {}
-        total_score = 0
-        for row in results:
-            current_score = int(row.score) if row.score else 0
-            total_score += current_score
-            if current_score < 90:
-                analysis["summary"]["failed_count"] += 1
-
-            if row.unit not in unit_map:
-                unit_map[row.unit] = {"total": 0, "count": 0}
-            unit_map[row.unit]["total"] += current_score
-            unit_map[row.unit]["count"] += 1
+        total_score = sum(int(row.total) for row in results)
+        analysis["summary"]["failed_count"] = sum(int(row.failed) for row in results)
+        analysis["summary"]["avg_score"] = round(total_score / total_count, 1)
 
-        analysis["summary"]["avg_score"] = round(total_score / len(results), 1)
-
-        for unit, data in unit_map.items():
-            avg = round(data["total"] / data["count"], 1)
+        for row in results:
+            avg = round(int(row.total) / int(row.count), 1)
             analysis["unit_stats"].append({
-                "unit": unit,
-                "count": data["count"],
+                "unit": row.unit,
+                "count": int(row.count),
                 "avg": avg,
                 "level": "精熟" if avg >= 95 else ("尚可" if avg >= 85 else "待加強")
             })
@@ -68,6 +61,59 @@ def get_teacher_analysis():
         traceback.print_exc()
         return jsonify({"error": str(e)}), 500
 
+def prepare_quiz_prompt(user_id, subject):
+    """ 組出補救考卷的提問；回傳 (提問內容, 出版社)，沒有錯題時提問為 None """
+    # 1. 獲取教材背景 (get_subject_config 已包含出版社)
+    config = get_subject_config(user_id, subject)
+    publisher = config['publisher']
+    grade_text = f"{config['grade']}年級" if config['grade'] <= 6 else f"國中{config['grade']-6}年級"
+
+    # 2. 撈取近期錯題
+    sql = """
+        SELECT t.unit, t.title, p.student_note, p.score
+        FROM tasks t
+        JOIN progresses p ON t.id = p.task_id
+        WHERE t.user_id = :uid 
+          AND t.subject = :sub 
+          AND p.score < 100
+        ORDER BY p.date DESC
+        LIMIT 8
+    """
+    error_results = db.session.execute(db.text(sql), {'uid': user_id, 'sub': subject}).fetchall()
+
+    if not error_results:
+        return None, publisher
+
+    context_data = ""
+    for i, row in enumerate(error_results):
+        context_data += f"{i+1}. [{row.unit}] {row.title} (得分:{row.score})\n"
+
+    # 3. 建立發送給 AI 的內容 (User Message)
+    # 注意：我們只需提供事實數據，角色扮演(Prompt)可放在資料庫的 system_prompt 中
+    user_message = f"""
+請針對『{publisher}版』{grade_text}『{subject}』，根據以下真實錯題數據出一份補救練習：
+{context_data}
+要求：3 題選擇題與 2 題應用題，並附上答案與解析。
+"""
+    return user_message, publisher
+
+def build_quiz(user_id, subject, force=False):
+    """ 依近期錯題請 AI 出補救考卷；同步路由與背景工作共用。force 為 true (重新出題) 時不讀 AI 快取 """
+    user_message, publisher = prepare_quiz_prompt(user_id, subject)
+    if user_message is None:
+        return {"quiz_content": f"⚠️ 目前找不到您的 {subject} 科錯題紀錄。"}
+
+    # 4. 🚀 呼叫 AI 服務 (自動處理 Key、URL 與超時)
+    ai_response = ask_ai(user_id, user_message, refresh=force)
+
+    if "error" in ai_response:
+        return {"error": f"AI 老師暫時無法出題: {ai_response['error']}"}
+
+    return {
+        "quiz_content": ai_response.get('content'),
+        "publisher": publisher
+    }
+
 # --- 路由 2：一鍵生成補救考卷 (🚀 去 Key 化版本) ---
 @teacher_bp.route('/generate_quiz', methods=['POST'])
 def generate_quiz():
@@ -75,55 +121,60 @@ def generate_quiz():
         data = request.json
         subject = data.get('subject', '社會')
         user_id = data.get('user_id')
+        force = bool(data.get('force'))
         
         if not user_id:
             return jsonify({"error": "User ID required"}), 400
 
-        # 1. 獲取教材背景
-        publisher = get_subject_publisher(user_id, subject)
-        config = get_subject_config(user_id, subject)
-        grade_text = f"{config['grade']}年級" if config['grade'] <= 6 else f"國中{config['grade']-6}年級"
-
-        # 2. 撈取近期錯題
-        sql = """
-            SELECT t.unit, t.title, p.student_note, p.score
-            FROM tasks t
-            JOIN progresses p ON t.id = p.task_id
-            WHERE t.user_id = :uid 
-              AND t.subject = :sub 
-              AND p.score < 100
-            ORDER BY p.date DESC
-            LIMIT 8
-        """
-        error_results = db.session.execute(db.text(sql), {'uid': user_id, 'sub': subject}).fetchall()
-
-        if not error_results:
-            return jsonify({"quiz_content": f"⚠️ 目前找不到您的 {subject} 科錯題紀錄。"})
-
-        context_data = ""
-        for i, row in enumerate(error_results):
-            context_data += f"{i+1}. [{row.unit}] {row.title} (得分:{row.score})\n"
-
-        # 3. 建立發送給 AI 的內容 (User Message)
-        # 注意：我們只需提供事實數據，角色扮演(Prompt)可放在資料庫的 system_prompt 中
-        user_message = f"""
-請針對『{publisher}版』{grade_text}『{subject}』，根據以下真實錯題數據出一份補救練習：
-{context_data}
-要求：3 題選擇題與 2 題應用題，並附上答案與解析。
-"""
-
-        # 4. 🚀 呼叫 AI 服務 (自動處理 Key、URL 與超時)
-        ai_response = ask_ai(user_id, user_message)
+        # async 模式：排入背景佇列，立即回傳 job_id 供 /api/ai/jobs 查詢
+        if data.get('async'):
+            try:
+                job_id = submit_job(user_id, 'quiz', build_quiz, user_id, subject, force)
+            except JobRejected as e:
+                return jsonify({"error": str(e)}), 429
+            return jsonify({"job_id": job_id, "status": "queued"}), 202
 
-        if "error" in ai_response:
-            return jsonify({"error": f"AI 老師暫時無法出題: {ai_response['error']}"}), 200
-
-        return jsonify({
-            "quiz_content": ai_response.get('content'),
-            "publisher": publisher
-        })
+        return jsonify(build_quiz(user_id, subject, force))
 
     except Exception as e:
         traceback.print_exc()
 
         return jsonify({"error": f"系統錯誤: {str(e)}"}), 500
+
+
+# --- 路由 3：串流版補救考卷 (Server-Sent Events，邊生成邊顯示) ---
+def _sse(event, payload):
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+@teacher_bp.route('/generate_quiz/stream', methods=['GET', 'POST'])
+def generate_quiz_stream():
+    data = request.json if request.method == 'POST' else request.args
+    subject = data.get('subject', '社會')
+    user_id = data.get('user_id')
+    force = str(data.get('force', '')).lower() in ('1', 'true', 'yes')
+
+    if not user_id:
+        return jsonify({"error": "User ID required"}), 400
+
+    def events():
+        try:
+            user_message, publisher = prepare_quiz_prompt(user_id, subject)
+            if user_message is None:
+                notice = f"⚠️ 目前找不到您的 {subject} 科錯題紀錄。"
+                yield _sse('done', {"quiz_content": notice, "publisher": publisher})
+                return
+
+            yield _sse('start', {"publisher": publisher})
+            for item in stream_ai(user_id, user_message, refresh=force):
+                if item['type'] == 'chunk':
+                    yield _sse('chunk', {"text": item['text']})
+                elif item['type'] == 'error':
+                    yield _sse('error', {"error": f"AI 老師暫時無法出題: {item['error']}"})
+                else:
+                    yield _sse('done', {"quiz_content": item['content'], "publisher": publisher})
+        except Exception as e:
+            traceback.print_exc()
+            yield _sse('error', {"error": f"系統錯誤: {str(e)}"})
+
+    return Response(stream_with_context(events()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
@@ -0,0 +1,103 @@
+# score_series.py
+"""
+成績趨勢時間序列：SQL 先依 (科目, 日期) 彙總，再於此彙整成日/週/月區間、
+計算移動平均，並以 LTTB 演算法降採樣到指定點數，長期歷史也能快速繪圖。
+"""
+from datetime import date, datetime, timedelta
+
+GRANULARITIES = ('day', 'week', 'month')
+MAX_POINTS = 1000
+MAX_WINDOW = 52
+
+def _as_date(value):
+    # SQLite 的 GROUP BY 結果可能是字串
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(str(value)[:10], '%Y-%m-%d').date()
+
+def bucket_start(day, granularity):
+    """ 回傳日期所屬區間的起始日 (週以星期一為起點) """
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    return day
+
+def rollup(rows, granularity):
+    """ rows: (subject, day, total, count) → {subject: [(bucket, total, count), ...]} 依時間排序 """
+    buckets = {}
+    for subject, day, total, count in rows:
+        key = bucket_start(_as_date(day), granularity)
+        per_subject = buckets.setdefault(subject, {})
+        t, c = per_subject.get(key, (0.0, 0))
+        per_subject[key] = (t + float(total or 0), c + int(count or 0))
+    return {
+        subject: [(k, t, c) for k, (t, c) in sorted(per_subject.items())]
+        for subject, per_subject in buckets.items()
+    }
+
+def moving_average(series, window):
+    """ 以筆數加權的尾端移動平均：視窗內總分 / 視窗內筆數 """
+    result, total, count = [], 0.0, 0
+    for i, (_, t, c) in enumerate(series):
+        total += t
+        count += c
+        if i >= window:
+            total -= series[i - window][1]
+            count -= series[i - window][2]
+        result.append(round(total / count, 1) if count else None)
+    return result
+
+def lttb_indices(values, threshold):
+    """
+    Largest-Triangle-Three-Buckets 降採樣，回傳保留點的索引。
+    保留頭尾兩點，中間每個區段挑出與前一保留點、下一區段平均點構成最大三角形面積的點，
+    可保住峰谷形狀。
+    """
+    n = len(values)
+    if threshold >= n or threshold < 3:
+        return list(range(n))
+
+    keep = [0]
+    size = (n - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        start = int(i * size) + 1
+        end = int((i + 1) * size) + 1
+        next_start, next_end = end, min(int((i + 2) * size) + 1, n)
+        if next_start >= next_end:
+            next_start, next_end = n - 1, n
+        avg_x = (next_start + next_end - 1) / 2
+        avg_y = sum(values[next_start:next_end]) / (next_end - next_start)
+
+        best, best_area = start, -1.0
+        ax, ay = a, values[a]
+        for j in range(start, min(end, n - 1)):
+            area = abs((ax - avg_x) * (values[j] - ay) - (ax - j) * (avg_y - ay))
+            if area > best_area:
+                best, best_area = j, area
+        keep.append(best)
+        a = best
+    keep.append(n - 1)
+    return keep
+
+def build_series(rows, granularity='week', window=4, points=None):
+    """ 組出每科的趨勢序列；移動平均在降採樣前計算，因此不受點數影響 """
+    result = []
+    for subject, series in sorted(rollup(rows, granularity).items(), key=lambda x: str(x[0])):
+        averages = [round(t / c, 1) if c else 0 for _, t, c in series]
+        ma = moving_average(series, window)
+        indices = lttb_indices(averages, points) if points else range(len(series))
+        result.append({
+            'subject': subject,
+            'total_points': len(series),
+            'points': [{
+                'date': series[i][0].strftime('%Y-%m-%d'),
+                'avg': averages[i],
+                'count': series[i][2],
+                'moving_avg': ma[i],
+            } for i in indices],
+        })
+    return result
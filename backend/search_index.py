@@ -0,0 +1,140 @@
+# search_index.py
+"""
+進度文字 (學生筆記 / 老師回饋 / AI 診斷) 的倒排索引。
+中文以相鄰兩字 (bigram) 與單字切詞，英數以整個詞為單位；寫入進度時重建該筆的 postings，
+搜尋時先用索引取交集找候選，再以原文比對確認整段關鍵字確實連續出現 (排除 bigram 拼湊的誤判)。
+"""
+import re
+from database import db
+
+# 索引欄位 -> 搜尋參數中的名稱
+SEARCH_FIELDS = {'student_note': 'note', 'teacher_feedback': 'feedback', 'ai_insight': 'insight'}
+MAX_TERM_LENGTH = 32
+SEARCH_MAX_CANDIDATES = 2000
+
+# CJK 統一表意文字 (含擴充 A) 與相容表意文字
+_CJK_RUN = r'[㐀-䶿一-鿿豈-﫿]+'
+TOKEN_RE = re.compile(rf'({_CJK_RUN})|([0-9a-z]+)')
+
+def tokenize(text):
+    """ 索引用切詞：中文每個字與每組相鄰兩字、英數整個詞 (轉小寫) """
+    terms = set()
+    for cjk, word in TOKEN_RE.findall((text or '').lower()):
+        if cjk:
+            terms.update(cjk)
+            terms.update(cjk[i:i + 2] for i in range(len(cjk) - 1))
+        else:
+            terms.add(word[:MAX_TERM_LENGTH])
+    return terms
+
+def query_terms(phrase):
+    """ 搜尋用切詞：中文片段只取 bigram (長度 1 時用單字)，比索引更精簡、選擇性更高 """
+    terms = set()
+    for cjk, word in TOKEN_RE.findall(phrase.lower()):
+        if cjk:
+            terms.update([cjk] if len(cjk) == 1 else (cjk[i:i + 2] for i in range(len(cjk) - 1)))
+        else:
+            terms.add(word[:MAX_TERM_LENGTH])
+    return terms
+
+def _postings(row):
+    for column, field in SEARCH_FIELDS.items():
+        for term in tokenize(getattr(row, column)):
+            yield {'uid': row.user_id, 'term': term, 'field': field, 'pid': row.id}
+
+def remove_progresses(progress_ids):
+    ids = [int(i) for i in progress_ids if i is not None]
+    if ids:
+        db.session.execute(
+            db.text("DELETE FROM search_postings WHERE progress_id IN :ids").bindparams(db.bindparam('ids', expanding=True)),
+            {'ids': ids})
+
+def reindex_progresses(progress_ids, conn=None):
+    """
+    以資料庫目前內容重建指定進度的索引 (在同一個交易中，新增的進度需先 flush)。
+    conn 供遷移回填時使用；一般路由使用 db.session。
+    """
+    ids = [int(i) for i in progress_ids if i is not None]
+    if not ids:
+        return
+    executor = conn if conn is not None else db.session
+    expanding = db.bindparam('ids', expanding=True)
+    rows = executor.execute(db.text(
+        "SELECT id, user_id, student_note, teacher_feedback, ai_insight FROM progresses WHERE id IN :ids"
+    ).bindparams(expanding), {'ids': ids}).fetchall()
+
+    executor.execute(db.text("DELETE FROM search_postings WHERE progress_id IN :ids").bindparams(expanding), {'ids': ids})
+    postings = [p for row in rows for p in _postings(row)]
+    if postings:
+        executor.execute(db.text(
+            "INSERT INTO search_postings (user_id, term, field, progress_id) VALUES (:uid, :term, :field, :pid)"
+        ), postings)
+
+def _snippet(text, phrase, width=30):
+    index = text.lower().find(phrase.lower())
+    if index < 0:
+        return text[:width * 2]
+    start = max(0, index - width)
+    return ('…' if start else '') + text[start:index + len(phrase) + width] + ('…' if index + len(phrase) + width < len(text) else '')
+
+def search(user_id, query, fields=None, subject=None, start=None, end=None, limit=50):
+    """
+    回傳 (結果列表, 候選數)。query 以空白分隔多個關鍵字，全部都要出現 (AND)。
+    fields 為 note / feedback / insight 的子集合，None 代表全部。
+    """
+    phrases = [p for p in query.split() if query_terms(p)]
+    terms = set().union(*(query_terms(p) for p in phrases)) if phrases else set()
+    if not terms:
+        return [], 0
+
+    columns = [c for c, f in SEARCH_FIELDS.items() if fields is None or f in fields]
+    field_filter = "AND sp.field IN :fields" if fields is not None else ""
+    filters, params = [], {'uid': user_id, 'terms': sorted(terms), 'n': len(terms), 'limit': SEARCH_MAX_CANDIDATES}
+    if fields is not None:
+        params['fields'] = [SEARCH_FIELDS[c] for c in columns]
+    if subject:
+        filters.append("AND t.subject = :sub")
+        params['sub'] = subject
+    if start:
+        filters.append("AND p.date >= :start")
+        params['start'] = start
+    if end:
+        filters.append("AND p.date <= :end")
+        params['end'] = end
+
+    # 索引交集：每個詞都出現在 (指定欄位的) postings 中的進度
+    sql = db.text(f"""
+        SELECT p.id, t.subject, t.unit, t.type, p.date, p.score, p.is_corrected,
+               p.student_note, p.teacher_feedback, p.ai_insight
+        FROM progresses p
+        JOIN tasks t ON t.id = p.task_id
+        WHERE p.id IN (
+            SELECT sp.progress_id FROM search_postings sp
+            WHERE sp.user_id = :uid AND sp.term IN :terms {field_filter}
+            GROUP BY sp.progress_id
+            HAVING COUNT(DISTINCT sp.term) = :n
+        )
+        {' '.join(filters)}
+        ORDER BY p.date DESC, p.id DESC
+        LIMIT :limit
+    """).bindparams(db.bindparam('terms', expanding=True))
+    if fields is not None:
+        sql = sql.bindparams(db.bindparam('fields', expanding=True))
+    candidates = db.session.execute(sql, params).fetchall()
+
+    results = []
+    for row in candidates:
+        texts = {SEARCH_FIELDS[c]: getattr(row, c) or '' for c in columns}
+        haystack = '\n'.join(texts.values()).lower()
+        if not all(p.lower() in haystack for p in phrases):
+            continue
+        matched = [f for f, text in texts.items() if phrases[0].lower() in text.lower()]
+        results.append({
+            'id': row.id, 'subject': row.subject, 'unit': row.unit, 'type': row.type,
+            'date': str(row.date)[:10], 'score': row.score, 'is_corrected': bool(row.is_corrected),
+            'matched_fields': matched,
+            'snippet': _snippet(texts[matched[0]], phrases[0]) if matched else '',
+        })
+        if len(results) >= limit:
+            break
+    return results, len(candidates)
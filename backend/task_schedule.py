@@ -0,0 +1,103 @@
+# task_schedule.py
+"""
+週期性任務展開：把「科目 + 單元範圍 + 星期 + 起訖日 (或考期)」的規則展開成逐日任務。
+純函式，不碰資料庫；寫入由 task_routes 一次完成。
+"""
+import re
+from datetime import datetime, timedelta
+
+MAX_EXPANDED_TASKS = 1000
+MAX_SCHEDULE_DAYS = 731   # 起訖日最長約兩年，先擋下來再逐日展開
+
+# 標題只認得這三個佔位字，其他大括號原樣保留 (使用者輸入不能交給 str.format)
+TITLE_PLACEHOLDER_RE = re.compile(r'\{(unit|n|date)\}')
+
+def _parse_date(value, name):
+    try:
+        return datetime.strptime(str(value)[:10], '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} 日期格式錯誤，需為 YYYY-MM-DD")
+
+def expand_units(rule):
+    """
+    單元清單：直接給 units，或以 unit_prefix / unit_start / unit_end / unit_step 產生頁碼區段
+    例：prefix 'p.'、1~20、step 5 -> ['p.1-5', 'p.6-10', 'p.11-15', 'p.16-20']
+    """
+    if rule.get('units'):
+        return [str(u) for u in rule['units']]
+    if rule.get('unit_start') is None or rule.get('unit_end') is None:
+        return None
+
+    prefix = rule.get('unit_prefix', '')
+    start, end = int(rule['unit_start']), int(rule['unit_end'])
+    step = max(int(rule.get('unit_step', 1)), 1)
+    if end < start:
+        raise ValueError("unit_end 不可小於 unit_start")
+    if (end - start) // step + 1 > MAX_EXPANDED_TASKS:
+        raise ValueError(f"單元數最多 {MAX_EXPANDED_TASKS} 個")
+
+    units = []
+    for first in range(start, end + 1, step):
+        last = min(first + step - 1, end)
+        units.append(f"{prefix}{first}" if first == last else f"{prefix}{first}-{last}")
+    return units
+
+def schedule_dates(rule, exam_dates):
+    """ 起訖日內符合 weekdays (ISO：1=週一 ... 7=週日) 的日期；end 可改用 until=midterm/final """
+    start = _parse_date(rule.get('start'), 'start')
+    if rule.get('end'):
+        end = _parse_date(rule['end'], 'end')
+    elif rule.get('until') in ('midterm', 'final'):
+        exam = exam_dates.get(f"{rule['until']}_date")
+        if not exam:
+            raise ValueError("尚未設定考期，無法以考試日期作為結束日")
+        # 考試當天不排進度
+        end = _parse_date(exam, rule['until']) - timedelta(days=1)
+    else:
+        raise ValueError("需要 end 或 until (midterm / final)")
+    if end < start:
+        raise ValueError("結束日不可早於開始日")
+    if (end - start).days > MAX_SCHEDULE_DAYS:
+        raise ValueError(f"排程區間最長 {MAX_SCHEDULE_DAYS} 天")
+
+    weekdays = {int(d) for d in (rule.get('weekdays') or range(1, 8))}
+    dates, day = [], start
+    while day <= end:
+        if day.isoweekday() in weekdays:
+            dates.append(day)
+        day += timedelta(days=1)
+    return dates
+
+def render_title(template, unit, n, day):
+    values = {'unit': str(unit), 'n': str(n), 'date': day.strftime('%Y-%m-%d')}
+    return TITLE_PLACEHOLDER_RE.sub(lambda m: values[m.group(1)], template)
+
+def expand_recurring_rule(rule, exam_dates):
+    """
+    回傳 (任務欄位 dict 清單, 未排入的單元數)。有單元清單時每個排程日一個單元，單元用完即停；
+    沒有單元時每個排程日各建立一個任務。title 可用 {unit}、{n}、{date} 佔位。
+    """
+    for field in ('subject', 'type'):
+        if not rule.get(field):
+            raise ValueError(f"缺少 {field}")
+
+    dates = schedule_dates(rule, exam_dates)
+    units = expand_units(rule)
+    title_template = rule.get('title') or ('{unit}' if units else rule['subject'])
+
+    slots = list(zip(dates, units)) if units is not None else [(d, rule.get('unit', '')) for d in dates]
+    if len(slots) > MAX_EXPANDED_TASKS:
+        raise ValueError(f"一次最多展開 {MAX_EXPANDED_TASKS} 個任務")
+
+    tasks = []
+    for n, (day, unit) in enumerate(slots, start=1):
+        tasks.append({
+            'subject': rule['subject'],
+            'type': rule['type'],
+            'unit': unit,
+            'title': render_title(title_template, unit, n, day),
+            'date': day,
+            'status': rule.get('status', '未開始'),
+        })
+    unscheduled = len(units) - len(slots) if units is not None else 0
+    return tasks, unscheduled
@@ -0,0 +1,128 @@
+# tests/conftest.py
+"""
+測試共用設定：以暫存 SQLite 檔建立 app (啟動時建表並執行遷移)，每個測試使用新的使用者，彼此不互相影響。
+
+    cd backend && python -m pytest tests
+"""
+import itertools
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# config.py 在匯入時讀取 DATABASE_URL，必須在匯入 app 之前設定
+_DB_DIR = tempfile.mkdtemp(prefix='selfstudy-test-')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_DB_DIR, 'test.db')}"
+os.environ['METRICS_ENABLED'] = '0'
+
+_user_ids = itertools.count(1)
+
+@pytest.fixture(scope='session')
+def app():
+    from app import create_app
+    return create_app(auto_migrate=True)
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture
+def make_user(app):
+    """ 建立一位新使用者並回傳 id """
+    from database import db
+    from models import User
+
+    def make():
+        uid = next(_user_ids)
+        with app.app_context():
+            db.session.add(User(id=uid, username=f'test{uid}', password='test'))
+            db.session.commit()
+        return uid
+    return make
+
+@pytest.fixture
+def user_id(make_user):
+    return make_user()
+
+@pytest.fixture
+def seed_tasks(app):
+    """ seed_tasks(user_id, n)：寫入 n 個任務，每個任務各一筆進度；回傳任務 id 清單 """
+    from database import db
+    from models import Task, Progress
+
+    def seed(uid, count, subject='數學', unit='第1單元', start=date(2025, 3, 1)):
+        with app.app_context():
+            tasks = [Task(user_id=uid, subject=subject, title=f'{subject} {i}', type='評量', unit=unit,
+                          date=start + timedelta(days=i % 60), status='未開始') for i in range(count)]
+            db.session.add_all(tasks)
+            db.session.flush()
+            db.session.add_all([Progress(task_id=t.id, user_id=uid, date=t.date, progress_percent=50,
+                                         student_note='計算錯誤', score=70) for t in tasks])
+            db.session.commit()
+            return [t.id for t in tasks]
+    return seed
+
+@pytest.fixture
+def count_queries(app):
+    """ with count_queries() as counter: ...  區塊結束後 counter['n'] 為期間送出的 SQL 數 """
+    from sqlalchemy import event
+    from database import db
+
+    @contextmanager
+    def counting():
+        counter = {'n': 0}
+        def on_execute(*_):
+            counter['n'] += 1
+        with app.app_context():
+            engine = db.engine
+        event.listen(engine, 'before_cursor_execute', on_execute)
+        try:
+            yield counter
+        finally:
+            event.remove(engine, 'before_cursor_execute', on_execute)
+    return counting
+
+STREAM_CHUNK = 4
+
+class _Reply:
+    def __init__(self, text):
+        self.text = text
+
+@pytest.fixture
+def stub_ai(app):
+    """
+    stub_ai(user_id, reply)：替使用者設定 API Key、清空 AI 快取，並把模型換成假的；reply 為固定字串或 reply(prompt) 函式。
+    stream=True 的請求會把回覆切成多段回傳。
+    回傳收到的 prompt 清單。
+    """
+    import ai_service
+    from database import db, AISetting
+
+    prompts = []
+
+    def install(uid, reply='模擬診斷'):
+        class StubModel:
+            def generate_content(self, prompt, stream=False, **kwargs):
+                prompts.append(prompt)
+                text = reply(prompt) if callable(reply) else reply
+                if stream:
+                    # 串流時每 STREAM_CHUNK 個字一段
+                    return [_Reply(text[i:i + STREAM_CHUNK]) for i in range(0, len(text), STREAM_CHUNK)]
+                return _Reply(text)
+        with app.app_context():
+            db.session.merge(AISetting(user_id=uid, api_key=f'test-key-{uid}'))
+            # 提問內容相同時會命中其他測試留下的快取，清掉才會真的呼叫假模型
+            db.session.execute(db.text("DELETE FROM ai_response_cache"))
+            db.session.commit()
+        ai_service.invalidate_ai_config(uid)
+        ai_service.set_model_factory(lambda key, model, prompt: StubModel())
+        return prompts
+
+    yield install
+    ai_service.set_model_factory(None)
@@ -0,0 +1,47 @@
+import ai_cache
+
+def test_store_overwrites_existing_key(app):
+    with app.app_context():
+        ai_cache.store('test-model', '系統', '同一個提問', '第一次')
+        ai_cache.store('test-model', '系統', '同一個提問', '第二次')
+        assert ai_cache.get_cached('test-model', '系統', '同一個提問') == '第二次'
+
+def test_write_failure_does_not_raise(app, capsys):
+    with app.app_context():
+        ai_cache.store('test-model', '系統', '寫入失敗', None)  # content 為 NOT NULL
+        assert ai_cache.get_cached('test-model', '系統', '寫入失敗') is None
+    assert 'AI 快取寫入失敗' in capsys.readouterr().out
+
+def test_ai_config_changes_seen_by_next_request(app, user_id):
+    import ai_service
+    from database import db, AISetting
+
+    with app.app_context():
+        db.session.merge(AISetting(user_id=user_id, api_key='old-key'))
+        db.session.commit()
+        assert ai_service.get_ai_config(user_id).api_key == 'old-key'
+
+    # 模擬另一個 worker 改了設定：不經過本行程的 invalidate_ai_config
+    with app.app_context():
+        db.session.execute(db.text("UPDATE ai_settings SET api_key = 'new-key' WHERE user_id = :uid"),
+                           {'uid': user_id})
+        db.session.commit()
+
+    with app.app_context():
+        assert ai_service.get_ai_config(user_id).api_key == 'new-key'
+
+def test_invalidate_ai_config_within_request(app, user_id):
+    import ai_service
+    from database import db, AISetting
+
+    with app.app_context():
+        db.session.merge(AISetting(user_id=user_id, api_key='first-key'))
+        db.session.commit()
+        assert ai_service.get_ai_config(user_id).api_key == 'first-key'
+        db.session.execute(db.text("UPDATE ai_settings SET api_key = 'second-key' WHERE user_id = :uid"),
+                           {'uid': user_id})
+        db.session.commit()
+        # 同一個請求內仍是快取值，存檔路由呼叫 invalidate 後才重讀
+        assert ai_service.get_ai_config(user_id).api_key == 'first-key'
+        ai_service.invalidate_ai_config(user_id)
+        assert ai_service.get_ai_config(user_id).api_key == 'second-key'
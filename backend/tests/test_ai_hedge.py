@@ -0,0 +1,82 @@
+import threading
+import time
+
+import ai_cache
+import ai_limits
+
+class _Reply:
+    def __init__(self, text):
+        self.text = text
+
+class _Model:
+    def __init__(self, name, delay=0.0, error=None):
+        self.name, self.delay, self.error, self.threads = name, delay, error, []
+
+    def generate_content(self, prompt, **kwargs):
+        self.threads.append(threading.current_thread())
+        time.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return _Reply(f'{self.name} 回答')
+
+def _hedging(monkeypatch, after=0.05):
+    monkeypatch.setattr(ai_limits, 'AI_HEDGE_AFTER', after)
+    monkeypatch.setattr(ai_limits, 'AI_MAX_RETRIES', 0)
+
+def test_fast_primary_skips_hedge(monkeypatch):
+    _hedging(monkeypatch)
+    models = {'primary': _Model('primary'), 'backup': _Model('backup')}
+    text, answered_by = ai_limits.generate_text('hedge-key-1', 'primary', models.get, '問題', 'backup')
+    assert (text, answered_by) == ('primary 回答', 'primary')
+    # 主要請求不佔用 _hedge_pool 的執行緒
+    assert [t.name for t in models['primary'].threads] == ['ai-primary']
+    assert models['backup'].threads == []
+
+def test_slow_primary_loses_to_faster_hedge(monkeypatch):
+    _hedging(monkeypatch)
+    models = {'primary': _Model('primary', delay=0.5), 'backup': _Model('backup')}
+    started = time.monotonic()
+    text, answered_by = ai_limits.generate_text('hedge-key-3', 'primary', models.get, '問題', 'backup')
+    assert (text, answered_by) == ('backup 回答', 'backup')
+    # 對沖先完成就立刻回傳，不等主要請求
+    assert time.monotonic() - started < 0.4
+
+def test_rate_limit_wait_does_not_count_toward_hedge_budget(monkeypatch):
+    _hedging(monkeypatch)
+    real_acquire = ai_limits.acquire
+
+    def slow_acquire(api_key):
+        time.sleep(0.1)
+        real_acquire(api_key)
+
+    monkeypatch.setattr(ai_limits, 'acquire', slow_acquire)
+    models = {'primary': _Model('primary', delay=0.01), 'backup': _Model('backup')}
+    assert ai_limits.generate_text('hedge-key-4', 'primary', models.get, '問題', 'backup') == ('primary 回答', 'primary')
+    assert models['backup'].threads == []
+
+def test_failed_slow_primary_falls_back_to_hedge(monkeypatch):
+    _hedging(monkeypatch)
+    models = {'primary': _Model('primary', delay=0.2, error=TimeoutError('slow')), 'backup': _Model('backup')}
+    text, answered_by = ai_limits.generate_text('hedge-key-2', 'primary', models.get, '問題', 'backup')
+    assert (text, answered_by) == ('backup 回答', 'backup')
+    assert models['backup'].threads[0] is not threading.current_thread()
+
+def test_hedge_answer_is_cached_under_fallback_model(app, user_id, monkeypatch):
+    import ai_service
+    from database import db, AISetting
+
+    _hedging(monkeypatch)
+    monkeypatch.setattr(ai_limits, 'AI_FALLBACK_MODEL', 'backup')
+    models = {'primary': _Model('primary', delay=0.2, error=TimeoutError('slow')), 'backup': _Model('backup')}
+    with app.app_context():
+        db.session.merge(AISetting(user_id=user_id, api_key=f'hedge-key-{user_id}', model_name='primary'))
+        db.session.commit()
+        ai_service.invalidate_ai_config(user_id)
+        ai_service.set_model_factory(lambda key, name, prompt: models[name])
+        try:
+            reply = ai_service.ask_ai(user_id, '對沖快取')
+        finally:
+            ai_service.set_model_factory(None)
+        assert reply['content'] == 'backup 回答'
+        assert ai_cache.get_cached('backup', None, '對沖快取') == 'backup 回答'
+        assert ai_cache.get_cached('primary', None, '對沖快取') is None
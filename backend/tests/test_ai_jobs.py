@@ -0,0 +1,73 @@
+import json
+import threading
+import time
+
+import ai_jobs
+from routes import ai_routes
+
+def _diagnose_async(client, user_id, **extra):
+    payload = {'user_id': user_id, 'id': None, 'subject': '數學', 'unit': '第1單元', 'note': '計算錯誤', 'async': True}
+    return client.post('/api/review/ai_diagnose', json=dict(payload, **extra))
+
+def _wait_finished(client, user_id, job_id, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = client.get(f'/api/ai/jobs/{job_id}?user_id={user_id}').get_json()
+        if job['status'] in ('done', 'failed'):
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f'job {job_id} 未在 {timeout} 秒內結束')
+
+def test_async_job_returns_202_and_can_be_polled(client, user_id, stub_ai):
+    stub_ai(user_id, '背景診斷')
+    response = _diagnose_async(client, user_id)
+    assert response.status_code == 202
+    body = response.get_json()
+    assert body['status'] == 'queued'
+
+    job = _wait_finished(client, user_id, body['job_id'])
+    assert job['status'] == 'done' and job['kind'] == 'diagnose'
+    assert job['result'] == {'insight': '背景診斷'}
+    # 別人的工作查不到
+    assert client.get(f"/api/ai/jobs/{body['job_id']}?user_id={user_id + 1}").status_code == 404
+
+def test_per_user_limit_returns_429(client, user_id, stub_ai):
+    release = threading.Event()
+
+    def blocking_reply(prompt):
+        release.wait(5)
+        return '慢慢診斷'
+
+    stub_ai(user_id, blocking_reply)
+    try:
+        job_ids = [_diagnose_async(client, user_id, note=f'錯誤 {i}').get_json()['job_id']
+                   for i in range(ai_jobs.AI_PER_USER_LIMIT)]
+        rejected = _diagnose_async(client, user_id, note='再多一個')
+        assert rejected.status_code == 429
+    finally:
+        release.set()
+    assert all(_wait_finished(client, user_id, jid)['status'] == 'done' for jid in job_ids)
+    assert _diagnose_async(client, user_id, note='額度已釋放').status_code == 202
+
+def test_ai_error_marks_job_failed(client, user_id, stub_ai):
+    def failing_reply(prompt):
+        raise ValueError('API key not valid')
+
+    stub_ai(user_id, failing_reply)
+    job_id = _diagnose_async(client, user_id).get_json()['job_id']
+    job = _wait_finished(client, user_id, job_id)
+    assert job['status'] == 'failed'
+    assert 'API key not valid' in job['error']
+
+def test_job_events_stream_status_until_done(client, user_id, stub_ai, monkeypatch):
+    monkeypatch.setattr(ai_routes, 'SSE_POLL_INTERVAL', 0.01)
+    stub_ai(user_id, '串流狀態')
+    job_id = _diagnose_async(client, user_id).get_json()['job_id']
+
+    response = client.get(f'/api/ai/jobs/{job_id}/events?user_id={user_id}')
+    assert response.mimetype == 'text/event-stream'
+    events = [block.split('\n') for block in response.get_data(as_text=True).strip().split('\n\n')]
+    statuses = [json.loads(lines[1][len('data: '):])['status'] for lines in events if lines[0] == 'event: status']
+    assert statuses[-1] == 'done'
+    assert len(statuses) == len(set(statuses))   # 狀態有變化才推送
+    assert client.get(f'/api/ai/jobs/nope/events?user_id={user_id}').status_code == 404
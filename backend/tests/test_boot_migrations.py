@@ -0,0 +1,78 @@
+import os
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from migrations import MIGRATIONS_TABLE, latest_version, load_migrations
+
+def _count_statements(fn):
+    statements = []
+    listener = lambda conn, cursor, statement, *_: statements.append(statement)
+    event.listen(Engine, 'before_cursor_execute', listener)
+    try:
+        fn()
+    finally:
+        event.remove(Engine, 'before_cursor_execute', listener)
+    return statements
+
+def test_latest_version_matches_modules():
+    assert latest_version() == max(m.VERSION for m in load_migrations())
+
+def test_up_to_date_boot_runs_one_query(app):
+    from app import create_app
+    statements = _count_statements(lambda: create_app(auto_migrate=False))
+    assert len(statements) == 1 and 'MAX(version)' in statements[0]
+
+def test_boot_applies_pending_migrations(app):
+    from app import create_app
+    from database import db
+
+    latest = latest_version()
+    with app.app_context():
+        with db.engine.begin() as conn:
+            conn.execute(db.text(f"DELETE FROM {MIGRATIONS_TABLE} WHERE version = :v"), {'v': latest})
+
+    booted = create_app(auto_migrate=False)
+    with booted.app_context():
+        assert db.session.execute(db.text(f"SELECT MAX(version) FROM {MIGRATIONS_TABLE}")).scalar() == latest
+
+def test_boot_refuses_when_migrations_fail(app, monkeypatch):
+    import app as app_module
+    monkeypatch.setattr(app_module, 'latest_version', lambda: 10 ** 6)
+    monkeypatch.setattr(app_module, 'migrate', lambda app: None)
+    with pytest.raises(RuntimeError):
+        app_module.create_app(auto_migrate=False)
+
+def test_waiting_worker_rechecks_version_after_lock(app, monkeypatch):
+    import app as app_module
+    from contextlib import contextmanager
+    from database import db
+
+    latest = latest_version()
+    with app.app_context():
+        with db.engine.begin() as conn:
+            removed = conn.execute(db.text(f"SELECT * FROM {MIGRATIONS_TABLE} WHERE version = :v"),
+                                   {'v': latest}).mappings().one()
+            conn.execute(db.text(f"DELETE FROM {MIGRATIONS_TABLE} WHERE version = :v"), {'v': latest})
+
+    @contextmanager
+    def lock_held_by_other_worker(engine):
+        # 等鎖期間另一個 worker 已把遷移跑完
+        with engine.begin() as conn:
+            conn.execute(db.text(f"INSERT INTO {MIGRATIONS_TABLE} (version, description, applied_at) "
+                                 "VALUES (:version, :description, :applied_at)"), dict(removed))
+        yield
+
+    migrated = []
+    monkeypatch.setattr(app_module, 'migration_lock', lock_held_by_other_worker)
+    monkeypatch.setattr(app_module, 'migrate', lambda app: migrated.append(app))
+    app_module.create_app(auto_migrate=False)
+    assert migrated == []
+
+def test_create_app_does_not_import_heavy_modules(app):
+    from benchmarks.startup import run_once
+
+    # 新的 Python 行程：測試行程本身可能已經載入過這些套件
+    result = run_once(os.environ['DATABASE_URL'])
+    assert result['heavy'] == [], f"create_app() 載入了 {result['heavy']}"
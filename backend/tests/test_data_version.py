@@ -0,0 +1,16 @@
+from database import db
+from data_version import bump_data_version, get_data_version
+
+def test_bump_creates_then_increments(app, user_id):
+    with app.app_context():
+        assert get_data_version(user_id) == 0
+        bump_data_version(user_id)
+        bump_data_version(user_id)
+        db.session.commit()
+        assert get_data_version(user_id) == 2
+
+def test_writes_change_the_etag(client, user_id):
+    first = client.get(f'/tasks?user_id={user_id}')
+    client.post('/tasks', json={'user_id': user_id, 'subject': '數學', 'title': 't', 'type': '自修', 'date': '2025-03-01'})
+    second = client.get(f'/tasks?user_id={user_id}', headers={'If-None-Match': first.headers['ETag']})
+    assert second.status_code == 200 and second.headers['ETag'] != first.headers['ETag']
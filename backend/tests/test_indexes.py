@@ -0,0 +1,88 @@
+import re
+
+import pytest
+
+TASK_INDEX = 'ix_tasks_user_subject_date'
+PROGRESS_INDEX = 'ix_progresses_task_date_score'
+
+class _Reply:
+    def __init__(self, text):
+        self.text = text
+
+class _StubModel:
+    def generate_content(self, prompt, stream=False, **kwargs):
+        return _Reply('模擬考卷')
+
+@pytest.fixture(scope='module', autouse=True)
+def rebuilt_indexes(app):
+    """ 刪掉兩個索引與 002 的遷移紀錄後重跑遷移，確認索引是由 migrations/m002 建立的 """
+    from database import db
+    from migrations import run_migrations, MIGRATIONS_TABLE
+
+    with app.app_context():
+        with db.engine.begin() as conn:
+            conn.execute(db.text(f"DROP INDEX {TASK_INDEX}"))
+            conn.execute(db.text(f"DROP INDEX {PROGRESS_INDEX}"))
+            conn.execute(db.text(f"DELETE FROM {MIGRATIONS_TABLE} WHERE version = 2"))
+        assert run_migrations(db.engine, log=lambda msg: None) == [2]
+
+@pytest.fixture
+def captured_sql(app):
+    """ 記錄期間送出的 (SQL, 參數) """
+    from sqlalchemy import event
+    from database import db
+
+    statements = []
+    def on_execute(conn, cursor, statement, parameters, context, executemany):
+        if not executemany:
+            statements.append((statement, parameters))
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', on_execute)
+    yield statements
+    event.remove(engine, 'before_cursor_execute', on_execute)
+
+def _plans(app, statements, pattern):
+    """ 對符合 pattern 的查詢執行 EXPLAIN QUERY PLAN，回傳各查詢的計畫文字 """
+    from database import db
+
+    plans = []
+    with app.app_context():
+        for statement, parameters in list(statements):
+            if re.search(pattern, statement):
+                rows = db.session.connection().exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)
+                plans.append('\n'.join(row[-1] for row in rows))
+    assert plans, f"沒有送出符合 {pattern!r} 的查詢"
+    return plans
+
+def test_review_list_uses_composite_indexes(app, client, user_id, seed_tasks, captured_sql):
+    seed_tasks(user_id, 30)
+    response = client.get(f'/api/review/list?user_id={user_id}&subject=數學&start=2025-01-01&end=2025-12-31')
+    assert response.status_code == 200
+    for plan in _plans(app, captured_sql, r'FROM tasks t\s+JOIN progresses p'):
+        assert TASK_INDEX in plan
+        assert PROGRESS_INDEX in plan
+
+def test_generate_quiz_uses_composite_indexes(app, client, user_id, seed_tasks, captured_sql):
+    import ai_service
+
+    seed_tasks(user_id, 30)
+    client.post('/api/config/ai', json={'user_id': user_id, 'api_key': 'test-key', 'model_name': 'test-model'})
+    ai_service.set_model_factory(lambda key, model, prompt: _StubModel())
+    try:
+        response = client.post('/api/teacher/generate_quiz', json={'user_id': user_id, 'subject': '數學'})
+    finally:
+        ai_service.set_model_factory(None)
+    assert response.status_code == 200
+    for plan in _plans(app, captured_sql, r'FROM tasks t\s+JOIN progresses p'):
+        assert TASK_INDEX in plan
+        assert PROGRESS_INDEX in plan
+
+def test_teacher_analysis_reads_rollup_by_key(app, client, user_id, seed_tasks, captured_sql):
+    # 教師看板已改讀 unit_mastery_daily 彙總表 (user-005)，不再 JOIN tasks / progresses
+    seed_tasks(user_id, 30)
+    response = client.get(f'/api/teacher/analysis?user_id={user_id}&subject=數學&start=2025-01-01&end=2025-12-31')
+    assert response.status_code == 200
+    for plan in _plans(app, captured_sql, r'FROM unit_mastery_daily'):
+        assert 'USING INDEX ix_unit_mastery_user_subject_day' in plan or 'USING INDEX uq_unit_mastery_key' in plan
+        assert 'SCAN unit_mastery_daily' not in plan
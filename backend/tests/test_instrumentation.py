@@ -0,0 +1,37 @@
+import pytest
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine
+
+import instrumentation
+
+@pytest.fixture
+def sql_listeners():
+    # 測試環境關閉了 METRICS_ENABLED，這裡只在本測試期間掛上 SQL 計時
+    if instrumentation._listeners_installed:
+        yield
+        return
+    event.listen(Engine, 'before_cursor_execute', instrumentation._before_cursor_execute)
+    event.listen(Engine, 'after_cursor_execute', instrumentation._after_cursor_execute)
+    yield
+    event.remove(Engine, 'before_cursor_execute', instrumentation._before_cursor_execute)
+    event.remove(Engine, 'after_cursor_execute', instrumentation._after_cursor_execute)
+
+def _observed(blueprint='background'):
+    series = instrumentation.SQL_LATENCY._series.get((blueprint,))
+    return series[-1] if series else 0
+
+def test_failed_statements_leave_no_timing_state(app, sql_listeners):
+    from database import db
+
+    with app.app_context():
+        with db.engine.connect() as conn:
+            before = _observed()
+            for _ in range(3):
+                with pytest.raises(exc.DBAPIError):
+                    conn.execute(db.text("SELECT * FROM no_such_table"))
+                conn.rollback()
+            conn.execute(db.text("SELECT 1"))
+
+            # 失敗的 SQL 沒有 after_cursor_execute，不應在連線上留下任何計時資料
+            assert not conn.info.get('query_started')
+            assert _observed() == before + 1
@@ -0,0 +1,47 @@
+from datetime import date
+
+def _rollup(app, uid):
+    from database import db
+    with app.app_context():
+        return db.session.execute(db.text(
+            "SELECT subject, unit, day, total_score, entry_count, failed_count FROM unit_mastery_daily "
+            "WHERE user_id = :uid ORDER BY subject, unit, day"), {'uid': uid}).fetchall()
+
+def _add_progress(client, uid, task_id, score):
+    response = client.post('/progress', json={'user_id': uid, 'task_id': task_id, 'date': '2025-03-01',
+                                              'progress_percent': 100, 'score': score})
+    assert response.status_code == 201
+    return response.get_json()['id']
+
+def test_deltas_accumulate_and_empty_rows_are_deleted(app, client, user_id):
+    task_id = client.post('/tasks', json={'user_id': user_id, 'subject': '數學', 'title': 't', 'type': '評量',
+                                          'date': '2025-03-01', 'unit': '分數'}).get_json()['id']
+    _add_progress(client, user_id, task_id, 95)
+    second = _add_progress(client, user_id, task_id, 60)
+    assert [tuple(r)[3:] for r in _rollup(app, user_id)] == [(155, 2, 1)]
+
+    client.patch(f'/progress/{second}', json={'user_id': user_id, 'score': 92})
+    assert [tuple(r)[3:] for r in _rollup(app, user_id)] == [(187, 2, 0)]
+
+    client.delete(f'/tasks/{task_id}?user_id={user_id}')
+    assert _rollup(app, user_id) == []
+
+def test_null_unit_is_stored_as_blank_and_matches_rebuild(app, client, user_id):
+    from database import db
+    from mastery_rollup import rebuild_unit_mastery
+    from models import Task
+
+    with app.app_context():
+        task = Task(user_id=user_id, subject='社會', title='t', type='評量', date=date(2025, 3, 1), unit=None)
+        db.session.add(task)
+        db.session.commit()
+        task_id = task.id
+    _add_progress(client, user_id, task_id, 80)
+    _add_progress(client, user_id, task_id, 70)
+    incremental = _rollup(app, user_id)
+    assert [(r.unit, r.entry_count) for r in incremental] == [('', 2)]
+
+    with app.app_context():
+        with db.engine.begin() as conn:
+            rebuild_unit_mastery(conn)
+    assert _rollup(app, user_id) == incremental
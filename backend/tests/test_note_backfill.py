@@ -0,0 +1,19 @@
+import importlib
+
+m006 = importlib.import_module('migrations.m006_materialized_note_fields')
+
+def test_backfill_pages_through_all_rows(app, user_id, seed_tasks, monkeypatch):
+    from database import db
+
+    seed_tasks(user_id, 7)
+    monkeypatch.setattr(m006, 'BACKFILL_BATCH', 3)
+    with app.app_context():
+        with db.engine.begin() as conn:
+            conn.execute(db.text(
+                "UPDATE progresses SET student_note = 'p.12-13 計算錯誤', clean_note = NULL, note_tags = NULL "
+                "WHERE user_id = :uid"), {'uid': user_id})
+            m006.upgrade(conn)
+        rows = db.session.execute(db.text(
+            "SELECT note_pages, note_tags, clean_note FROM progresses WHERE user_id = :uid"), {'uid': user_id}).fetchall()
+    assert len(rows) == 7
+    assert all(r.note_pages == 'p.12-13' and r.clean_note == '計算錯誤' and '計算' in r.note_tags for r in rows)
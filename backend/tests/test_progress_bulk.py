@@ -0,0 +1,38 @@
+import pytest
+
+def _bulk(client, user_id, rows):
+    return client.post('/progress/bulk', json={'user_id': user_id, 'rows': rows})
+
+def _progress_id(app, task_id):
+    from models import Progress
+    with app.app_context():
+        return Progress.query.filter_by(task_id=task_id).one().id
+
+def test_rejects_progress_moved_to_another_task(app, client, user_id, seed_tasks):
+    first, second = seed_tasks(user_id, 2)
+    pid = _progress_id(app, first)
+    response = _bulk(client, user_id, [{'id': pid, 'task_id': second, 'progress_percent': 100}])
+    assert response.status_code == 404
+    assert response.get_json()['ids'] == [pid]
+
+@pytest.mark.parametrize('row', [
+    {'task_id': 'abc', 'date': '2025-03-01'},
+    {'task_id': 1, 'id': 'x'},
+    {'task_id': 1, 'id': 1, 'progress_percent': 'half'},
+    {'task_id': 1, 'id': 1, 'progress_percent': 150},
+    {'task_id': 1, 'date': '03/01/2025'},
+    {'date': '2025-03-01'},
+    'not a row',
+])
+def test_rejects_malformed_rows(client, user_id, row):
+    response = _bulk(client, user_id, [row])
+    assert response.status_code == 400
+
+def test_updates_matching_progress(app, client, user_id, seed_tasks):
+    (task_id,) = seed_tasks(user_id, 1)
+    pid = _progress_id(app, task_id)
+    response = _bulk(client, user_id, [{'id': pid, 'task_id': str(task_id), 'progress_percent': '100'}])
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['progress'][0]['progress_percent'] == 100
+    assert body['tasks'] == [{'id': task_id, 'status': '已完成'}]
@@ -0,0 +1,64 @@
+from datetime import date, timedelta
+
+from database import db, SubjectConfig
+from models import Task, Progress
+
+def _add(app, user_id, subject, task_type, offset, percents=()):
+    """ 建一個 offset 天後到期的任務，依序寫入各筆進度 (最後一筆為最新) """
+    today = date.today()
+    with app.app_context():
+        task = Task(user_id=user_id, subject=subject, title=f'{subject} {offset}', type=task_type,
+                    unit='第1單元', date=today + timedelta(days=offset), status='未開始')
+        db.session.add(task)
+        db.session.flush()
+        for i, percent in enumerate(percents):
+            db.session.add(Progress(task_id=task.id, user_id=user_id, progress_percent=percent,
+                                    date=today - timedelta(days=len(percents) - i)))
+        db.session.commit()
+
+def _summary(client, user_id, **params):
+    query = '&'.join(f'{k}={v}' for k, v in dict(user_id=user_id, **params).items())
+    return client.get(f'/progress/summary?{query}').get_json()
+
+def test_summary_counts_due_buckets_and_groups(app, client, user_id):
+    _add(app, user_id, '數學', '評量', -2)                  # 逾期
+    _add(app, user_id, '數學', '評量', -1, [100])           # 已完成，不算逾期
+    _add(app, user_id, '數學', '考卷', 0, [30])             # 今天到期
+    _add(app, user_id, '國語', '自修', 2)                   # 1-3 天
+    _add(app, user_id, '國語', '補習班', 5, [100, 40])      # 4-7 天；以最新一筆進度判斷未完成
+    _add(app, user_id, '數學', '補習班', 20, [40, 100])     # 已完成 (最新一筆)
+
+    body = _summary(client, user_id)
+    summary = body['summary']
+    assert body['today'] == date.today().isoformat()
+    assert (summary['total'], summary['completed'], summary['incomplete']) == (6, 2, 4)
+    assert (summary['overdue'], summary['due_today'], summary['due_1_3'], summary['due_4_7']) == (1, 1, 1, 1)
+    assert summary['completion_rate'] == 33.3
+
+    # 核心：主科且為正式作業類型；補習班歸在其他
+    assert (body['groups']['core']['total'], body['groups']['other']['total']) == (4, 2)
+    by_subject = {row['subject']: row for row in body['by_subject']}
+    assert (by_subject['數學']['total'], by_subject['數學']['completed']) == (4, 2)
+    assert by_subject['國語']['completion_rate'] == 0
+
+    math_only = _summary(client, user_id, subject='數學')
+    assert [row['subject'] for row in math_only['by_subject']] == ['數學']
+
+def test_summary_counts_before_exam_dates(app, client, user_id):
+    today = date.today()
+    with app.app_context():
+        db.session.add(SubjectConfig(user_id=user_id, subject_name='數學', publisher='康軒', grade=5,
+                                     midterm_date=today + timedelta(days=3), final_date=today + timedelta(days=30)))
+        db.session.commit()
+    _add(app, user_id, '數學', '評量', 1)
+    _add(app, user_id, '數學', '評量', 10)
+    _add(app, user_id, '數學', '評量', 2, [100])
+
+    summary = _summary(client, user_id)['summary']
+    assert (summary['before_midterm'], summary['before_final']) == (1, 2)
+
+def test_summary_empty_and_unauthorized(client, user_id):
+    body = _summary(client, user_id)
+    assert body['summary']['total'] == 0 and body['summary']['completion_rate'] == 0
+    assert body['by_subject'] == []
+    assert client.get('/progress/summary').status_code == 401
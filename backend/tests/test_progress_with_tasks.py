@@ -0,0 +1,39 @@
+from datetime import date
+
+import pytest
+
+@pytest.mark.parametrize('query', ['', '&limit=5000'])
+def test_query_count_does_not_grow_with_tasks(client, make_user, seed_tasks, count_queries, query):
+    counts = {}
+    for n in (20, 200):
+        uid = make_user()
+        seed_tasks(uid, n)
+        with count_queries() as counter:
+            response = client.get(f'/progress/with_tasks?user_id={uid}{query}')
+            rows = response.get_json()  # 串流回應在讀取時才執行查詢
+        assert response.status_code == 200
+        assert len(rows) == n
+        counts[n] = counter['n']
+    assert counts[20] == counts[200]
+
+def test_latest_progress_prefers_newest_date_then_highest_id(app, client, user_id, seed_tasks):
+    from database import db
+    from models import Progress
+
+    task_id, empty_task_id = seed_tasks(user_id, 2)
+    with app.app_context():
+        db.session.execute(db.delete(Progress).where(Progress.task_id == empty_task_id))
+        older = Progress(task_id=task_id, user_id=user_id, date=date(2025, 1, 1), progress_percent=10)
+        first = Progress(task_id=task_id, user_id=user_id, date=date(2025, 12, 1), progress_percent=60)
+        db.session.add_all([older, first])
+        db.session.flush()
+        latest = Progress(task_id=task_id, user_id=user_id, date=date(2025, 12, 1), progress_percent=90)
+        db.session.add(latest)
+        db.session.commit()
+        latest_id = latest.id
+
+    rows = {r['task_id']: r for r in client.get(f'/progress/with_tasks?user_id={user_id}').get_json()}
+    assert rows[task_id]['id'] == latest_id
+    assert rows[task_id]['progress_percent'] == 90
+    assert rows[empty_task_id]['id'] is None
+    assert rows[empty_task_id]['progress_percent'] == 0
@@ -0,0 +1,56 @@
+import json
+
+def _events(response):
+    events = []
+    for block in response.get_data(as_text=True).strip().split('\n\n'):
+        name, data = block.split('\n')
+        events.append((name[len('event: '):], json.loads(data[len('data: '):])))
+    return events
+
+def _stream(client, user_id, **extra):
+    return client.post('/api/teacher/generate_quiz/stream', json=dict({'user_id': user_id, 'subject': '數學'}, **extra))
+
+def test_quiz_streams_chunks_then_done(client, user_id, seed_tasks, stub_ai):
+    seed_tasks(user_id, 3)
+    prompts = stub_ai(user_id, '第一題：計算 12 × 3')
+
+    response = _stream(client, user_id)
+    assert response.mimetype == 'text/event-stream'
+    assert response.headers['Cache-Control'] == 'no-cache'
+    events = _events(response)
+
+    assert events[0][0] == 'start'
+    chunks = [data['text'] for name, data in events if name == 'chunk']
+    assert len(chunks) > 1 and ''.join(chunks) == '第一題：計算 12 × 3'
+    assert events[-1] == ('done', {'quiz_content': '第一題：計算 12 × 3', 'publisher': events[0][1]['publisher']})
+    assert len(prompts) == 1
+
+def test_quiz_stream_hits_cache_unless_forced(client, user_id, seed_tasks, stub_ai):
+    seed_tasks(user_id, 3)
+    replies = iter(['考卷一', '考卷二'])
+    prompts = stub_ai(user_id, lambda prompt: next(replies))
+
+    assert _events(_stream(client, user_id))[-1][1]['quiz_content'] == '考卷一'
+    assert _events(_stream(client, user_id))[-1][1]['quiz_content'] == '考卷一'
+    assert _events(_stream(client, user_id, force=True))[-1][1]['quiz_content'] == '考卷二'
+    assert len(prompts) == 2
+
+def test_quiz_stream_without_mistakes_finishes_with_notice(client, user_id, stub_ai):
+    prompts = stub_ai(user_id)
+    events = _events(_stream(client, user_id))
+    assert [name for name, _ in events] == ['done']
+    assert '找不到' in events[0][1]['quiz_content']
+    assert prompts == []
+
+def test_quiz_stream_reports_ai_errors(client, user_id, seed_tasks, stub_ai):
+    seed_tasks(user_id, 3)
+
+    def failing(prompt):
+        raise ValueError('quota exceeded')
+
+    stub_ai(user_id, failing)
+    events = _events(_stream(client, user_id))
+    assert events[-1][0] == 'error' and 'quota exceeded' in events[-1][1]['error']
+
+def test_quiz_stream_requires_user(client):
+    assert client.post('/api/teacher/generate_quiz/stream', json={'subject': '數學'}).status_code == 400
@@ -0,0 +1,47 @@
+from routes import review_routes
+
+def test_batch_rejects_non_numeric_ids(client, user_id):
+    response = client.post('/api/review/ai_diagnose_batch', json={'user_id': user_id, 'ids': ['1', 'abc']})
+    assert response.status_code == 400
+    response = client.post('/api/review/ai_diagnose_batch', json={'user_id': user_id, 'ids': '12'})
+    assert response.status_code == 400
+
+def test_batch_reports_remaining_rows(client, user_id, seed_tasks, stub_ai, monkeypatch):
+    monkeypatch.setattr(review_routes, 'BATCH_MAX_ITEMS', 3)
+    seed_tasks(user_id, 5)
+    stub_ai(user_id, '模擬診斷')
+    payload = {'user_id': user_id, 'all_uncorrected': True, 'start': '2025-01-01', 'end': '2025-12-31'}
+
+    first = client.post('/api/review/ai_diagnose_batch', json=payload).get_json()
+    assert len(first['results']) == 3
+    assert first['remaining'] == 2 and first['has_more']
+
+    second = client.post('/api/review/ai_diagnose_batch', json=payload).get_json()
+    assert len(second['results']) == 2
+    assert second['remaining'] == 0 and not second['has_more']
+
+def test_packs_fan_out_on_bounded_pool(app, user_id, stub_ai, monkeypatch):
+    import json
+    import re
+    import threading
+    import ai_batch
+
+    monkeypatch.setattr(ai_batch, 'BATCH_PACK_SIZE', 2)
+    # 三包必須同時在途才能通過 barrier；依序送出會逾時而失敗
+    barrier = threading.Barrier(3, timeout=2)
+    threads = []
+
+    def reply(prompt):
+        threads.append(threading.current_thread().name)
+        barrier.wait()
+        return json.dumps([{'id': int(i), 'insight': f'診斷 {i}'} for i in re.findall(r'id=(\d+)', prompt)])
+
+    stub_ai(user_id, reply)
+    items = {'數學': [{'id': i, 'unit': '第1單元', 'note': f'錯誤 {i}'} for i in range(1, 7)]}
+    with app.app_context():
+        insights, errors, requests_made = ai_batch.diagnose_batch(
+            user_id, items, {'數學': {'publisher': '康軒', 'grade': 5}})
+
+    assert insights == {i: f'診斷 {i}' for i in range(1, 7)}
+    assert errors == {} and requests_made == 3
+    assert all(name.startswith('ai-batch') for name in threads)
@@ -0,0 +1,68 @@
+from database import db
+
+def _diagnose(client, user_id, progress_id, **extra):
+    payload = {'user_id': user_id, 'id': progress_id, 'subject': '數學', 'unit': '第1單元', 'note': '計算錯誤'}
+    return client.post('/api/review/ai_diagnose', json=dict(payload, **extra)).get_json()
+
+def _progress_ids(app, user_id):
+    with app.app_context():
+        return [r[0] for r in db.session.execute(
+            db.text("SELECT id FROM progresses WHERE user_id = :uid ORDER BY id"), {'uid': user_id})]
+
+def _insight(app, progress_id):
+    with app.app_context():
+        return db.session.execute(db.text("SELECT ai_insight FROM progresses WHERE id = :id"),
+                                  {'id': progress_id}).scalar()
+
+def test_reuses_similar_insight_only_for_undiagnosed_rows(app, client, user_id, seed_tasks, stub_ai):
+    seed_tasks(user_id, 2)
+    first, second = _progress_ids(app, user_id)
+    with app.app_context():
+        db.session.execute(db.text("UPDATE progresses SET ai_insight = '舊診斷' WHERE id = :id"), {'id': first})
+        db.session.commit()
+    prompts = stub_ai(user_id, '新診斷')
+
+    body = _diagnose(client, user_id, second)
+    assert body == {'insight': '舊診斷', 'reused_from': first}
+    assert prompts == []
+
+    # 已有診斷的列按「重新分析」：一律呼叫 AI，不會被相似錯題的舊診斷蓋掉
+    body = _diagnose(client, user_id, second)
+    assert body == {'insight': '新診斷'}
+    assert len(prompts) == 1 and _insight(app, second) == '新診斷'
+
+def test_force_skips_reuse(app, client, user_id, seed_tasks, stub_ai):
+    seed_tasks(user_id, 2)
+    first, second = _progress_ids(app, user_id)
+    with app.app_context():
+        db.session.execute(db.text("UPDATE progresses SET ai_insight = '舊診斷' WHERE id = :id"), {'id': first})
+        db.session.commit()
+    prompts = stub_ai(user_id, '強制診斷')
+
+    assert _diagnose(client, user_id, second, force=True) == {'insight': '強制診斷'}
+    assert len(prompts) == 1
+
+def test_force_twice_calls_ai_each_time(app, client, user_id, seed_tasks, stub_ai):
+    seed_tasks(user_id, 1)
+    (progress_id,) = _progress_ids(app, user_id)
+    replies = iter(['第一次診斷', '第二次診斷', '第三次診斷'])
+    prompts = stub_ai(user_id, lambda prompt: next(replies))
+
+    assert _diagnose(client, user_id, progress_id) == {'insight': '第一次診斷'}
+    # 快取裡已有同一提問的答案，但重新分析不該讀到它
+    assert _diagnose(client, user_id, progress_id, force=True) == {'insight': '第二次診斷'}
+    assert _diagnose(client, user_id, progress_id, force=True) == {'insight': '第三次診斷'}
+    assert len(prompts) == 3
+    assert _insight(app, progress_id) == '第三次診斷'
+
+def test_quiz_force_skips_cache(app, client, user_id, seed_tasks, stub_ai):
+    seed_tasks(user_id, 1)
+    replies = iter(['考卷一', '考卷二'])
+    prompts = stub_ai(user_id, lambda prompt: next(replies))
+
+    payload = {'user_id': user_id, 'subject': '數學'}
+    assert client.post('/api/teacher/generate_quiz', json=payload).get_json()['quiz_content'] == '考卷一'
+    assert client.post('/api/teacher/generate_quiz', json=payload).get_json()['quiz_content'] == '考卷一'
+    body = client.post('/api/teacher/generate_quiz', json=dict(payload, force=True)).get_json()
+    assert body['quiz_content'] == '考卷二'
+    assert len(prompts) == 2
@@ -0,0 +1,43 @@
+from datetime import date, timedelta
+
+import pytest
+
+from score_series import build_series, lttb_indices
+
+@pytest.mark.parametrize('n, threshold', [(0, 5), (1, 5), (5, 5), (4, 5), (10, 2), (10, 0), (2, 3)])
+def test_lttb_returns_all_points_when_nothing_to_drop(n, threshold):
+    assert lttb_indices(list(range(n)), threshold) == list(range(n))
+
+@pytest.mark.parametrize('n, threshold', [(4, 3), (5, 4), (10, 3), (10, 9), (37, 4), (37, 9), (200, 50), (200, 3)])
+def test_lttb_keeps_threshold_ordered_points_with_endpoints(n, threshold):
+    values = [((i * 37) % 11) + (i % 3) for i in range(n)]
+    kept = lttb_indices(values, threshold)
+    assert len(kept) == threshold
+    assert kept[0] == 0 and kept[-1] == n - 1
+    assert kept == sorted(set(kept))
+
+def test_lttb_preserves_spike():
+    values = [70.0] * 100
+    values[42] = 10.0
+    assert 42 in lttb_indices(values, 10)
+
+def test_build_series_downsamples_after_moving_average():
+    start = date(2025, 1, 6)
+    rows = [('數學', start + timedelta(days=i), 60 + i % 40, 1) for i in range(60)]
+
+    full = build_series(rows, 'day', window=3)[0]
+    sampled = build_series(rows, 'day', window=3, points=10)[0]
+    assert full['total_points'] == sampled['total_points'] == 60
+    assert len(full['points']) == 60 and len(sampled['points']) == 10
+    # 降採樣只挑點，不改變各點的移動平均
+    by_date = {p['date']: p for p in full['points']}
+    assert all(by_date[p['date']] == p for p in sampled['points'])
+
+@pytest.mark.parametrize('points', [2, 0, -1, 1001])
+def test_trend_rejects_out_of_range_points(client, user_id, points):
+    assert client.get(f'/progress/trend?user_id={user_id}&points={points}').status_code == 400
+
+def test_trend_with_fewer_rows_than_points(client, user_id, seed_tasks):
+    seed_tasks(user_id, 3)
+    series = client.get(f'/progress/trend?user_id={user_id}&granularity=day&points=50').get_json()['series']
+    assert [(s['subject'], s['total_points'], len(s['points'])) for s in series] == [('數學', 3, 3)]
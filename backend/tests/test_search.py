@@ -0,0 +1,67 @@
+from database import db
+from search_index import query_terms, tokenize
+
+def _search(client, user_id, q, **params):
+    query = '&'.join(f'{k}={v}' for k, v in dict(user_id=user_id, q=q, **params).items())
+    return client.get(f'/api/review/search?{query}').get_json()
+
+def _ids(body):
+    return [r['id'] for r in body['results']]
+
+def _note(client, user_id, progress_id, note):
+    response = client.patch(f'/progress/{progress_id}', json={'user_id': user_id, 'student_note': note})
+    assert response.status_code == 200
+
+def _progress_ids(app, user_id):
+    with app.app_context():
+        return [r[0] for r in db.session.execute(
+            db.text("SELECT id FROM progresses WHERE user_id = :uid ORDER BY id"), {'uid': user_id})]
+
+def test_tokenize_uses_cjk_bigrams_and_words():
+    assert tokenize('分數約分 GCD') == {'分', '數', '約', '分數', '數約', '約分', 'gcd'}
+    assert query_terms('約分') == {'約分'}
+    assert query_terms('約') == {'約'}
+
+def test_cjk_phrase_must_be_contiguous(app, client, user_id, seed_tasks):
+    seed_tasks(user_id, 2)
+    first, second = _progress_ids(app, user_id)
+    _note(client, user_id, first, '分數約分算錯')
+    # bigram 都在 (分數、數約、約分) 但不是連續的「分數約分」
+    _note(client, user_id, second, '約分前先通分數約')
+
+    assert set(_ids(_search(client, user_id, '約分'))) == {first, second}
+    body = _search(client, user_id, '分數約分')
+    assert _ids(body) == [first]
+    assert body['candidates'] == 2   # 兩筆都通過索引交集，原文比對才排除第二筆
+    assert '分數約分' in body['results'][0]['snippet']
+    assert _ids(_search(client, user_id, '分數 算錯')) == [first]
+
+def test_note_edit_reindexes(app, client, user_id, seed_tasks):
+    seed_tasks(user_id, 1)
+    (progress_id,) = _progress_ids(app, user_id)
+    _note(client, user_id, progress_id, '單位換算錯誤')
+    assert _ids(_search(client, user_id, '換算')) == [progress_id]
+
+    _note(client, user_id, progress_id, '粗心看錯題目')
+    assert _ids(_search(client, user_id, '換算')) == []
+    assert _ids(_search(client, user_id, '看錯')) == [progress_id]
+
+def test_task_delete_removes_postings(app, client, user_id, seed_tasks):
+    (task_id,) = seed_tasks(user_id, 1)
+    (progress_id,) = _progress_ids(app, user_id)
+    _note(client, user_id, progress_id, '時序搞混')
+    assert _ids(_search(client, user_id, '時序')) == [progress_id]
+
+    assert client.delete(f'/tasks/{task_id}?user_id={user_id}').status_code == 200
+    assert _ids(_search(client, user_id, '時序')) == []
+    with app.app_context():
+        assert db.session.execute(db.text("SELECT COUNT(*) FROM search_postings WHERE progress_id = :id"),
+                                  {'id': progress_id}).scalar() == 0
+
+def test_search_is_scoped_to_user(app, client, user_id, make_user, seed_tasks):
+    other = make_user()
+    seed_tasks(other, 1)
+    (progress_id,) = _progress_ids(app, other)
+    _note(client, other, progress_id, '地名混淆')
+    assert _ids(_search(client, user_id, '地名')) == []
+    assert _ids(_search(client, other, '地名')) == [progress_id]
@@ -0,0 +1,24 @@
+from database import db, get_subject_config
+
+def test_config_change_from_another_worker_is_visible(app, user_id):
+    with app.app_context():
+        db.session.execute(db.text(
+            "INSERT INTO subject_configs (user_id, subject_name, publisher, grade) VALUES (:uid, '數學', '南一', 5)"),
+            {'uid': user_id})
+        db.session.commit()
+        assert get_subject_config(user_id, '數學')['publisher'] == '南一'
+
+    # 另一個 worker 直接改資料庫：這個行程沒有收到失效通知，下一個請求仍應讀到新值
+    with app.app_context():
+        db.session.execute(db.text(
+            "UPDATE subject_configs SET publisher = '翰林' WHERE user_id = :uid"), {'uid': user_id})
+        db.session.commit()
+
+    with app.app_context():
+        assert get_subject_config(user_id, '數學')['publisher'] == '翰林'
+
+def test_configs_are_read_once_per_request(app, user_id, count_queries):
+    with app.app_context(), count_queries() as counter:
+        get_subject_config(user_id, '數學')
+        get_subject_config(user_id, '國語')
+    assert counter['n'] == 1
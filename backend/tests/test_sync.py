@@ -0,0 +1,49 @@
+from datetime import datetime, timedelta
+
+from database import db
+from data_version import prune_change_log
+
+def _age_change_log(app, user_id, **delta):
+    with app.app_context():
+        db.session.execute(db.text("UPDATE change_log SET changed_at = :at WHERE user_id = :uid"),
+                           {'at': datetime.now() - timedelta(**delta), 'uid': user_id})
+        db.session.commit()
+
+def _add_task(client, user_id, title):
+    response = client.post('/tasks', json={'user_id': user_id, 'subject': '數學', 'title': title,
+                                           'type': '自修', 'date': '2025-03-01'})
+    return response.get_json()['id']
+
+def test_cursor_does_not_pass_unsettled_rows(app, client, user_id):
+    task_id = _add_task(client, user_id, '剛寫入')
+
+    # 還在穩定期間內：資料照常回傳，但游標不前進，下次同步會再讀一次
+    body = client.get(f'/api/sync?user_id={user_id}&cursor=0').get_json()
+    assert [t['id'] for t in body['tasks']] == [task_id]
+    assert body['cursor'] == 0 and not body['has_more']
+    assert client.get(f'/api/sync?user_id={user_id}').get_json()['cursor'] == 0
+
+    _age_change_log(app, user_id, minutes=5)
+    body = client.get(f'/api/sync?user_id={user_id}&cursor=0').get_json()
+    assert body['cursor'] > 0
+    assert client.get(f"/api/sync?user_id={user_id}&cursor={body['cursor']}").get_json()['tasks'] == []
+
+def test_pruned_cursor_gets_full_snapshot(app, client, user_id):
+    first = _add_task(client, user_id, '舊的')
+    _age_change_log(app, user_id, days=40)
+    second = _add_task(client, user_id, '新的')
+
+    with app.app_context():
+        with db.engine.begin() as conn:
+            assert prune_change_log(conn) >= 1
+        remaining = db.session.execute(db.text("SELECT COUNT(*) FROM change_log WHERE user_id = :uid"),
+                                       {'uid': user_id}).scalar()
+    assert remaining == 1
+
+    body = client.get(f'/api/sync?user_id={user_id}&cursor=0').get_json()
+    assert body['full'] and {t['id'] for t in body['tasks']} == {first, second}
+    assert body['cursor'] > 0
+
+    # 游標已在清除點之後：照常增量同步
+    body = client.get(f"/api/sync?user_id={user_id}&cursor={body['cursor']}").get_json()
+    assert not body['full']
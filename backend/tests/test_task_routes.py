@@ -0,0 +1,36 @@
+import pytest
+
+def _task(**overrides):
+    return dict({'subject': '數學', 'title': '練習', 'type': '評量', 'date': '2025-03-01'}, **overrides)
+
+def test_create_trims_subject(client, user_id):
+    response = client.post('/tasks', json=_task(user_id=user_id, subject=' 數學 '))
+    assert response.status_code == 201
+    assert response.get_json()['subject'] == '數學'
+
+@pytest.mark.parametrize('subject', ['', '  ', '全部', 'all', None])
+def test_rejects_empty_or_all_subject(client, user_id, subject):
+    assert client.post('/tasks', json=_task(user_id=user_id, subject=subject)).status_code == 400
+    assert client.post('/tasks/bulk', json={'user_id': user_id, 'tasks': [_task(subject=subject)]}).status_code == 400
+
+    task_id = client.post('/tasks', json=_task(user_id=user_id)).get_json()['id']
+    assert client.patch(f'/tasks/{task_id}', json={'user_id': user_id, 'subject': subject}).status_code == 400
+    tasks = client.get(f'/tasks?user_id={user_id}').get_json()
+    assert {t['subject'] for t in tasks} == {'數學'}
+
+@pytest.mark.parametrize('items', [
+    ['not-a-dict'],
+    [_task(date=None)],
+    [_task(date=20250301)],
+    [_task(date='2025/03/01')],
+    {'0': _task()},
+])
+def test_bulk_rejects_malformed_items(client, user_id, items):
+    response = client.post('/tasks/bulk', json={'user_id': user_id, 'tasks': items})
+    assert response.status_code == 400
+    assert client.get(f'/tasks?user_id={user_id}').get_json() == []
+
+@pytest.mark.parametrize('value', [None, 20250301, 'tomorrow'])
+def test_patch_rejects_bad_date(client, user_id, value):
+    task_id = client.post('/tasks', json=_task(user_id=user_id)).get_json()['id']
+    assert client.patch(f'/tasks/{task_id}', json={'user_id': user_id, 'date': value}).status_code == 400
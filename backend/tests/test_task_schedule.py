@@ -0,0 +1,34 @@
+import time
+from datetime import date
+
+import pytest
+
+from task_schedule import expand_recurring_rule
+
+RULE = {'subject': '數學', 'type': '自修', 'start': '2025-03-03', 'end': '2025-03-05'}
+
+def test_title_keeps_unknown_braces():
+    tasks, _ = expand_recurring_rule(dict(RULE, title='練習 {1} {x} {n}/{date}'), {})
+    assert [t['title'] for t in tasks] == ['練習 {1} {x} 1/2025-03-03',
+                                           '練習 {1} {x} 2/2025-03-04',
+                                           '練習 {1} {x} 3/2025-03-05']
+
+def test_long_span_is_rejected_before_walking_days():
+    started = time.perf_counter()
+    with pytest.raises(ValueError):
+        expand_recurring_rule(dict(RULE, end='9999-12-31', weekdays=[1]), {})
+    assert time.perf_counter() - started < 0.1
+
+def test_huge_unit_range_is_rejected():
+    with pytest.raises(ValueError):
+        expand_recurring_rule(dict(RULE, unit_start=1, unit_end=10 ** 9), {})
+
+def test_recurring_route_returns_400_for_long_span(client, user_id):
+    response = client.post('/tasks/recurring', json=dict(RULE, user_id=user_id, end='9999-12-31'))
+    assert response.status_code == 400
+
+def test_units_fill_scheduled_days():
+    tasks, unscheduled = expand_recurring_rule(dict(RULE, units=['1-1', '1-2', '1-3', '1-4']), {})
+    assert [(t['date'], t['title']) for t in tasks] == [
+        (date(2025, 3, 3), '1-1'), (date(2025, 3, 4), '1-2'), (date(2025, 3, 5), '1-3')]
+    assert unscheduled == 1
@@ -0,0 +1,31 @@
+from datetime import date
+
+from database import db
+from models import Progress
+
+def _add_progress(app, user_id, task_id, day, percent):
+    with app.app_context():
+        db.session.add(Progress(task_id=task_id, user_id=user_id, date=day, progress_percent=percent,
+                                student_note='', score=80))
+        db.session.commit()
+
+def test_status_change_updates_latest_progress(app, client, user_id):
+    created = client.post('/tasks', json={'user_id': user_id, 'subject': '數學', 'title': '多次進度',
+                                          'type': '自修', 'date': '2025-03-01'}).get_json()
+    task_id = created['id']
+    # 較新的進度先寫入 (id 較小)，確認挑的是日期最新的一筆而不是第一筆
+    _add_progress(app, user_id, task_id, date(2025, 3, 5), 40)
+    _add_progress(app, user_id, task_id, date(2025, 3, 1), 30)
+
+    response = client.patch(f'/tasks/{task_id}', json={'user_id': user_id, 'status': '已完成'})
+    assert response.status_code == 200
+
+    rows = client.get(f'/progress/with_tasks?user_id={user_id}').get_json()
+    assert [r['progress_percent'] for r in rows if r['task_id'] == task_id] == [100]
+
+    summary = client.get(f'/progress/summary?user_id={user_id}').get_json()['summary']
+    assert summary['total'] == 1 and summary['completed'] == 1
+
+    with app.app_context():
+        percents = {p.date: p.progress_percent for p in Progress.query.filter_by(task_id=task_id)}
+    assert percents == {date(2025, 3, 5): 100, date(2025, 3, 1): 30}
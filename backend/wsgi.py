@@ -0,0 +1,10 @@
+# wsgi.py
+"""
+正式環境進入點：gunicorn wsgi:app
+例：gunicorn wsgi:app --workers 2 --threads 4 --timeout 120
+資料表與遷移請在部署時先執行 `python -m migrations`，或設定 AUTO_MIGRATE=1；
+漏跑時 create_app() 開機檢查會發現版本落後並補跑遷移。
+"""
+from app import create_app
+
+app = create_app()
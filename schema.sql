@@ -56,6 +56,7 @@ CREATE TABLE `progresses` (
   PRIMARY KEY (`id`),
   KEY `task_id` (`task_id`),
   KEY `fk_progresses_user` (`user_id`),
+  KEY `ix_progresses_task_date_score` (`task_id`,`date`,`score`),
   CONSTRAINT `fk_progress_user` FOREIGN KEY (`user_id`) REFERENCES `users` (`id`),
   CONSTRAINT `fk_progresses_user` FOREIGN KEY (`user_id`) REFERENCES `users` (`id`) ON DELETE CASCADE,
   CONSTRAINT `progresses_ibfk_1` FOREIGN KEY (`task_id`) REFERENCES `tasks` (`id`)
@@ -100,6 +101,7 @@ CREATE TABLE `tasks` (
   `user_id` int DEFAULT NULL,
   PRIMARY KEY (`id`),
   KEY `fk_tasks_user` (`user_id`),
+  KEY `ix_tasks_user_subject_date` (`user_id`,`subject`,`date`),
   CONSTRAINT `fk_task_user` FOREIGN KEY (`user_id`) REFERENCES `users` (`id`),
   CONSTRAINT `fk_tasks_user` FOREIGN KEY (`user_id`) REFERENCES `users` (`id`) ON DELETE CASCADE
 ) ENGINE=InnoDB AUTO_INCREMENT=924 DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;